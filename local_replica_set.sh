@@ -0,0 +1,80 @@
+#!/bin/bash
+# Start / stop a 3-member MongoDB replica set on this machine, to try the
+# READ_PREFERENCE routing of the services against real secondaries.
+# Usage: ./local_replica_set.sh start|stop|status
+#
+# Members localhost:27101 (preferred primary), localhost:27102, localhost:27103,
+# replica set "rs-local". Uses the local mongod / mongosh when installed,
+# otherwise one mongo container per member on the host network.
+# Then point a service at it, e.g.:
+#   MONGO_URI="mongodb://localhost:27101,localhost:27102,localhost:27103/?replicaSet=rs-local" \
+#   READ_PREFERENCE=secondaryPreferred READ_MAX_STALENESS=90 flask run
+
+RS_NAME=${RS_NAME:-rs-local}
+RS_DIR=${RS_DIR:-/tmp/$RS_NAME}
+PORTS="27101 27102 27103"
+
+if command -v mongod > /dev/null && command -v mongosh > /dev/null; then
+    MODE=local
+else
+    MODE=docker
+fi
+
+mongosh_eval() {
+    if [ "$MODE" = local ]; then
+        mongosh --quiet --port 27101 --eval "$1"
+    else
+        docker exec "$RS_NAME-27101" mongosh --quiet --port 27101 --eval "$1"
+    fi
+}
+
+start() {
+    for port in $PORTS; do
+        if [ "$MODE" = local ]; then
+            mkdir -p "$RS_DIR/$port"
+            mongod --replSet "$RS_NAME" --port "$port" --bind_ip localhost \
+                --dbpath "$RS_DIR/$port" --logpath "$RS_DIR/$port.log" --fork > /dev/null || exit 1
+        else
+            docker run -d --rm --name "$RS_NAME-$port" --network host mongo:latest \
+                --replSet "$RS_NAME" --port "$port" --bind_ip localhost > /dev/null || exit 1
+        fi
+    done
+
+    until mongosh_eval "db.adminCommand('ping').ok" > /dev/null 2>&1; do
+        sleep 1
+    done
+    mongosh_eval "try { rs.status().ok } catch (e) { rs.initiate({_id: '$RS_NAME', members: [
+        {_id: 0, host: 'localhost:27101', priority: 2},
+        {_id: 1, host: 'localhost:27102', priority: 1},
+        {_id: 2, host: 'localhost:27103', priority: 1}]}).ok }" > /dev/null
+
+    # Wait for a primary and two secondaries
+    until [ "$(mongosh_eval "rs.status().members.filter(m => m.state === 1 || m.state === 2).length" 2> /dev/null)" = "3" ]; do
+        sleep 1
+    done
+    echo "Replica set $RS_NAME up ($MODE):"
+    echo "  mongodb://localhost:27101,localhost:27102,localhost:27103/?replicaSet=$RS_NAME"
+}
+
+stop() {
+    for port in $PORTS; do
+        if [ "$MODE" = local ]; then
+            mongosh --quiet --port "$port" --eval "db.getSiblingDB('admin').shutdownServer({force: true})" > /dev/null 2>&1
+        else
+            docker stop "$RS_NAME-$port" > /dev/null 2>&1
+        fi
+    done
+    [ "$MODE" = local ] && rm -rf "$RS_DIR"
+    echo "Replica set $RS_NAME stopped"
+}
+
+status() {
+    mongosh_eval "rs.status().members.forEach(m => print(m.name, m.stateStr, 'lag', (rs.status().members.find(p => p.state === 1).optimeDate - m.optimeDate) / 1000, 's'))"
+}
+
+case "$1" in
+    start) start ;;
+    stop) stop ;;
+    status) status ;;
+    *) echo "Usage: $0 start|stop|status"; exit 1 ;;
+esac
@@ -0,0 +1,165 @@
+import asyncio
+import threading
+import time
+from functools import wraps
+
+from flask import jsonify
+
+"""
+------------------------------------------------------------------------------------------------
+Admission control for pet-order routes.
+
+An AdmissionLimiter lets at most `max_concurrent` requests run a route. Up to
+`max_queue` more may wait for a slot, for at most `queue_timeout` seconds.
+Anything beyond that is shed at once with 503 + Retry-After, instead of tying
+up a worker thread on slow store calls until the client gives up anyway.
+AsyncAdmissionLimiter applies the same limits to the asyncio build, where
+waiting requests are parked coroutines instead of threads.
+------------------------------------------------------------------------------------------------
+"""
+
+
+class AdmissionLimiter:
+    def __init__(self, name, max_concurrent, max_queue, queue_timeout, retry_after=1):
+        self.name = name
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.retry_after = retry_after
+
+        self._slots = threading.BoundedSemaphore(max_concurrent)
+        self._lock = threading.Lock()
+        self._waiting = 0
+        self._in_flight = 0
+
+        self._admitted = 0
+        self._rejected_queue_full = 0
+        self._rejected_timeout = 0
+        self._queue_time_total = 0.0
+        self._queue_time_max = 0.0
+
+    def acquire(self):
+        """
+        Return True once a slot is held, False if the request must be shed.
+        """
+        # Fast path: free slot, no queueing
+        if self._slots.acquire(blocking=False):
+            self._admit(0.0)
+            return True
+
+        with self._lock:
+            if self._waiting >= self.max_queue:
+                self._rejected_queue_full += 1
+                return False
+            self._waiting += 1
+
+        started = time.monotonic()
+        acquired = self._slots.acquire(timeout=self.queue_timeout)
+        waited = time.monotonic() - started
+        with self._lock:
+            self._waiting -= 1
+            if not acquired:
+                self._rejected_timeout += 1
+        if acquired:
+            self._admit(waited)
+        return acquired
+
+    def _admit(self, waited):
+        with self._lock:
+            self._in_flight += 1
+            self._admitted += 1
+            self._queue_time_total += waited
+            self._queue_time_max = max(self._queue_time_max, waited)
+
+    def release(self):
+        with self._lock:
+            self._in_flight -= 1
+        self._slots.release()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "max_concurrent": self.max_concurrent,
+                "max_queue": self.max_queue,
+                "queue_timeout": self.queue_timeout,
+                "in_flight": self._in_flight,
+                "waiting": self._waiting,
+                "admitted": self._admitted,
+                "rejected_queue_full": self._rejected_queue_full,
+                "rejected_timeout": self._rejected_timeout,
+                "avg_queue_seconds": round(self._queue_time_total / self._admitted, 4) if self._admitted else 0.0,
+                "max_queue_seconds": round(self._queue_time_max, 4),
+            }
+
+
+def admission_controlled(limiter):
+    """
+    Route decorator: run the route inside one of the limiter's slots, or answer 503.
+    """
+    def decorator(route):
+        @wraps(route)
+        def wrapper(*args, **kwargs):
+            if not limiter.acquire():
+                response = jsonify({"error": "Service overloaded, retry later"})
+                response.status_code = 503
+                response.headers["Retry-After"] = str(limiter.retry_after)
+                return response
+            try:
+                return route(*args, **kwargs)
+            finally:
+                limiter.release()
+        return wrapper
+    return decorator
+
+
+class AsyncAdmissionLimiter(AdmissionLimiter):
+    def __init__(self, name, max_concurrent, max_queue, queue_timeout, retry_after=1):
+        super().__init__(name, max_concurrent, max_queue, queue_timeout, retry_after)
+        self._slots = asyncio.Semaphore(max_concurrent)
+
+    async def acquire(self):
+        """
+        Return True once a slot is held, False if the request must be shed.
+        """
+        if not self._slots.locked():
+            await self._slots.acquire()
+            self._admit(0.0)
+            return True
+
+        with self._lock:
+            if self._waiting >= self.max_queue:
+                self._rejected_queue_full += 1
+                return False
+            self._waiting += 1
+
+        started = time.monotonic()
+        try:
+            await asyncio.wait_for(self._slots.acquire(), self.queue_timeout)
+            acquired = True
+        except asyncio.TimeoutError:
+            acquired = False
+        waited = time.monotonic() - started
+        with self._lock:
+            self._waiting -= 1
+            if not acquired:
+                self._rejected_timeout += 1
+        if acquired:
+            self._admit(waited)
+        return acquired
+
+
+def async_admission_controlled(limiter):
+    """
+    admission_controlled for coroutine routes and an AsyncAdmissionLimiter.
+    """
+    def decorator(route):
+        @wraps(route)
+        async def wrapper(*args, **kwargs):
+            if not await limiter.acquire():
+                return {"error": "Service overloaded, retry later"}, 503, {"Retry-After": str(limiter.retry_after)}
+            try:
+                return await route(*args, **kwargs)
+            finally:
+                limiter.release()
+        return wrapper
+    return decorator
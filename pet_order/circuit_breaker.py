@@ -0,0 +1,120 @@
+import threading
+import time
+
+"""
+------------------------------------------------------------------------------------------------
+Per-store circuit breakers.
+
+closed    : calls go through; `failure_threshold` consecutive failures (errors,
+            timeouts, 5xx) open the breaker.
+open      : calls are skipped immediately for `reset_timeout` seconds.
+half_open : up to `half_open_max` probe calls are let through. A success closes
+            the breaker, a failure opens it again for another `reset_timeout`.
+------------------------------------------------------------------------------------------------
+"""
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    def __init__(self, failure_threshold=3, reset_timeout=10.0, half_open_max=1):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.half_open_max = half_open_max
+
+        self._lock = threading.Lock()
+        self._state = CLOSED
+        self._failures = 0
+        self._opened_at = None
+        self._probes = 0
+        self._skipped = 0
+        self._times_opened = 0
+
+    def allow(self):
+        """
+        Return True if a call may be sent now.
+        """
+        with self._lock:
+            if self._state == OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                self._state = HALF_OPEN
+                self._probes = 0
+            if self._state == CLOSED:
+                return True
+            if self._state == HALF_OPEN and self._probes < self.half_open_max:
+                self._probes += 1
+                return True
+            self._skipped += 1
+            return False
+
+    def available(self):
+        """
+        Cheap check (does not use up a half-open probe): False while open and cooling down.
+        """
+        with self._lock:
+            return not (self._state == OPEN and time.monotonic() - self._opened_at < self.reset_timeout)
+
+    def record_success(self):
+        with self._lock:
+            self._state = CLOSED
+            self._failures = 0
+            self._probes = 0
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._state == HALF_OPEN or self._failures >= self.failure_threshold:
+                if self._state != OPEN:
+                    self._times_opened += 1
+                self._state = OPEN
+                self._opened_at = time.monotonic()
+                self._probes = 0
+
+    def cancel_probe(self):
+        """
+        A call that was let through ended without telling anything about the
+        store (e.g. the caller's own deadline ran out): give its probe back.
+        """
+        with self._lock:
+            if self._state == HALF_OPEN and self._probes > 0:
+                self._probes -= 1
+
+    def stats(self):
+        with self._lock:
+            retry_in = None
+            if self._state == OPEN:
+                retry_in = round(max(0.0, self.reset_timeout - (time.monotonic() - self._opened_at)), 2)
+            return {
+                "state": self._state,
+                "consecutive_failures": self._failures,
+                "times_opened": self._times_opened,
+                "skipped_calls": self._skipped,
+                "probe_in": retry_in,
+            }
+
+
+class BreakerBoard:
+    """
+    One CircuitBreaker per store id, created on first use.
+    """
+    def __init__(self, **breaker_kwargs):
+        self.breaker_kwargs = breaker_kwargs
+        self._lock = threading.Lock()
+        self._breakers = {}
+
+    def get(self, store_id):
+        with self._lock:
+            breaker = self._breakers.get(store_id)
+            if breaker is None:
+                breaker = self._breakers[store_id] = CircuitBreaker(**self.breaker_kwargs)
+            return breaker
+
+    def reset(self, store_id):
+        with self._lock:
+            self._breakers.pop(store_id, None)
+
+    def stats(self):
+        with self._lock:
+            breakers = dict(self._breakers)
+        return {store_id: breaker.stats() for store_id, breaker in sorted(breakers.items())}
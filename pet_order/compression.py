@@ -0,0 +1,139 @@
+import asyncio
+import gzip
+import os
+
+from flask import request
+
+try:
+    import brotli
+except ImportError:  # optional, "br" is simply not offered
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # optional, "zstd" is simply not offered
+    zstandard = None
+
+try:
+    from quart import request as async_request
+    from quart.wrappers.response import DataBody
+except ImportError:  # only the asyncio build of pet-order uses AsyncResponseCompressor
+    async_request = DataBody = None
+
+"""
+------------------------------------------------------------------------------------------------
+Response compression negotiated with Accept-Encoding.
+
+Buffered responses of a compressible type (JSON, text) and at least `min_size`
+bytes are compressed with the best encoding the client accepts, among the
+available ones in `algorithms` order (br and zstd need their optional packages).
+Streamed responses (pictures) and already encoded ones are left alone.
+AsyncResponseCompressor does the same for a Quart app (asyncio build of
+pet-order), compressing off the event loop.
+
+  COMPRESS_ALGORITHMS  preference order, default "br,zstd,gzip" ("" disables compression)
+  COMPRESS_MIN_SIZE    bytes, default 1024
+  COMPRESS_LEVEL       default 6 (gzip 1-9, brotli quality capped at 11, zstd level)
+------------------------------------------------------------------------------------------------
+"""
+
+COMPRESSIBLE_TYPES = ("application/json", "text/")
+
+
+def _gzip(body, level):
+    return gzip.compress(body, compresslevel=max(1, min(level, 9)), mtime=0)
+
+
+def _brotli(body, level):
+    return brotli.compress(body, quality=max(0, min(level, 11)))
+
+
+def _zstd(body, level):
+    return zstandard.ZstdCompressor(level=level).compress(body)
+
+
+def available_encodings():
+    encodings = {"gzip": _gzip}
+    if brotli is not None:
+        encodings["br"] = _brotli
+    if zstandard is not None:
+        encodings["zstd"] = _zstd
+    return encodings
+
+
+class ResponseCompressor:
+    def __init__(self, algorithms=("br", "zstd", "gzip"), min_size=1024, level=6):
+        encoders = available_encodings()
+        self.algorithms = [a for a in algorithms if a in encoders]
+        self.encoders = {a: encoders[a] for a in self.algorithms}
+        self.min_size = min_size
+        self.level = level
+
+    @classmethod
+    def from_env(cls):
+        algorithms = os.environ.get("COMPRESS_ALGORITHMS", "br,zstd,gzip")
+        return cls(
+            algorithms=[a.strip() for a in algorithms.split(",") if a.strip()],
+            min_size=int(os.environ.get("COMPRESS_MIN_SIZE", "1024")),
+            level=int(os.environ.get("COMPRESS_LEVEL", "6")),
+        )
+
+    def init_app(self, app):
+        app.after_request(self.compress)
+
+    def compress(self, response):
+        """
+        after_request hook: compress the response in place when it is worth it.
+        """
+        buffered = not response.direct_passthrough and not response.is_streamed
+        encoding = self._negotiate(response, request, buffered)
+        if encoding is None:
+            return response
+        body = response.get_data()
+        if len(body) >= self.min_size:
+            self._apply(response, encoding, body, self.encoders[encoding](body, self.level))
+        return response
+
+    def _negotiate(self, response, req, buffered):
+        """
+        Return the encoding to use for the response, None to send it as is.
+        """
+        if not self.algorithms or not buffered or not self._compressible(response):
+            return None
+        response.vary.add("Accept-Encoding")
+        return req.accept_encodings.best_match(self.algorithms)
+
+    @staticmethod
+    def _apply(response, encoding, body, compressed):
+        if len(compressed) >= len(body):
+            return
+        response.set_data(compressed)
+        response.headers["Content-Encoding"] = encoding
+        # Same representation, different bytes: the ETag stays valid but only weakly
+        etag, weak = response.get_etag()
+        if etag and not weak:
+            response.set_etag(etag, weak=True)
+
+    @staticmethod
+    def _compressible(response):
+        return (
+            response.status_code == 200
+            and "Content-Encoding" not in response.headers
+            and (response.mimetype or "").startswith(COMPRESSIBLE_TYPES)
+        )
+
+
+class AsyncResponseCompressor(ResponseCompressor):
+    """
+    ResponseCompressor for a Quart app: only in-memory bodies are compressed, in a
+    worker thread so a large body does not hold up the other requests.
+    """
+    async def compress(self, response):
+        encoding = self._negotiate(response, async_request, isinstance(response.response, DataBody))
+        if encoding is None:
+            return response
+        body = await response.get_data()
+        if len(body) >= self.min_size:
+            compressed = await asyncio.to_thread(self.encoders[encoding], body, self.level)
+            self._apply(response, encoding, body, compressed)
+        return response
@@ -0,0 +1,79 @@
+import contextvars
+import time
+
+"""
+------------------------------------------------------------------------------------------------
+Request deadlines, propagated from pet-order to the stores.
+
+The remaining budget travels as a relative number of milliseconds in the
+X-Deadline-Ms header (relative, so the hosts' clocks do not need to agree).
+Each hop turns it back into a local Deadline and re-sends what is left. A hop
+that runs out of time answers 504 with X-Deadline-Exceeded: 1, which the
+caller tells apart from a store failure (it does not trip the circuit breaker).
+------------------------------------------------------------------------------------------------
+"""
+
+DEADLINE_HEADER = "X-Deadline-Ms"
+EXCEEDED_HEADER = "X-Deadline-Exceeded"
+EXCEEDED_STATUS = 504
+
+
+class DeadlineExceeded(Exception):
+    """ Raised when there is no budget left for the next step. """
+
+
+class Deadline:
+    def __init__(self, seconds):
+        self.expires_at = time.monotonic() + seconds
+
+    @classmethod
+    def from_header(cls, value):
+        """
+        Build a Deadline from an X-Deadline-Ms value, None if missing or invalid.
+        """
+        try:
+            return cls(max(0.0, float(value)) / 1000) if value else None
+        except ValueError:
+            return None
+
+    def remaining(self):
+        return self.expires_at - time.monotonic()
+
+    def check(self, step="request"):
+        if self.remaining() <= 0:
+            raise DeadlineExceeded(f"Deadline exceeded before {step}")
+
+    def timeout(self, cap):
+        """
+        Per-call timeout: the call's own cap, or less if the budget is shorter.
+        """
+        self.check()
+        return min(cap, self.remaining())
+
+    def header(self):
+        return {DEADLINE_HEADER: str(max(0, int(self.remaining() * 1000)))}
+
+
+# Deadline of the request being served. Set per request; worker threads get it
+# by running their task in a copy of the submitting context (see in_context).
+_current = contextvars.ContextVar("deadline", default=None)
+
+
+def current():
+    return _current.get()
+
+
+def activate(deadline):
+    return _current.set(deadline)
+
+
+def deactivate(token):
+    _current.reset(token)
+
+
+def in_context(fn):
+    """
+    Wrap fn so that it runs with the caller's deadline, in whatever thread it ends up.
+    """
+    ctx = contextvars.copy_context()
+    return lambda *args, **kwargs: ctx.run(fn, *args, **kwargs)
@@ -0,0 +1,95 @@
+import asyncio
+import os
+import threading
+import time
+
+"""
+------------------------------------------------------------------------------------------------
+Liveness / readiness helpers.
+
+- /healthz answers as long as the process serves HTTP, it never touches Mongo.
+- /readyz runs a short dependency check (a Mongo ping). The result is cached for
+  `cache_seconds` so frequent polling by orchestrators / wait loops stays cheap.
+The time from process start to the first successful readiness check is recorded
+and reported as "startup_seconds".
+------------------------------------------------------------------------------------------------
+"""
+
+
+def process_started_at():
+    """
+    Helper function returning the process start time on the time.monotonic() clock.
+    Uses /proc when available (includes interpreter start and imports), import time otherwise.
+    """
+    try:
+        with open("/proc/self/stat") as f:
+            # Field 22 is the start time in clock ticks since boot, the comm field may contain spaces
+            fields = f.read().rsplit(")", 1)[1].split()
+        start_ticks = int(fields[19])
+        with open("/proc/uptime") as f:
+            uptime = float(f.read().split()[0])
+        age = uptime - start_ticks / os.sysconf("SC_CLK_TCK")
+        return time.monotonic() - max(age, 0.0)
+    except (OSError, ValueError, IndexError):
+        return time.monotonic()
+
+
+class ReadinessProbe:
+    def __init__(self, check, cache_seconds=2.0, started_at=None):
+        self.check = check
+        self.cache_seconds = cache_seconds
+        self.started_at = process_started_at() if started_at is None else started_at
+        self.startup_seconds = None
+
+        self._lock = threading.Lock()
+        self._checked_at = None
+        self._error = None
+
+    def status(self):
+        """
+        Return (ready, body). The check itself runs at most once per `cache_seconds`.
+        """
+        with self._lock:
+            if self._due():
+                try:
+                    self.check()
+                    self._record(None)
+                except Exception as e:
+                    self._record(str(e))
+            return self._result()
+
+    def _due(self):
+        return self._checked_at is None or time.monotonic() - self._checked_at >= self.cache_seconds
+
+    def _record(self, error):
+        self._error = error
+        self._checked_at = time.monotonic()
+        if error is None and self.startup_seconds is None:
+            self.startup_seconds = round(self._checked_at - self.started_at, 3)
+            print(f"Ready {self.startup_seconds}s after process start")
+
+    def _result(self):
+        ready = self._error is None
+        body = {"status": "ready" if ready else "not ready", "startup_seconds": self.startup_seconds}
+        if not ready:
+            body["error"] = self._error
+        return ready, body
+
+
+class AsyncReadinessProbe(ReadinessProbe):
+    """
+    ReadinessProbe for a coroutine check, status() is awaited (asyncio build of pet-order).
+    """
+    def __init__(self, check, cache_seconds=2.0, started_at=None):
+        super().__init__(check, cache_seconds, started_at)
+        self._async_lock = asyncio.Lock()
+
+    async def status(self):
+        async with self._async_lock:
+            if self._due():
+                try:
+                    await self.check()
+                    self._record(None)
+                except Exception as e:
+                    self._record(str(e))
+            return self._result()
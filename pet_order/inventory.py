@@ -0,0 +1,151 @@
+import threading
+import time
+
+"""
+------------------------------------------------------------------------------------------------
+Federated inventory view: for every store, pet type -> {id, pet names}.
+
+A background thread polls each registered store's GET /pet-types every
+`refresh_interval` seconds with If-None-Match, so an unchanged store answers
+304 with no body. A store's data is only trusted for `max_staleness` seconds
+after its last successful poll; after that lookups report it as unknown and
+callers fall back to asking the store live.
+------------------------------------------------------------------------------------------------
+"""
+
+
+class InventoryView:
+    def __init__(self, registry, fetch, refresh_interval=5.0, max_staleness=15.0):
+        """
+        fetch(store_id, url, etag) -> (status code, etag, pet-types list or None)
+        """
+        self.registry = registry
+        self.fetch = fetch
+        self.refresh_interval = refresh_interval
+        self.max_staleness = max_staleness
+
+        self._lock = threading.Lock()
+        self._stores = {}   # store id -> {"types": {lower name: entry}, "etag", "refreshed_at", "invalidated"}
+        self._thread = None
+        self._polls = 0
+        self._not_modified = 0
+        self._errors = 0
+
+    #---------------------REFRESH-----------------------
+    def start(self):
+        if self._thread is None and self.refresh_interval > 0:
+            self._thread = threading.Thread(target=self._run, name="inventory-refresh", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            self.refresh_all()
+            time.sleep(self.refresh_interval)
+
+    def refresh_all(self):
+        stores = self.registry.snapshot()
+        with self._lock:
+            # Forget stores that were removed from the registry
+            for sid in set(self._stores) - set(stores):
+                del self._stores[sid]
+        for sid, url in stores.items():
+            self.refresh(sid, url)
+
+    def refresh(self, store_id, url):
+        with self._lock:
+            etag = (self._stores.get(store_id) or {}).get("etag")
+        try:
+            status, new_etag, pet_types = self.fetch(store_id, url, etag)
+        except Exception as e:
+            with self._lock:
+                self._errors += 1
+            print(f"Inventory refresh of store {store_id} failed: {e}")
+            return
+
+        with self._lock:
+            self._polls += 1
+            if status == 304 and store_id in self._stores:
+                self._not_modified += 1
+                self._stores[store_id]["refreshed_at"] = time.monotonic()
+                self._stores[store_id]["invalidated"] = False
+            elif status == 200 and isinstance(pet_types, list):
+                types = {}
+                for t in pet_types:
+                    name = (t.get("type") or "").lower()
+                    if name and name not in types:
+                        types[name] = {"type": t.get("type"), "id": str(t.get("id")), "pets": list(t.get("pets") or [])}
+                self._stores[store_id] = {
+                    "types": types, "etag": new_etag, "refreshed_at": time.monotonic(), "invalidated": False,
+                }
+            else:
+                self._errors += 1
+
+    #---------------------READS-----------------------
+    def lookup(self, store_id, pet_type_name):
+        """
+        Return (fresh, entry). fresh is False when the store's data is missing or
+        older than max_staleness; otherwise entry is None if the store has no such type.
+        """
+        with self._lock:
+            store = self._stores.get(store_id)
+            if store is None or self._is_stale(store):
+                return False, None
+            entry = store["types"].get(pet_type_name.lower())
+            return True, (dict(entry, pets=list(entry["pets"])) if entry else None)
+
+    def view(self, pet_type_name=None):
+        """
+        Return the current view as a list of {store, type, type-id, pets, age-seconds, stale}.
+        """
+        now = time.monotonic()
+        rows = []
+        with self._lock:
+            for sid, store in sorted(self._stores.items()):
+                age = now - store["refreshed_at"]
+                for name, entry in sorted(store["types"].items()):
+                    if pet_type_name and name != pet_type_name.lower():
+                        continue
+                    rows.append({
+                        "store": sid,
+                        "type": entry["type"],
+                        "type-id": entry["id"],
+                        "pets": list(entry["pets"]),
+                        "age-seconds": round(age, 2),
+                        "stale": self._is_stale(store),
+                    })
+        return rows
+
+    def _is_stale(self, store):
+        # Caller must hold self._lock
+        return store["invalidated"] or time.monotonic() - store["refreshed_at"] > self.max_staleness
+
+    #---------------------LOCAL UPDATES-----------------------
+    def remove_pet(self, store_id, pet_type_name, pet_name):
+        """
+        Apply our own purchase without waiting for the next poll.
+        """
+        with self._lock:
+            entry = (self._stores.get(store_id) or {}).get("types", {}).get(pet_type_name.lower())
+            if entry and pet_name in entry["pets"]:
+                entry["pets"].remove(pet_name)
+
+    def invalidate(self, store_id):
+        """
+        Stop trusting a store's data (e.g. a purchase failed against it) until the next poll.
+        """
+        with self._lock:
+            store = self._stores.get(store_id)
+            if store is not None:
+                store["invalidated"] = True
+                store["etag"] = None
+
+    def stats(self):
+        with self._lock:
+            return {
+                "stores": len(self._stores),
+                "polls": self._polls,
+                "not_modified": self._not_modified,
+                "errors": self._errors,
+                "refresh_interval": self.refresh_interval,
+                "max_staleness": self.max_staleness,
+            }
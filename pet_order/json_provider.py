@@ -0,0 +1,143 @@
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:  # optional, falls back to the stdlib json module
+    orjson = None
+
+"""
+------------------------------------------------------------------------------------------------
+JSON serialization for the Flask app.
+
+FastJSONProvider serializes with orjson when it is installed (JSON_PROVIDER=orjson,
+the default) and with the stdlib otherwise (JSON_PROVIDER=stdlib). Output keeps
+Flask's format: sorted keys, compact, trailing newline, and non-ASCII text
+escaped as \\uXXXX (ensure_ascii). orjson always writes raw UTF-8, so a body
+that is not pure ASCII is serialized again by the stdlib.
+
+SerializedResponseCache keeps already serialized response bodies of list
+endpoints, so a repeated read skips both Mongo and serialization.
+------------------------------------------------------------------------------------------------
+"""
+
+
+def _use_orjson():
+    return orjson is not None and os.environ.get("JSON_PROVIDER", "orjson") == "orjson"
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    def __init__(self, app):
+        super().__init__(app)
+        self.fast = _use_orjson()
+
+    def dumps_bytes(self, obj):
+        """
+        Serialize to UTF-8 bytes in the same format as jsonify (without the newline).
+        """
+        if self.fast:
+            body = orjson.dumps(obj, default=self.default, option=orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS)
+            if body.isascii() or not self.ensure_ascii:
+                return body
+        return json.dumps(obj, default=self.default, ensure_ascii=self.ensure_ascii,
+                          sort_keys=self.sort_keys, separators=(",", ":")).encode("utf-8")
+
+    def dumps(self, obj, **kwargs):
+        if self.fast and not kwargs.get("indent"):
+            return self.dumps_bytes(obj).decode("utf-8")
+        return super().dumps(obj, **kwargs)
+
+    def loads(self, s, **kwargs):
+        if self.fast and not kwargs:
+            return orjson.loads(s)
+        return super().loads(s, **kwargs)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        if self.fast and not self._app.debug:
+            return self.bytes_response(self.dumps_bytes(obj))
+        return super().response(obj)
+
+    def bytes_response(self, body, status=200):
+        """
+        Build a JSON response from an already serialized body.
+        """
+        return self._app.response_class(body + b"\n", status=status, mimetype=self.mimetype)
+
+
+class SerializedResponseCache:
+    """
+    LRU of serialized response bodies keyed by a normalized query.
+    Any write calls invalidate(), entries also expire after `ttl` seconds.
+    """
+    def __init__(self, max_entries=128, ttl=30.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()   # key -> (expires_at, body)
+        self._generation = 0
+        self._hits = 0
+        self._misses = 0
+        self._invalidations = 0
+
+    @staticmethod
+    def key(query):
+        """
+        Helper to turn a query dict into a stable cache key.
+        """
+        return json.dumps(query, sort_keys=True, default=str)
+
+    @property
+    def generation(self):
+        """
+        Read before running the query, pass to put() so a body computed while a
+        write happened is never cached.
+        """
+        with self._lock:
+            return self._generation
+
+    def get(self, key):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(key)
+                self._hits += 1
+                return entry[1]
+            if entry is not None:
+                del self._entries[key]
+            self._misses += 1
+            return None
+
+    def put(self, key, body, generation):
+        with self._lock:
+            if generation != self._generation:
+                return
+            self._entries[key] = (time.monotonic() + self.ttl, body)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, *_):
+        with self._lock:
+            self._generation += 1
+            self._invalidations += 1
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "size": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl": self.ttl,
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_rate": round(self._hits / lookups, 4) if lookups else None,
+                "invalidations": self._invalidations,
+            }
@@ -1,47 +1,397 @@
-from flask import Flask, jsonify, request
+from flask import Blueprint, Flask, current_app, g, jsonify, request
 import requests
 import os
+import threading
+import time
 from pymongo import MongoClient
+import pymongo
 import random
 import uuid
+from urllib.parse import quote
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout, as_completed, wait
+from store_registry import StoreRegistry
+from json_provider import FastJSONProvider, SerializedResponseCache
+from health import ReadinessProbe
+from admission import AdmissionLimiter, admission_controlled
+from circuit_breaker import BreakerBoard
+from inventory import InventoryView
+from store_selection import StoreSelector
+from compression import ResponseCompressor
+from traffic_capture import TrafficCapture
+from snapshot_file import SnapshotFile
+from read_routing import ReadRouting
+from transaction_repository import MemoryTransactionRepository, TransactionRepository
+import deadline
+from deadline import DEADLINE_HEADER, EXCEEDED_HEADER, EXCEEDED_STATUS, Deadline, DeadlineExceeded
 
-app = Flask(__name__)
+bp = Blueprint("pet_order", __name__)
 
 # -----------------------------------------------------------
 # CONFIGURATION
 # -----------------------------------------------------------
-# Connect to MongoDB
+# Transactions storage, created by init_storage() on the first request that needs it.
+# STORAGE_ENGINE is "mongo" (default) or "memory" (in process, optionally persisted to STORAGE_SNAPSHOT)
+STORAGE_ENGINE = os.environ.get('STORAGE_ENGINE', 'mongo')
 mongo_uri = os.environ.get('MONGO_URI', 'mongodb://localhost:27017')
-client = MongoClient(mongo_uri)
+client = None
+read_routing = None
+transactions = None
+_storage_lock = threading.Lock()
 
-db = client['order_db']
-transactions_col = db['transactions']
+# Routes that must answer without the storage being initialized
+HEALTH_ENDPOINTS = {"pet_order.healthz", "pet_order.readyz"}
 
-# Store Service URLs
-STORE1_URL = "http://pet-store1:8000"
-STORE2_URL = "http://pet-store2:8000"
+# Serialized GET /transactions bodies, dropped whenever a transaction is written
+transactions_response_cache = SerializedResponseCache(
+    max_entries=int(os.environ.get("RESPONSE_CACHE_SIZE", "128")),
+    ttl=float(os.environ.get("RESPONSE_CACHE_TTL", "30")),
+)
+
+# Store Service URLs (store id -> base url), see store_registry.py
+store_registry = StoreRegistry.from_env()
+
+# When no store is given, stores are searched in parallel and the search gives up
+# after STORE_SEARCH_TIMEOUT seconds, whatever the store count. Each request fans
+# out on its own pool of at most STORE_SEARCH_WORKERS threads, so the purchases
+# admitted at once never queue behind each other's store calls.
+STORE_SEARCH_WORKERS = int(os.environ.get("STORE_SEARCH_WORKERS", "16"))
+STORE_SEARCH_TIMEOUT = float(os.environ.get("STORE_SEARCH_TIMEOUT", "6"))
+# Timeout of a store call that does not set its own
+STORE_CALL_TIMEOUT = float(os.environ.get("STORE_CALL_TIMEOUT", "5"))
+
+# A store that keeps failing / timing out is skipped instantly until a probe succeeds
+store_breakers = BreakerBoard(
+    failure_threshold=int(os.environ.get("BREAKER_FAILURE_THRESHOLD", "3")),
+    reset_timeout=float(os.environ.get("BREAKER_RESET_TIMEOUT", "10")),
+    half_open_max=int(os.environ.get("BREAKER_HALF_OPEN_PROBES", "1")),
+)
+
+OWNER_PC = "LovesPetsL2M3n4"
+
+# Total time a purchase may take when the client does not send its own X-Deadline-Ms.
+# Every store call gets at most what is left, and is told so in the same header.
+PURCHASE_BUDGET_MS = float(os.environ.get("PURCHASE_BUDGET_MS", "15000"))
+# The DELETE that takes a pet out of its store is the purchase's commit point: once
+# started it gets this timeout whatever is left of the budget, and a delete the store
+# confirms is always recorded as a transaction.
+PURCHASE_COMMIT_TIMEOUT = float(os.environ.get("PURCHASE_COMMIT_TIMEOUT", "5"))
+PURCHASE_ENDPOINTS = {"pet_order.purchase_pet", "pet_order.purchase_batch"}
+
+# Largest number of purchases accepted by one POST /purchases/batch
+PURCHASE_BATCH_MAX = int(os.environ.get("PURCHASE_BATCH_MAX", "100"))
+
+# Admission control: purchases may block on several store calls, so only a bounded
+# number run at once and the rest wait briefly or get 503. Reporting has its own,
+# smaller budget so /transactions can never starve purchases.
+purchase_limiter = AdmissionLimiter(
+    "purchases",
+    max_concurrent=int(os.environ.get("PURCHASE_MAX_CONCURRENT", "16")),
+    max_queue=int(os.environ.get("PURCHASE_MAX_QUEUE", "32")),
+    queue_timeout=float(os.environ.get("PURCHASE_QUEUE_TIMEOUT", "0.5")),
+)
+transactions_limiter = AdmissionLimiter(
+    "transactions",
+    max_concurrent=int(os.environ.get("TRANSACTIONS_MAX_CONCURRENT", "4")),
+    max_queue=int(os.environ.get("TRANSACTIONS_MAX_QUEUE", "8")),
+    queue_timeout=float(os.environ.get("TRANSACTIONS_QUEUE_TIMEOUT", "0.25")),
+)
 
 # -----------------------------------------------------------
 # Helper Functions
 # -----------------------------------------------------------
 
 
-def get_type_id(store_url, pet_type_name):
+def init_storage():
+    """ Helper to connect to MongoDB / load the in-memory engine (once). """
+    global client, read_routing, transactions
+    if transactions is not None:
+        return
+    with _storage_lock:
+        if transactions is not None:
+            return
+        if STORAGE_ENGINE == 'memory':
+            snapshot_file = SnapshotFile(
+                os.environ.get('STORAGE_SNAPSHOT'),
+                interval=float(os.environ.get('STORAGE_SNAPSHOT_INTERVAL', '1')),
+            )
+            new_transactions = MemoryTransactionRepository(snapshot_file)
+            snapshot_file.start()
+        elif STORAGE_ENGINE == 'mongo':
+            client = MongoClient(mongo_uri)
+            # GET /transactions may read from secondaries (READ_PREFERENCE / READ_MAX_STALENESS)
+            read_routing = ReadRouting.from_env(client)
+            new_transactions = TransactionRepository(client['order_db']['transactions'], read_routing)
+        else:
+            raise ValueError(f"Unknown STORAGE_ENGINE {STORAGE_ENGINE!r}")
+        transactions = new_transactions
+
+
+def ping_storage():
+    # The whole check (first-time setup included) is bounded
+    with pymongo.timeout(float(os.environ.get("READY_PING_TIMEOUT", "1"))):
+        init_storage()
+        if client is None:
+            return  # in-process engine, nothing to reach
+        client.admin.command("ping")
+
+
+readiness = ReadinessProbe(ping_storage, cache_seconds=float(os.environ.get("READY_CACHE_SECONDS", "2")))
+
+
+@bp.before_app_request
+def prepare_request():
+    if request.endpoint not in HEALTH_ENDPOINTS:
+        init_storage()
+
+    request_deadline = Deadline.from_header(request.headers.get(DEADLINE_HEADER))
+    if request_deadline is None and request.endpoint in PURCHASE_ENDPOINTS:
+        request_deadline = Deadline(PURCHASE_BUDGET_MS / 1000)
+    if request_deadline is not None:
+        g.deadline_token = deadline.activate(request_deadline)
+
+
+@bp.teardown_app_request
+def release_deadline(exc):
+    token = g.pop("deadline_token", None)
+    if token is not None:
+        deadline.deactivate(token)
+
+
+@bp.app_errorhandler(DeadlineExceeded)
+def deadline_exceeded(e):
+    return jsonify({"error": "Deadline exceeded"}), EXCEEDED_STATUS, {EXCEEDED_HEADER: "1"}
+
+
+def owner_authorized():
+    """ Helper to check the OwnerPC header required by the owner-only routes. """
+    return request.headers.get('OwnerPC') == OWNER_PC
+
+
+class StoreUnavailable(Exception):
+    """ Raised instead of calling a store whose circuit breaker is open. """
+
+
+def store_request(store_id, method, url, commit=False, **kwargs):
+    """ Helper to send a request to a store through its circuit breaker.
+    Connection errors, timeouts and 5xx answers count as failures.
+    Under a request deadline the call's timeout is cut to the remaining budget,
+    which is forwarded in X-Deadline-Ms; running out of it is not the store's failure.
+    A commit call (the purchase DELETE) is only refused when the budget is already
+    gone; once sent it keeps its full timeout, so its outcome is never abandoned.
+    Raises:
+        DeadlineExceeded if the budget is used up (before or during the call),
+        StoreUnavailable if the breaker does not let the call through,
+        requests exceptions if the call itself fails.
+    """
+    # Advertise every encoding requests can decode (gzip, deflate, and br / zstd when installed)
+    headers = {"Accept-Encoding": requests.utils.DEFAULT_ACCEPT_ENCODING, **(kwargs.get("headers") or {})}
+    request_deadline = deadline.current()
+    clipped = False
+    if request_deadline is not None:
+        cap = kwargs.get("timeout", STORE_CALL_TIMEOUT)
+        if commit:
+            request_deadline.check()
+            kwargs["timeout"] = cap
+            headers[DEADLINE_HEADER] = str(int(max(cap, request_deadline.remaining()) * 1000))
+        else:
+            kwargs["timeout"] = request_deadline.timeout(cap)
+            clipped = kwargs["timeout"] < cap
+            headers.update(request_deadline.header())
+    kwargs["headers"] = headers
+
+    breaker = store_breakers.get(store_id)
+    if not breaker.allow():
+        raise StoreUnavailable(f"Store {store_id} circuit is open")
+    started = time.monotonic()
+    try:
+        response = requests.request(method, url, **kwargs)
+    except requests.exceptions.Timeout:
+        if clipped:
+            breaker.cancel_probe()
+            raise DeadlineExceeded(f"Deadline exceeded calling store {store_id}")
+        breaker.record_failure()
+        store_selector.record(store_id, time.monotonic() - started, ok=False)
+        raise
+    except requests.exceptions.RequestException:
+        breaker.record_failure()
+        store_selector.record(store_id, time.monotonic() - started, ok=False)
+        raise
+    if response.headers.get(EXCEEDED_HEADER):
+        breaker.cancel_probe()
+        raise DeadlineExceeded(f"Store {store_id} ran out of the deadline")
+    if response.status_code >= 500:
+        breaker.record_failure()
+    else:
+        breaker.record_success()
+    store_selector.record(store_id, time.monotonic() - started, ok=response.status_code < 500)
+    return response
+
+
+def get_type_id(store_id, store_url, pet_type_name):
     """ Helper function to retrieve the numeric ID of a given pet type string from the specified store.
+    The store is asked for this type only (?type=, its exact, indexed match); only when that
+    misses is the full list read, for a case-insensitive match of the name.
     Args:
+        store_id: ID of the store (selects its circuit breaker).
         store_url: Base URL of the pet store service.
         pet_type_name: The name of the pet type whose ID is needed.
     Returns:
         String ID of the pet type if found, otherwise None.
+    Raises:
+        DeadlineExceeded if the request's budget runs out.
     """
+    name = pet_type_name.strip()
     try:
-        response = requests.get(f"{store_url}/pet-types", timeout=2)
-        if response.status_code == 200:
+        for params in ({"type": name}, None):
+            response = store_request(store_id, "GET", f"{store_url}/pet-types", params=params, timeout=2)
+            if response.status_code != 200:
+                return None
             for t in response.json():
-                if t.get('type', '').lower() == pet_type_name.lower():
+                if t.get('type', '').lower() == name.lower():
                     return str(t.get('id'))
-    except:
-        pass
+    except (requests.RequestException, StoreUnavailable) as e:
+        print(f"Could not look up pet type {name} in store {store_id}: {e}")
+    return None
+
+
+def fetch_pet_types(store_id, store_url, etag=None):
+    """ Helper used by the inventory view to (conditionally) poll a store's pet-types.
+    Returns:
+        Tuple of (status code, etag, pet-types list or None)
+    """
+    headers = {"If-None-Match": etag} if etag else {}
+    response = store_request(store_id, "GET", f"{store_url}/pet-types", headers=headers, timeout=2)
+    if response.status_code != 200:
+        return response.status_code, etag, None
+    return 200, response.headers.get("ETag"), response.json()
+
+
+# Aggregated view of every store's pet-types and pet names, see inventory.py
+inventory = InventoryView(
+    store_registry,
+    fetch_pet_types,
+    refresh_interval=float(os.environ.get("INVENTORY_REFRESH_INTERVAL", "5")),
+    max_staleness=float(os.environ.get("INVENTORY_MAX_STALENESS", "15")),
+)
+
+
+def inventory_stock(store_id, pet_type_name):
+    """ Helper for the store selector: pets of a type in a store per the (fresh) inventory view, None if unknown. """
+    fresh, entry = inventory.lookup(store_id, pet_type_name)
+    if not fresh:
+        return None
+    return len(entry["pets"]) if entry else 0
+
+
+# Which store to search first when the purchase does not name one, see store_selection.py.
+# Fed by every store call (latency / errors) and by the pet lists seen (stock).
+store_selector = StoreSelector(
+    policy=os.environ.get("SELECTION_POLICY", "p2c"),
+    alpha=float(os.environ.get("SELECTION_EWMA_ALPHA", "0.2")),
+    stock_ttl=float(os.environ.get("SELECTION_STOCK_TTL", "10")),
+    stock_target=int(os.environ.get("SELECTION_STOCK_TARGET", "5")),
+    min_share=float(os.environ.get("SELECTION_MIN_SHARE", "0.05")),
+    stock_lookup=inventory_stock,
+)
+
+
+def has_stock(entry, pet_name=None):
+    """ Helper to tell from an inventory entry whether a store can sell the requested pet. """
+    if not entry or not entry["pets"]:
+        return False
+    if pet_name is None:
+        return True
+    pet_name_lower = pet_name.lower().strip()
+    return any(p.lower().strip() == pet_name_lower for p in entry["pets"])
+
+
+def ruled_out_by_inventory(store_id, pet_type_name, pet_name=None):
+    """ Helper: True if the (fresh) inventory view says this store has no matching pet. """
+    fresh, entry = inventory.lookup(store_id, pet_type_name)
+    return fresh and not has_stock(entry, pet_name)
+
+
+def search_store(store_id, store_url, pet_type_name, pet_name=None):
+    """
+    Helper to look for an available pet in a single store, using the inventory view first.
+
+    When the view says there is stock, its type id saves the type lookup; if the
+    store then disagrees the view is stale, and the store is checked live.
+    """
+    fresh, entry = inventory.lookup(store_id, pet_type_name)
+    if fresh and has_stock(entry, pet_name):
+        found = check_store(store_id, store_url, pet_type_name, pet_name, type_id=entry["id"])
+        if found:
+            return found
+        inventory.invalidate(store_id)
+    return check_store(store_id, store_url, pet_type_name, pet_name)
+
+
+def fetch_pets(store_id, store_url, type_id):
+    """ Helper to download the pets of a pet type from a store.
+    Returns:
+        List of pet objects, or None if the store does not answer with one.
+    """
+    pets_response = store_request(store_id, "GET", f"{store_url}/pet-types/{type_id}/pets", timeout=5)
+    if pets_response.status_code != 200:
+        return None  # This store doesn't have this pet type
+    pets = pets_response.json()
+    return pets if isinstance(pets, list) else None
+
+
+def pet_url(store_url, type_id, pet_name):
+    """ Helper to build the URL of one pet in a store. """
+    return f"{store_url}/pet-types/{type_id}/pets/{quote(pet_name, safe='')}"
+
+
+def fetch_pet(store_id, store_url, type_id, pet_name):
+    """ Helper to fetch one pet by name (any case) from a store.
+    Returns:
+        The pet object, or None if the store has no such pet.
+    """
+    response = store_request(store_id, "GET", pet_url(store_url, type_id, pet_name), timeout=5)
+    if response.status_code != 200:
+        return None
+    pet = response.json()
+    return pet if isinstance(pet, dict) and pet.get("name") else None
+
+
+def check_store(store_id, store_url, pet_type_name, pet_name=None, type_id=None):
+    """
+    Helper to look for an available pet in a single store.
+
+    Args:
+        type_id: Known type ID of the pet type in this store, looked up when None
+
+    Returns:
+        Tuple of (pet_object, store_id, store_url, type_id) or None
+    """
+    # Get the type ID for this pet type
+    if type_id is None:
+        type_id = get_type_id(store_id, store_url, pet_type_name)
+    if not type_id:
+        return None  # This store doesn't have this pet type
+
+    try:
+        # Select pet based on criteria
+        if pet_name:
+            # Ask the store for this pet only (the store matches names case-insensitively)
+            selected_pet = fetch_pet(store_id, store_url, type_id, pet_name.strip())
+        else:
+            # Get all pets of this type from the store
+            pets = fetch_pets(store_id, store_url, type_id)
+            store_selector.observe_stock(store_id, pet_type_name, len(pets or []))
+            if not pets:
+                return None  # No pets available
+            # Choose random pet from available ones
+            selected_pet = random.choice(pets)
+
+        # If a pet is found, return it, the store ID, the store URL, and the type ID
+        if selected_pet:
+            return selected_pet, store_id, store_url, type_id
+
+    except Exception as e:
+        print(f"Error checking store {store_id}: {e}")
     return None
 
 
@@ -52,72 +402,209 @@ def find_available_pet(pet_type_name, store_id=None, pet_name=None):
     Selection rules:
     1. If store AND pet-name given: pet must exist in that specific store
     2. If store given but NO pet-name: choose random pet from that store
-    3. If NO store given: choose random pet from ANY store
+    3. If NO store given: choose random pet from ANY store, trying first the
+       store picked by the store selector (fast, with stock), then all the others
     
     Args:
         pet_type_name: Type of pet to find
-        store_id: Optional store ID (1 or 2)
+        store_id: Optional store ID (any id in the store registry)
         pet_name: Optional specific pet name
     
     Returns:
         Tuple of (pet_object, store_id, store_url, type_id) or (None, None, None, None)
     """
-    store_map = {1: STORE1_URL, 2: STORE2_URL}
-    
+    not_found = (None, None, None, None)
+    stores = store_registry.snapshot()
+
     # If store_id is provided, only check that store
     if store_id is not None:
+        if store_id not in stores or not store_breakers.get(store_id).available():
+            return not_found
         store_ids = [store_id]
     else:
-        # If no store_id, check both stores
-        store_ids = [1, 2]
-        random.shuffle(store_ids)  # Randomize for fairness
-    
-    # Search through stores
-    for sid in store_ids:
-        # Get the store URL for the current store
-        store_url = store_map[sid]
-        
-        # Get the type ID for this pet type
-        type_id = get_type_id(store_url, pet_type_name)
-        if not type_id:
-            continue  # This store doesn't have this pet type
-        
-        try:
-            # Get all pets of this type from the store
-            pets_response = requests.get(f"{store_url}/pet-types/{type_id}/pets", timeout=5)
-            
-            if pets_response.status_code != 200:
-                continue  # This store doesn't have this pet type
-            
-            pets = pets_response.json()
-            if not isinstance(pets, list) or len(pets) == 0:
-                continue  # No pets available
-            
-            # Select pet based on criteria
-            if pet_name:
-                # Find specific pet by name (case-insensitive)
-                pet_name_lower = pet_name.lower().strip()
-                selected_pet = next((p for p in pets if p.get("name", "").lower().strip() == pet_name_lower), None)
-            else:
-                # Choose random pet from available ones
-                selected_pet = random.choice(pets)
-            
-            # If a pet is found, return it, the store ID, the store URL, and the type ID
-            if selected_pet:
-                return selected_pet, sid, store_url, type_id
-        
-        except Exception as e:
-            print(f"Error checking store {sid}: {e}")
-            continue
-    
-    # No matching pet found
-    return None, None, None, None
+        # If no store_id, check all stores in the selector's order.
+        # Stores with an open breaker are skipped.
+        store_ids = [sid for sid in stores if store_breakers.get(sid).available()]
+
+    # First the stores the inventory view does not rule out...
+    ruled_out = [sid for sid in store_ids if ruled_out_by_inventory(sid, pet_type_name, pet_name)]
+    candidates = store_selector.order([sid for sid in store_ids if sid not in ruled_out], pet_type_name)
+    if store_selector.policy != "random" and len(candidates) > 1:
+        # ...the preferred one alone, so slow or empty stores are not asked every time...
+        found = search_stores(stores, candidates[:1], search_store, pet_type_name, pet_name)
+        if found:
+            return found
+        candidates = candidates[1:]
+    found = search_stores(stores, candidates, search_store, pet_type_name, pet_name)
+    if found:
+        return found
+
+    # ...then, as the view may be stale, a live check of the ones it ruled out
+    return search_stores(stores, ruled_out, check_store, pet_type_name, pet_name) or not_found
+
+
+def store_pool(calls):
+    """ Helper to create the pool of one request's fan-out of `calls` store calls.
+    Shut it down with wait=False: calls still running finish in the background.
+    """
+    return ThreadPoolExecutor(max_workers=max(1, min(calls, STORE_SEARCH_WORKERS)), thread_name_prefix="store-search")
+
+
+def search_stores(stores, store_ids, search, pet_type_name, pet_name=None):
+    """
+    Helper to run `search` on several stores in parallel and return the first hit (or None).
+    The request's bounded pool and STORE_SEARCH_TIMEOUT keep the cost bounded whatever the store count.
+    """
+    if not store_ids:
+        return None
+    if len(store_ids) == 1:
+        return search(store_ids[0], stores[store_ids[0]], pet_type_name, pet_name)
+
+    # No new fan-out once the request deadline is gone, and never wait past it
+    timeout = STORE_SEARCH_TIMEOUT
+    request_deadline = deadline.current()
+    if request_deadline is not None:
+        if request_deadline.remaining() <= 0:
+            return None
+        timeout = min(timeout, request_deadline.remaining())
+
+    # Each task runs with the request's deadline (see deadline.in_context)
+    pool = store_pool(len(store_ids))
+    futures = [
+        pool.submit(deadline.in_context(search), sid, stores[sid], pet_type_name, pet_name)
+        for sid in store_ids
+    ]
+    try:
+        for future in as_completed(futures, timeout=timeout):
+            found = future.result()
+            if found:
+                return found
+    except FutureTimeout:
+        print(f"Store search for {pet_type_name} timed out after {timeout:.2f}s")
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+    return None
+
+def validate_purchase(data):
+    """ Helper to validate one purchase request (POST /purchases body or batch item).
+    Returns:
+        The error message for a 400, or None if the request is valid.
+    """
+    if data is None or not isinstance(data, dict):
+        return "Malformed data"
+
+    purchaser = data.get("purchaser")
+    pet_type = data.get("pet-type")
+    store = data.get("store")
+    pet_name = data.get("pet-name")
+
+    if not purchaser or not isinstance(purchaser, str):
+        return "Malformed data"
+    if not pet_type or not isinstance(pet_type, str):
+        return "No pet of this type is available"
+
+    #pet_name can ONLY be supplied if store is supplied
+    if pet_name is not None and store is None:
+        return "Malformed data"
+
+    #validate store value
+    if store is not None:
+        if not isinstance(store, int) or isinstance(store, bool) or store not in store_registry:
+            return "Malformed data"
+
+    # validate pet_name is str if provided
+    if pet_name is not None and not isinstance(pet_name, str):
+        return "Malformed data"
+    return None
+
+
+def run_on_stores(fn, calls, commit=False):
+    """ Helper to run fn(*args) for every args tuple on a store pool, under the request deadline.
+    With commit=True (fn makes commit calls, see store_request) every call is waited
+    for: each one is bounded by its own timeout, and one that has not started by the
+    deadline fails with DeadlineExceeded without reaching its store.
+    Returns:
+        One entry per call, in order: its result, the exception it raised,
+        or None if it did not finish in time.
+    """
+    if not calls:
+        return []
+    timeout = None if commit else STORE_SEARCH_TIMEOUT
+    request_deadline = deadline.current()
+    if request_deadline is not None and not commit:
+        timeout = max(0.0, min(timeout, request_deadline.remaining()))
+
+    pool = store_pool(len(calls))
+    futures = [pool.submit(deadline.in_context(fn), *args) for args in calls]
+    done, _ = wait(futures, timeout=timeout)
+    pool.shutdown(wait=False, cancel_futures=True)
+    return [(f.exception() or f.result()) if f in done else None for f in futures]
+
+
+def fetch_stock(store_id, store_url, pet_type_name):
+    """ Helper for batch purchases: the type ID and pets of a pet type in one store.
+    The inventory view saves the type lookup when it knows the type.
+    Returns:
+        Tuple of (type_id, pets list), or None if the store has no such pets.
+    """
+    fresh, entry = inventory.lookup(store_id, pet_type_name)
+    type_id = entry["id"] if fresh and entry else get_type_id(store_id, store_url, pet_type_name)
+    if not type_id:
+        return None
+    pets = fetch_pets(store_id, store_url, type_id)
+    store_selector.observe_stock(store_id, pet_type_name, len(pets or []))
+    return (type_id, pets) if pets else None
+
+
+def allocate_pets(items, stock):
+    """ Helper to give every purchase of one pet type a distinct pet.
+    Named pets are served first, then store-only requests, then the "any store" ones
+    (from the store the selector picks among those that still have pets), so that
+    no two buyers get the same pet.
+    Args:
+        items: List of (index, purchase request)
+        stock: Dict store_id -> (type_id, pets list), consumed as pets are allocated
+    Returns:
+        Dict index -> (store_id, type_id, pet)
+    """
+    for _, pets in stock.values():
+        random.shuffle(pets)
+
+    def take(store_id, pet_name=None):
+        if store_id not in stock:
+            return None
+        type_id, pets = stock[store_id]
+        for i, pet in enumerate(pets):
+            if pet_name is None or pet.get("name", "").lower().strip() == pet_name.lower().strip():
+                return store_id, type_id, pets.pop(i)
+        return None
+
+    allocated = {}
+    ordered = sorted(items, key=lambda item: (item[1].get("pet-name") is None, item[1].get("store") is None))
+    for index, item in ordered:
+        store_id = item.get("store")
+        if store_id is None:
+            with_pets = [sid for sid, (_, pets) in stock.items() if pets]
+            store_id = store_selector.choose(with_pets, item["pet-type"])
+        found = take(store_id, item.get("pet-name"))
+        if found:
+            allocated[index] = found
+    return allocated
+
+
+def delete_from_store(store_id, store_url, type_id, pet_name):
+    """ Helper to remove a sold pet from its store, True if the store deleted it (a commit call). """
+    response = store_request(
+        store_id, "DELETE", pet_url(store_url, type_id, pet_name), commit=True, timeout=PURCHASE_COMMIT_TIMEOUT
+    )
+    return response.status_code in [200, 204]
 
 # -----------------------------------------------------------
 # ROUTES
 # -----------------------------------------------------------
 
-@app.route('/purchases', methods=['POST'])
+@bp.route('/purchases', methods=['POST'])
+@admission_controlled(purchase_limiter)
 def purchase_pet():
     """
      Create a purchase transaction.
@@ -127,7 +614,7 @@ def purchase_pet():
       - pet-type (string): Type of pet to purchase
     
     Optional JSON fields:
-      - store (1 or 2): Specific store to purchase from
+      - store (int): Specific store to purchase from, must be a registered store id
       - pet-name (string): Specific pet name [ONLY if store is provided]
     
     Success:
@@ -136,6 +623,8 @@ def purchase_pet():
     Errors:
       - 415: Request is not application/json
       - 400: Malformed data, missing required fields, or no pet available
+      - 503: Too many purchases in progress (Retry-After header set)
+      - 504: The time budget (X-Deadline-Ms header, or PURCHASE_BUDGET_MS) ran out
     """
     
     # validate request content type
@@ -148,37 +637,17 @@ def purchase_pet():
     except Exception:
         return jsonify({"error": "Malformed data"}), 400
     
-    if data is None or not isinstance(data, dict):
-        return jsonify({"error": "Malformed data"}), 400
-    
-    #extract and validate fields
+    # Validate inputs
+    error = validate_purchase(data)
+    if error:
+        return jsonify({"error": error}), 400
+
+    #extract fields
     purchaser = data.get("purchaser")
     pet_type = data.get("pet-type")
     store = data.get("store")
     pet_name = data.get("pet-name")
     
-    
-    # Validate inputs
-    
-    if not purchaser or not isinstance(purchaser, str):
-        return jsonify({"error": "Malformed data"}), 400
-    if not pet_type or not isinstance(pet_type, str):
-        return jsonify({"error": "No pet of this type is available"}), 400
-
-    #pet_name can ONLY be supplied if store is supplied
-    if pet_name is not None and store is None:
-        return jsonify({"error": "Malformed data"}), 400
-    
-    #validate store value
-    if store is not None:
-        if not isinstance(store, int) or store not in [1, 2]:
-            return jsonify({"error": "Malformed data"}), 400
-        
-    # validate pet_name is str if provided
-    if pet_name is not None and not isinstance(pet_name, str):
-        return jsonify({"error": "Malformed data"}), 400
-        
-    
     #FIND the pet in the store
     selected_pet, target_store_id, target_store_url, target_type_id = find_available_pet(
         pet_type_name=pet_type,
@@ -187,21 +656,35 @@ def purchase_pet():
     )
     
     if not selected_pet:
+        # Tell "gave up" apart from "there is none"
+        deadline.current().check("finding a pet")
         return jsonify({"error": "No pet of this type is available"}), 400
     
     #DELETE the pet from the store
     actual_pet_name = selected_pet.get("name")
-    delete_url = f"{target_store_url}/pet-types/{target_type_id}/pets/{actual_pet_name}"
+    delete_url = pet_url(target_store_url, target_type_id, actual_pet_name)
     
     try:
-        delete_response = requests.delete(delete_url, timeout=5)
+        delete_response = store_request(
+            target_store_id, "DELETE", delete_url, commit=True, timeout=PURCHASE_COMMIT_TIMEOUT
+        )
         if delete_response.status_code not in [200, 204]:
             print(f"Failed to delete pet: Status {delete_response.status_code}")
+            inventory.invalidate(target_store_id)
             return jsonify({"error": "No pet of this type is available"}), 400
         
+    except DeadlineExceeded:
+        # The store may or may not have deleted the pet, re-read it on the next poll
+        inventory.invalidate(target_store_id)
+        raise
     except Exception as e:
         print(f"Error deleting pet: {e}")
+        inventory.invalidate(target_store_id)
         return jsonify({"error": "No pet of this type is available"}), 400
+
+    # Committed: from here on the purchase completes even if the budget has run out.
+    # Our own purchase, no need to wait for the next inventory poll
+    inventory.remove_pet(target_store_id, pet_type, actual_pet_name)
     
     #Generate purchase ID
     purchase_id = str(uuid.uuid4())
@@ -215,11 +698,12 @@ def purchase_pet():
     }
     
     
-    # Store MONGODB
+    # Store the transaction
     try:
-        transactions_col.insert_one(transaction_doc)
+        transactions.insert(transaction_doc)
+        transactions_response_cache.invalidate()
     except Exception as e:
-        print(f"Error storing transaction in MongoDB: {e}")
+        print(f"Error storing transaction: {e}")
         
     # Create and return purchase response
     purchase_response = {
@@ -233,7 +717,111 @@ def purchase_pet():
     return jsonify(purchase_response), 201
 
 
-@app.route('/transactions', methods=['GET'])
+@bp.route('/purchases/batch', methods=['POST'])
+@admission_controlled(purchase_limiter)
+def purchase_batch():
+    """
+    Create many purchase transactions in one call.
+
+    Body: {"purchases": [<purchase request>, ...]} (or the bare list), each item
+    with the fields of POST /purchases. Items are grouped by pet type: every
+    (store, pet type) is looked up once, buyers in the batch get distinct pets,
+    and all transactions are written with a single insert_many.
+
+    Success:
+      - 200 with {"results": [...]}, one per item in request order:
+        {"status": 201, <purchase object>} or {"status": 400 / 504, "error": ...}
+
+    Errors:
+      - 415: Request is not application/json
+      - 400: Malformed body, or more than PURCHASE_BATCH_MAX items
+      - 503: Too many purchases in progress (Retry-After header set)
+    """
+    if not request.content_type or "application/json" not in request.content_type:
+        return jsonify({"error": "Expected application/json media type"}), 415
+
+    data = request.get_json(silent=True)
+    items = data.get("purchases") if isinstance(data, dict) else data
+    if not isinstance(items, list) or not items:
+        return jsonify({"error": "Malformed data"}), 400
+    if len(items) > PURCHASE_BATCH_MAX:
+        return jsonify({"error": f"At most {PURCHASE_BATCH_MAX} purchases per batch"}), 400
+
+    results = [None] * len(items)
+    groups = {}     # lower-case pet type -> [(index, item)]
+    for index, item in enumerate(items):
+        error = validate_purchase(item)
+        if error:
+            results[index] = {"status": 400, "error": error}
+        else:
+            groups.setdefault(item["pet-type"].lower(), []).append((index, item))
+
+    # One stock lookup per (pet type, store), all in parallel
+    stores = store_registry.snapshot()
+    available = [sid for sid in stores if store_breakers.get(sid).available()]
+    lookups = []
+    for group in groups.values():
+        pet_type = group[0][1]["pet-type"]
+        wanted = {item.get("store") for _, item in group}
+        store_ids = available if None in wanted else [sid for sid in available if sid in wanted]
+        lookups += [(pet_type, sid) for sid in store_ids]
+    found = run_on_stores(fetch_stock, [(sid, stores[sid], pet_type) for pet_type, sid in lookups])
+
+    stock = {}      # lower-case pet type -> {store_id: (type_id, pets)}
+    for (pet_type, sid), result in zip(lookups, found):
+        if isinstance(result, tuple):
+            stock.setdefault(pet_type.lower(), {})[sid] = result
+
+    allocated = {}
+    for key, group in groups.items():
+        allocated.update(allocate_pets(group, stock.get(key, {})))
+
+    # Remove the selected pets from their stores, in parallel
+    sales = sorted(allocated.items())
+    deleted = run_on_stores(delete_from_store, [
+        (sid, stores[sid], type_id, pet.get("name")) for _, (sid, type_id, pet) in sales
+    ], commit=True)
+
+    transaction_docs = []
+    for (index, (sid, type_id, pet)), ok in zip(sales, deleted):
+        item = items[index]
+        if ok is not True:
+            if not isinstance(ok, DeadlineExceeded):
+                print(f"Failed to delete pet {pet.get('name')} from store {sid}: {ok}")
+            inventory.invalidate(sid)
+            continue
+        inventory.remove_pet(sid, item["pet-type"], pet.get("name"))
+        transaction_doc = {
+            "purchase-id": str(uuid.uuid4()),
+            "purchaser": item["purchaser"],
+            "pet-type": item["pet-type"],
+            "store": sid
+        }
+        transaction_docs.append(transaction_doc)
+        results[index] = dict(transaction_doc, **{"pet-name": pet.get("name"), "status": 201})
+
+    # All the batch's transactions in one write
+    if transaction_docs:
+        try:
+            transactions.insert_many(transaction_docs)
+            transactions_response_cache.invalidate()
+        except Exception as e:
+            print(f"Error storing transactions: {e}")
+
+    # Whatever is left found no pet, or ran out of time looking for one
+    out_of_time = deadline.current().remaining() <= 0
+    for index, result in enumerate(results):
+        if result is None:
+            results[index] = (
+                {"status": EXCEEDED_STATUS, "error": "Deadline exceeded"} if out_of_time
+                else {"status": 400, "error": "No pet of this type is available"}
+            )
+
+    return jsonify({"results": results}), 200
+
+
+@bp.route('/transactions', methods=['GET'])
+@admission_controlled(transactions_limiter)
 def get_transactions():
     """
     Return a list of transactions.
@@ -245,8 +833,7 @@ def get_transactions():
       - purchase-id (string)
     """
     #Check Header
-    owner_pc = request.headers.get('OwnerPC')
-    if owner_pc != "LovesPetsL2M3n4":
+    if not owner_authorized():
         return jsonify({"error": "unauthorized"}), 401
 
     #Build Filter from Query String 
@@ -260,9 +847,16 @@ def get_transactions():
         else:
             filter_query[key] = value
 
-    # Query Mongo
+    # Repeated queries are answered with the already serialized body
+    cache_key = transactions_response_cache.key(filter_query)
+    body = transactions_response_cache.get(cache_key)
+    if body is not None:
+        return current_app.json.bytes_response(body, 200)
+    generation = transactions_response_cache.generation
+
+    # Query the storage engine
     try:
-        raw_txs = list(transactions_col.find(filter_query))
+        raw_txs = transactions.find(filter_query)
 
         # Normalize each transaction to the public schema
         txs = []
@@ -274,16 +868,193 @@ def get_transactions():
                 "purchase-id": t.get("purchase-id")
             })
 
-        return jsonify(txs), 200
+        body = current_app.json.dumps_bytes(txs)
+        transactions_response_cache.put(cache_key, body, generation)
+        return current_app.json.bytes_response(body, 200)
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
-@app.route('/kill', methods=['GET'])
+@bp.route('/inventory', methods=['GET'])
+def get_inventory():
+    """
+    Return the aggregated inventory of all stores (optionally ?type=<pet type>).
+
+    Answered from the inventory view only, each row carries its age and whether
+    it is older than the configured staleness bound.
+    """
+    return jsonify(inventory.view(request.args.get("type"))), 200
+
+
+@bp.route('/stats/inventory', methods=['GET'])
+def inventory_stats():
+    """
+    Return poll / 304 / error counters of the inventory view.
+    """
+    if not owner_authorized():
+        return jsonify({"error": "unauthorized"}), 401
+    return jsonify(inventory.stats()), 200
+
+
+@bp.route('/admin/stores', methods=['GET'])
+def list_stores():
+    """
+    Return the registered stores as a list of {store, url}.
+    """
+    if not owner_authorized():
+        return jsonify({"error": "unauthorized"}), 401
+    stores = [{"store": sid, "url": url} for sid, url in sorted(store_registry.snapshot().items())]
+    return jsonify(stores), 200
+
+
+@bp.route('/admin/stores/<int:store_id>', methods=['PUT'])
+def put_store(store_id):
+    """
+    Register a store (or change its URL).
+
+    Required JSON fields:
+      - url (string): Base URL of the pet-store service
+    """
+    if not owner_authorized():
+        return jsonify({"error": "unauthorized"}), 401
+    if not request.content_type or "application/json" not in request.content_type:
+        return jsonify({"error": "Expected application/json media type"}), 415
+
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({"error": "Malformed data"}), 400
+    try:
+        store_registry.add(store_id, data.get("url"))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    # New URL, forget the failures and latencies of the old one
+    store_breakers.reset(store_id)
+    store_selector.reset(store_id)
+    return jsonify({"store": store_id, "url": store_registry.get(store_id)}), 200
+
+
+@bp.route('/admin/stores/<int:store_id>', methods=['DELETE'])
+def delete_store(store_id):
+    """
+    Unregister a store, purchases stop using it immediately.
+    """
+    if not owner_authorized():
+        return jsonify({"error": "unauthorized"}), 401
+    if not store_registry.remove(store_id):
+        return jsonify({"error": "Not found"}), 404
+    store_selector.reset(store_id)
+    return "", 204
+
+
+@bp.route('/admin/breakers', methods=['GET'])
+def list_breakers():
+    """
+    Return the circuit breaker state of every store that has been called.
+    """
+    if not owner_authorized():
+        return jsonify({"error": "unauthorized"}), 401
+    return jsonify({str(sid): stats for sid, stats in store_breakers.stats().items()}), 200
+
+
+@bp.route('/admin/breakers/<int:store_id>', methods=['DELETE'])
+def reset_breaker(store_id):
+    """
+    Close a store's circuit breaker by hand (e.g. after a restart).
+    """
+    if not owner_authorized():
+        return jsonify({"error": "unauthorized"}), 401
+    store_breakers.reset(store_id)
+    return "", 204
+
+
+@bp.route('/admin/selection', methods=['GET'])
+def selection_weights():
+    """
+    Return the store selection policy and, for every available store, its latency /
+    error-rate EWMAs, stock, weight and chance of being tried first
+    (stock-aware with ?type=<pet type>).
+    """
+    if not owner_authorized():
+        return jsonify({"error": "unauthorized"}), 401
+    store_ids = [sid for sid in sorted(store_registry.snapshot()) if store_breakers.get(sid).available()]
+    return jsonify(store_selector.stats(store_ids, request.args.get("type"))), 200
+
+
+@bp.route('/stats/response-cache', methods=['GET'])
+def response_cache_stats():
+    """
+    Return hit-rate counters of the serialized GET /transactions cache.
+    """
+    if not owner_authorized():
+        return jsonify({"error": "unauthorized"}), 401
+    return jsonify(transactions_response_cache.stats()), 200
+
+
+@bp.route('/stats/read-routing', methods=['GET'])
+def read_routing_stats():
+    """
+    Return the read preference of GET /transactions and how many reads were routed.
+    """
+    if not owner_authorized():
+        return jsonify({"error": "unauthorized"}), 401
+    if read_routing is None:
+        return jsonify({"engine": STORAGE_ENGINE, "enabled": False}), 200
+    return jsonify(read_routing.stats()), 200
+
+
+@bp.route('/stats/admission', methods=['GET'])
+def admission_stats():
+    """
+    Return in-flight, queue-time and rejection counters of each admission limiter.
+    """
+    if not owner_authorized():
+        return jsonify({"error": "unauthorized"}), 401
+    return jsonify({
+        purchase_limiter.name: purchase_limiter.stats(),
+        transactions_limiter.name: transactions_limiter.stats(),
+    }), 200
+
+
+@bp.route('/healthz', methods=['GET'])
+def healthz():
+    """
+    Liveness: the process is up, Mongo is not touched.
+    """
+    return jsonify({"status": "ok"}), 200
+
+
+@bp.route('/readyz', methods=['GET'])
+def readyz():
+    """
+    Readiness: the storage engine answers (a Mongo ping, cached for a couple of seconds).
+    """
+    ready, body = readiness.status()
+    return jsonify(body), (200 if ready else 503)
+
+
+@bp.route('/kill', methods=['GET'])
 def kill_container():
     """
     For grading purposes: Crash the container.
     """
     os._exit(1)
 
+def create_app():
+    """
+    App factory (used by `flask run`). Nothing connects to Mongo until a request needs it.
+    """
+    app = Flask(__name__)
+    app.json = FastJSONProvider(app)
+    app.register_blueprint(bp)
+    # Opt-in (CAPTURE_FILE) request capture for replay_traffic.py
+    capture = TrafficCapture.from_env("pet-order")
+    if capture is not None:
+        capture.init_app(app)
+    # gzip / br / zstd for large JSON bodies, negotiated with Accept-Encoding
+    ResponseCompressor.from_env().init_app(app)
+    # Stores only, no Mongo: safe to start with the app
+    inventory.start()
+    return app
+
+
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=8080)
\ No newline at end of file
+    create_app().run(host='0.0.0.0', port=8080)
\ No newline at end of file
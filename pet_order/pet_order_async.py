@@ -0,0 +1,760 @@
+import asyncio
+import os
+import random
+import time
+import uuid
+
+import httpx
+from pymongo import AsyncMongoClient
+from quart import Blueprint, Quart, current_app, jsonify, request
+
+import deadline
+from admission import AsyncAdmissionLimiter, async_admission_controlled
+from compression import AsyncResponseCompressor
+from deadline import DEADLINE_HEADER, EXCEEDED_HEADER, EXCEEDED_STATUS, Deadline, DeadlineExceeded
+from health import AsyncReadinessProbe
+from json_provider import FastJSONProvider
+from read_routing import AsyncReadRouting
+from snapshot_file import SnapshotFile
+from traffic_capture import AsyncTrafficCapture
+from transaction_repository import AsyncMemoryTransactionRepository, AsyncTransactionRepository
+from pet_order import (
+    OWNER_PC, PURCHASE_BATCH_MAX, PURCHASE_BUDGET_MS, PURCHASE_COMMIT_TIMEOUT, STORAGE_ENGINE, STORE_CALL_TIMEOUT,
+    STORE_SEARCH_TIMEOUT, StoreUnavailable, allocate_pets, has_stock, inventory, mongo_uri, pet_url,
+    ruled_out_by_inventory, store_breakers, store_registry, store_selector, transactions_response_cache,
+    validate_purchase,
+)
+
+"""
+------------------------------------------------------------------------------------------------
+asyncio build of pet-order: the whole API of pet_order.py (routes, response
+compression, traffic capture), served by an ASGI server:
+
+  uvicorn --factory pet_order_async:create_app --host 0.0.0.0 --port 8080
+
+The Docker image runs it with SERVING_MODE=async.
+
+An in-flight purchase is a coroutine, not an OS thread: store calls go through
+one pooled httpx.AsyncClient (STORE_MAX_CONNECTIONS / STORE_MAX_KEEPALIVE) and
+transactions through pymongo's AsyncMongoClient, so thousands of purchases can
+wait on the stores in a single process. Circuit breakers, the store registry, store
+selection, the inventory view, validation, batch allocation and the GET /transactions
+cache are the ones of pet_order.py.
+------------------------------------------------------------------------------------------------
+"""
+
+bp = Blueprint("pet_order_async", __name__)
+
+# -----------------------------------------------------------
+# CONFIGURATION
+# -----------------------------------------------------------
+# Created when the server starts serving (see create_app)
+store_client = None
+mongo_client = None
+read_routing = None
+transactions = None
+
+purchase_limiter = AsyncAdmissionLimiter(
+    "purchases",
+    max_concurrent=int(os.environ.get("ASYNC_PURCHASE_MAX_CONCURRENT", "2000")),
+    max_queue=int(os.environ.get("ASYNC_PURCHASE_MAX_QUEUE", "4000")),
+    queue_timeout=float(os.environ.get("PURCHASE_QUEUE_TIMEOUT", "0.5")),
+)
+transactions_limiter = AsyncAdmissionLimiter(
+    "transactions",
+    max_concurrent=int(os.environ.get("ASYNC_TRANSACTIONS_MAX_CONCURRENT", "64")),
+    max_queue=int(os.environ.get("ASYNC_TRANSACTIONS_MAX_QUEUE", "128")),
+    queue_timeout=float(os.environ.get("TRANSACTIONS_QUEUE_TIMEOUT", "0.25")),
+)
+
+# -----------------------------------------------------------
+# Helper Functions
+# -----------------------------------------------------------
+
+
+async def start_serving():
+    """ Helper to open the store connection pool and the transactions storage. """
+    global store_client, mongo_client, read_routing, transactions
+    store_client = httpx.AsyncClient(
+        limits=httpx.Limits(
+            max_connections=int(os.environ.get("STORE_MAX_CONNECTIONS", "500")),
+            max_keepalive_connections=int(os.environ.get("STORE_MAX_KEEPALIVE", "100")),
+        ),
+        timeout=STORE_CALL_TIMEOUT,
+    )
+    if STORAGE_ENGINE == 'memory':
+        snapshot_file = SnapshotFile(
+            os.environ.get('STORAGE_SNAPSHOT'),
+            interval=float(os.environ.get('STORAGE_SNAPSHOT_INTERVAL', '1')),
+        )
+        transactions = AsyncMemoryTransactionRepository(snapshot_file)
+        snapshot_file.start()
+    elif STORAGE_ENGINE == 'mongo':
+        # Connects in the background, the first operation waits for it
+        mongo_client = AsyncMongoClient(mongo_uri)
+        # GET /transactions reads follow READ_PREFERENCE like the threaded build
+        read_routing = AsyncReadRouting.from_env(mongo_client)
+        transactions = AsyncTransactionRepository(mongo_client['order_db']['transactions'], read_routing)
+    else:
+        raise ValueError(f"Unknown STORAGE_ENGINE {STORAGE_ENGINE!r}")
+    # Background thread polling the stores, shared with the threaded build
+    inventory.start()
+
+
+async def stop_serving():
+    await store_client.aclose()
+    if mongo_client is not None:
+        await mongo_client.close()
+
+
+async def ping_storage():
+    if mongo_client is None:
+        return  # in-process engine, nothing to reach
+    await asyncio.wait_for(mongo_client.admin.command("ping"), float(os.environ.get("READY_PING_TIMEOUT", "1")))
+
+
+readiness = AsyncReadinessProbe(ping_storage, cache_seconds=float(os.environ.get("READY_CACHE_SECONDS", "2")))
+
+
+def owner_authorized():
+    """ Helper to check the OwnerPC header required by the owner-only routes. """
+    return request.headers.get('OwnerPC') == OWNER_PC
+
+
+async def store_request(store_id, method, url, commit=False, **kwargs):
+    """ Helper to send a request to a store through its circuit breaker (see pet_order.store_request,
+    also for commit calls).
+    Raises:
+        DeadlineExceeded if the budget is used up (before or during the call),
+        StoreUnavailable if the breaker does not let the call through,
+        httpx exceptions if the call itself fails.
+    """
+    headers = dict(kwargs.pop("headers", None) or {})
+    timeout = kwargs.pop("timeout", STORE_CALL_TIMEOUT)
+    request_deadline = deadline.current()
+    clipped = False
+    if request_deadline is not None:
+        if commit:
+            request_deadline.check()
+            headers[DEADLINE_HEADER] = str(int(max(timeout, request_deadline.remaining()) * 1000))
+        else:
+            cap = timeout
+            timeout = request_deadline.timeout(cap)
+            clipped = timeout < cap
+            headers.update(request_deadline.header())
+
+    breaker = store_breakers.get(store_id)
+    if not breaker.allow():
+        raise StoreUnavailable(f"Store {store_id} circuit is open")
+    started = time.monotonic()
+    try:
+        response = await store_client.request(method, url, headers=headers, timeout=timeout, **kwargs)
+    except asyncio.CancelledError:
+        # Another store answered first, this call tells nothing about the store
+        breaker.cancel_probe()
+        raise
+    except httpx.TimeoutException:
+        if clipped:
+            breaker.cancel_probe()
+            raise DeadlineExceeded(f"Deadline exceeded calling store {store_id}")
+        breaker.record_failure()
+        store_selector.record(store_id, time.monotonic() - started, ok=False)
+        raise
+    except httpx.HTTPError:
+        breaker.record_failure()
+        store_selector.record(store_id, time.monotonic() - started, ok=False)
+        raise
+    if response.headers.get(EXCEEDED_HEADER):
+        breaker.cancel_probe()
+        raise DeadlineExceeded(f"Store {store_id} ran out of the deadline")
+    if response.status_code >= 500:
+        breaker.record_failure()
+    else:
+        breaker.record_success()
+    store_selector.record(store_id, time.monotonic() - started, ok=response.status_code < 500)
+    return response
+
+
+async def get_type_id(store_id, store_url, pet_type_name):
+    """ Helper to retrieve the ID of a pet type in a store, None if it has no such type
+    (queried like pet_order.get_type_id: ?type= first, the full list only on a miss). """
+    name = pet_type_name.strip()
+    try:
+        for params in ({"type": name}, None):
+            response = await store_request(store_id, "GET", f"{store_url}/pet-types", params=params, timeout=2)
+            if response.status_code != 200:
+                return None
+            for t in response.json():
+                if t.get('type', '').lower() == name.lower():
+                    return str(t.get('id'))
+    except (httpx.HTTPError, ValueError, StoreUnavailable) as e:
+        print(f"Could not look up pet type {name} in store {store_id}: {e}")
+    return None
+
+
+async def fetch_pets(store_id, store_url, type_id):
+    """ Helper to download the pets of a pet type from a store, None if it does not answer with a list. """
+    response = await store_request(store_id, "GET", f"{store_url}/pet-types/{type_id}/pets", timeout=5)
+    if response.status_code != 200:
+        return None
+    pets = response.json()
+    return pets if isinstance(pets, list) else None
+
+
+async def fetch_pet(store_id, store_url, type_id, pet_name):
+    """ Helper to fetch one pet by name (any case) from a store, None if it has no such pet. """
+    response = await store_request(store_id, "GET", pet_url(store_url, type_id, pet_name), timeout=5)
+    if response.status_code != 200:
+        return None
+    pet = response.json()
+    return pet if isinstance(pet, dict) and pet.get("name") else None
+
+
+async def check_store(store_id, store_url, pet_type_name, pet_name=None, type_id=None):
+    """
+    Helper to look for an available pet in a single store.
+
+    Returns:
+        Tuple of (pet_object, store_id, store_url, type_id) or None
+    """
+    if type_id is None:
+        type_id = await get_type_id(store_id, store_url, pet_type_name)
+    if not type_id:
+        return None
+
+    try:
+        if pet_name:
+            selected_pet = await fetch_pet(store_id, store_url, type_id, pet_name.strip())
+        else:
+            pets = await fetch_pets(store_id, store_url, type_id)
+            store_selector.observe_stock(store_id, pet_type_name, len(pets or []))
+            if not pets:
+                return None
+            selected_pet = random.choice(pets)
+        if selected_pet:
+            return selected_pet, store_id, store_url, type_id
+    except DeadlineExceeded:
+        raise
+    except Exception as e:
+        print(f"Error checking store {store_id}: {e}")
+    return None
+
+
+async def search_store(store_id, store_url, pet_type_name, pet_name=None):
+    """ Helper to look for a pet in a single store, using the inventory view first. """
+    fresh, entry = inventory.lookup(store_id, pet_type_name)
+    if fresh and has_stock(entry, pet_name):
+        found = await check_store(store_id, store_url, pet_type_name, pet_name, type_id=entry["id"])
+        if found:
+            return found
+        inventory.invalidate(store_id)
+    return await check_store(store_id, store_url, pet_type_name, pet_name)
+
+
+async def search_stores(stores, store_ids, search, pet_type_name, pet_name=None):
+    """
+    Helper to run `search` on several stores concurrently and return the first hit (or None).
+    The other searches are cancelled as soon as one store has a pet.
+    """
+    if not store_ids:
+        return None
+    if len(store_ids) == 1:
+        return await search(store_ids[0], stores[store_ids[0]], pet_type_name, pet_name)
+
+    timeout = STORE_SEARCH_TIMEOUT
+    request_deadline = deadline.current()
+    if request_deadline is not None:
+        if request_deadline.remaining() <= 0:
+            return None
+        timeout = min(timeout, request_deadline.remaining())
+
+    # Tasks copy the current context, so they run under the request's deadline
+    tasks = [asyncio.create_task(search(sid, stores[sid], pet_type_name, pet_name)) for sid in store_ids]
+    try:
+        for next_done in asyncio.as_completed(tasks, timeout=timeout):
+            found = await next_done
+            if found:
+                return found
+    except asyncio.TimeoutError:
+        print(f"Store search for {pet_type_name} timed out after {timeout:.2f}s")
+    finally:
+        for task in tasks:
+            task.cancel()
+    return None
+
+
+async def find_available_pet(pet_type_name, store_id=None, pet_name=None):
+    """
+    Helper to find an available pet matching the criteria, same rules as
+    pet_order.find_available_pet.
+
+    Returns:
+        Tuple of (pet_object, store_id, store_url, type_id) or (None, None, None, None)
+    """
+    not_found = (None, None, None, None)
+    stores = store_registry.snapshot()
+
+    if store_id is not None:
+        if store_id not in stores or not store_breakers.get(store_id).available():
+            return not_found
+        store_ids = [store_id]
+    else:
+        store_ids = [sid for sid in stores if store_breakers.get(sid).available()]
+
+    # First the stores the inventory view does not rule out, the preferred one alone...
+    ruled_out = [sid for sid in store_ids if ruled_out_by_inventory(sid, pet_type_name, pet_name)]
+    candidates = store_selector.order([sid for sid in store_ids if sid not in ruled_out], pet_type_name)
+    if store_selector.policy != "random" and len(candidates) > 1:
+        found = await search_stores(stores, candidates[:1], search_store, pet_type_name, pet_name)
+        if found:
+            return found
+        candidates = candidates[1:]
+    found = await search_stores(stores, candidates, search_store, pet_type_name, pet_name)
+    if found:
+        return found
+
+    # ...then, as the view may be stale, a live check of the ones it ruled out
+    return await search_stores(stores, ruled_out, check_store, pet_type_name, pet_name) or not_found
+
+
+async def run_on_stores(fn, calls, commit=False):
+    """ Helper to run the coroutine fn(*args) for every args tuple concurrently, under the
+    request deadline (see pet_order.run_on_stores). Calls still running when the time is up
+    are cancelled, except commit calls, which are always waited for.
+    Returns:
+        One entry per call, in order: its result, the exception it raised,
+        or None if it did not finish in time.
+    """
+    if not calls:
+        return []
+    timeout = None if commit else STORE_SEARCH_TIMEOUT
+    request_deadline = deadline.current()
+    if request_deadline is not None and not commit:
+        timeout = max(0.0, min(timeout, request_deadline.remaining()))
+
+    tasks = [asyncio.create_task(fn(*args)) for args in calls]
+    done, pending = await asyncio.wait(tasks, timeout=timeout)
+    for task in pending:
+        task.cancel()
+    return [(t.exception() or t.result()) if t in done else None for t in tasks]
+
+
+async def fetch_stock(store_id, store_url, pet_type_name):
+    """ Helper for batch purchases: the type ID and pets of a pet type in one store.
+    Returns:
+        Tuple of (type_id, pets list), or None if the store has no such pets.
+    """
+    fresh, entry = inventory.lookup(store_id, pet_type_name)
+    type_id = entry["id"] if fresh and entry else await get_type_id(store_id, store_url, pet_type_name)
+    if not type_id:
+        return None
+    pets = await fetch_pets(store_id, store_url, type_id)
+    store_selector.observe_stock(store_id, pet_type_name, len(pets or []))
+    return (type_id, pets) if pets else None
+
+
+async def delete_from_store(store_id, store_url, type_id, pet_name):
+    """ Helper to remove a sold pet from its store, True if the store deleted it (a commit call). """
+    response = await store_request(
+        store_id, "DELETE", pet_url(store_url, type_id, pet_name), commit=True, timeout=PURCHASE_COMMIT_TIMEOUT
+    )
+    return response.status_code in [200, 204]
+
+# -----------------------------------------------------------
+# ROUTES
+# -----------------------------------------------------------
+
+
+@bp.route('/purchases', methods=['POST'])
+@async_admission_controlled(purchase_limiter)
+async def purchase_pet():
+    """
+    Create a purchase transaction, see pet_order.purchase_pet for the API.
+    """
+    if not request.content_type or "application/json" not in request.content_type:
+        return jsonify({"error": "Expected application/json media type"}), 415
+
+    try:
+        data = await request.get_json(force=False, silent=False)
+    except Exception:
+        return jsonify({"error": "Malformed data"}), 400
+
+    error = validate_purchase(data)
+    if error:
+        return jsonify({"error": error}), 400
+
+    purchaser = data.get("purchaser")
+    pet_type = data.get("pet-type")
+    store = data.get("store")
+    pet_name = data.get("pet-name")
+
+    request_deadline = Deadline.from_header(request.headers.get(DEADLINE_HEADER)) or Deadline(PURCHASE_BUDGET_MS / 1000)
+    token = deadline.activate(request_deadline)
+    try:
+        selected_pet, target_store_id, target_store_url, target_type_id = await find_available_pet(
+            pet_type_name=pet_type,
+            store_id=store,
+            pet_name=pet_name
+        )
+        if not selected_pet:
+            # Tell "gave up" apart from "there is none"
+            request_deadline.check("finding a pet")
+            return jsonify({"error": "No pet of this type is available"}), 400
+
+        actual_pet_name = selected_pet.get("name")
+        delete_url = pet_url(target_store_url, target_type_id, actual_pet_name)
+        try:
+            delete_response = await store_request(
+                target_store_id, "DELETE", delete_url, commit=True, timeout=PURCHASE_COMMIT_TIMEOUT
+            )
+            if delete_response.status_code not in [200, 204]:
+                print(f"Failed to delete pet: Status {delete_response.status_code}")
+                inventory.invalidate(target_store_id)
+                return jsonify({"error": "No pet of this type is available"}), 400
+        except DeadlineExceeded:
+            inventory.invalidate(target_store_id)
+            raise
+        except Exception as e:
+            print(f"Error deleting pet: {e}")
+            inventory.invalidate(target_store_id)
+            return jsonify({"error": "No pet of this type is available"}), 400
+    finally:
+        deadline.deactivate(token)
+
+    inventory.remove_pet(target_store_id, pet_type, actual_pet_name)
+
+    purchase_id = str(uuid.uuid4())
+    transaction_doc = {
+        "purchase-id": purchase_id,
+        "purchaser": purchaser,
+        "pet-type": pet_type,
+        "store": target_store_id
+    }
+    try:
+        await transactions.insert(transaction_doc)
+        transactions_response_cache.invalidate()
+    except Exception as e:
+        print(f"Error storing transaction: {e}")
+
+    return jsonify({
+        "purchaser": purchaser,
+        "pet-type": pet_type,
+        "store": target_store_id,
+        "pet-name": actual_pet_name,
+        "purchase-id": purchase_id
+    }), 201
+
+
+@bp.route('/purchases/batch', methods=['POST'])
+@async_admission_controlled(purchase_limiter)
+async def purchase_batch():
+    """
+    Create many purchase transactions in one call, see pet_order.purchase_batch for the API.
+    """
+    if not request.content_type or "application/json" not in request.content_type:
+        return jsonify({"error": "Expected application/json media type"}), 415
+
+    data = await request.get_json(silent=True)
+    items = data.get("purchases") if isinstance(data, dict) else data
+    if not isinstance(items, list) or not items:
+        return jsonify({"error": "Malformed data"}), 400
+    if len(items) > PURCHASE_BATCH_MAX:
+        return jsonify({"error": f"At most {PURCHASE_BATCH_MAX} purchases per batch"}), 400
+
+    results = [None] * len(items)
+    groups = {}     # lower-case pet type -> [(index, item)]
+    for index, item in enumerate(items):
+        error = validate_purchase(item)
+        if error:
+            results[index] = {"status": 400, "error": error}
+        else:
+            groups.setdefault(item["pet-type"].lower(), []).append((index, item))
+
+    request_deadline = Deadline.from_header(request.headers.get(DEADLINE_HEADER)) or Deadline(PURCHASE_BUDGET_MS / 1000)
+    token = deadline.activate(request_deadline)
+    try:
+        # One stock lookup per (pet type, store), all concurrent
+        stores = store_registry.snapshot()
+        available = [sid for sid in stores if store_breakers.get(sid).available()]
+        lookups = []
+        for group in groups.values():
+            pet_type = group[0][1]["pet-type"]
+            wanted = {item.get("store") for _, item in group}
+            store_ids = available if None in wanted else [sid for sid in available if sid in wanted]
+            lookups += [(pet_type, sid) for sid in store_ids]
+        found = await run_on_stores(fetch_stock, [(sid, stores[sid], pet_type) for pet_type, sid in lookups])
+
+        stock = {}      # lower-case pet type -> {store_id: (type_id, pets)}
+        for (pet_type, sid), result in zip(lookups, found):
+            if isinstance(result, tuple):
+                stock.setdefault(pet_type.lower(), {})[sid] = result
+
+        allocated = {}
+        for key, group in groups.items():
+            allocated.update(allocate_pets(group, stock.get(key, {})))
+
+        # Remove the selected pets from their stores, concurrently
+        sales = sorted(allocated.items())
+        deleted = await run_on_stores(delete_from_store, [
+            (sid, stores[sid], type_id, pet.get("name")) for _, (sid, type_id, pet) in sales
+        ], commit=True)
+    finally:
+        deadline.deactivate(token)
+
+    transaction_docs = []
+    for (index, (sid, type_id, pet)), ok in zip(sales, deleted):
+        item = items[index]
+        if ok is not True:
+            if not isinstance(ok, DeadlineExceeded):
+                print(f"Failed to delete pet {pet.get('name')} from store {sid}: {ok}")
+            inventory.invalidate(sid)
+            continue
+        inventory.remove_pet(sid, item["pet-type"], pet.get("name"))
+        transaction_doc = {
+            "purchase-id": str(uuid.uuid4()),
+            "purchaser": item["purchaser"],
+            "pet-type": item["pet-type"],
+            "store": sid
+        }
+        transaction_docs.append(transaction_doc)
+        results[index] = dict(transaction_doc, **{"pet-name": pet.get("name"), "status": 201})
+
+    # All the batch's transactions in one write
+    if transaction_docs:
+        try:
+            await transactions.insert_many(transaction_docs)
+            transactions_response_cache.invalidate()
+        except Exception as e:
+            print(f"Error storing transactions: {e}")
+
+    # Whatever is left found no pet, or ran out of time looking for one
+    out_of_time = request_deadline.remaining() <= 0
+    for index, result in enumerate(results):
+        if result is None:
+            results[index] = (
+                {"status": EXCEEDED_STATUS, "error": "Deadline exceeded"} if out_of_time
+                else {"status": 400, "error": "No pet of this type is available"}
+            )
+
+    return jsonify({"results": results}), 200
+
+
+@bp.route('/transactions', methods=['GET'])
+@async_admission_controlled(transactions_limiter)
+async def get_transactions():
+    """
+    Return a list of transactions, see pet_order.get_transactions for the API.
+    """
+    if not owner_authorized():
+        return jsonify({"error": "unauthorized"}), 401
+
+    filter_query = {}
+    for key, value in request.args.items():
+        if key == 'store':
+            try:
+                filter_query[key] = int(value)
+            except ValueError:
+                pass
+        else:
+            filter_query[key] = value
+
+    cache_key = transactions_response_cache.key(filter_query)
+    body = transactions_response_cache.get(cache_key)
+    if body is not None:
+        return current_app.json.bytes_response(body, 200)
+    generation = transactions_response_cache.generation
+
+    try:
+        raw_txs = await transactions.find(filter_query)
+        txs = [{
+            "purchaser": t.get("purchaser"),
+            "pet-type": t.get("pet-type"),
+            "store": t.get("store"),
+            "purchase-id": t.get("purchase-id")
+        } for t in raw_txs]
+
+        body = current_app.json.dumps_bytes(txs)
+        transactions_response_cache.put(cache_key, body, generation)
+        return current_app.json.bytes_response(body, 200)
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@bp.route('/inventory', methods=['GET'])
+async def get_inventory():
+    """
+    Return the aggregated inventory of all stores, see pet_order.get_inventory.
+    """
+    return jsonify(inventory.view(request.args.get("type"))), 200
+
+
+@bp.route('/stats/inventory', methods=['GET'])
+async def inventory_stats():
+    """
+    Return poll / 304 / error counters of the inventory view.
+    """
+    if not owner_authorized():
+        return jsonify({"error": "unauthorized"}), 401
+    return jsonify(inventory.stats()), 200
+
+
+@bp.route('/admin/stores', methods=['GET'])
+async def list_stores():
+    """
+    Return the registered stores as a list of {store, url}.
+    """
+    if not owner_authorized():
+        return jsonify({"error": "unauthorized"}), 401
+    stores = [{"store": sid, "url": url} for sid, url in sorted(store_registry.snapshot().items())]
+    return jsonify(stores), 200
+
+
+@bp.route('/admin/stores/<int:store_id>', methods=['PUT'])
+async def put_store(store_id):
+    """
+    Register a store (or change its URL), see pet_order.put_store.
+    """
+    if not owner_authorized():
+        return jsonify({"error": "unauthorized"}), 401
+    if not request.content_type or "application/json" not in request.content_type:
+        return jsonify({"error": "Expected application/json media type"}), 415
+
+    data = await request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({"error": "Malformed data"}), 400
+    try:
+        store_registry.add(store_id, data.get("url"))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    # New URL, forget the failures and latencies of the old one
+    store_breakers.reset(store_id)
+    store_selector.reset(store_id)
+    return jsonify({"store": store_id, "url": store_registry.get(store_id)}), 200
+
+
+@bp.route('/admin/stores/<int:store_id>', methods=['DELETE'])
+async def delete_store(store_id):
+    """
+    Unregister a store, purchases stop using it immediately.
+    """
+    if not owner_authorized():
+        return jsonify({"error": "unauthorized"}), 401
+    if not store_registry.remove(store_id):
+        return jsonify({"error": "Not found"}), 404
+    store_selector.reset(store_id)
+    return "", 204
+
+
+@bp.route('/admin/breakers', methods=['GET'])
+async def list_breakers():
+    """
+    Return the circuit breaker state of every store that has been called.
+    """
+    if not owner_authorized():
+        return jsonify({"error": "unauthorized"}), 401
+    return jsonify({str(sid): stats for sid, stats in store_breakers.stats().items()}), 200
+
+
+@bp.route('/admin/breakers/<int:store_id>', methods=['DELETE'])
+async def reset_breaker(store_id):
+    """
+    Close a store's circuit breaker by hand (e.g. after a restart).
+    """
+    if not owner_authorized():
+        return jsonify({"error": "unauthorized"}), 401
+    store_breakers.reset(store_id)
+    return "", 204
+
+
+@bp.route('/admin/selection', methods=['GET'])
+async def selection_weights():
+    """
+    Return the store selection policy and weights, see pet_order.selection_weights.
+    """
+    if not owner_authorized():
+        return jsonify({"error": "unauthorized"}), 401
+    store_ids = [sid for sid in sorted(store_registry.snapshot()) if store_breakers.get(sid).available()]
+    return jsonify(store_selector.stats(store_ids, request.args.get("type"))), 200
+
+
+@bp.route('/stats/response-cache', methods=['GET'])
+async def response_cache_stats():
+    """
+    Return hit-rate counters of the serialized GET /transactions cache.
+    """
+    if not owner_authorized():
+        return jsonify({"error": "unauthorized"}), 401
+    return jsonify(transactions_response_cache.stats()), 200
+
+
+@bp.route('/stats/read-routing', methods=['GET'])
+async def read_routing_stats():
+    """
+    Return the read preference of GET /transactions and how many reads were routed.
+    """
+    if not owner_authorized():
+        return jsonify({"error": "unauthorized"}), 401
+    if read_routing is None:
+        return jsonify({"engine": STORAGE_ENGINE, "enabled": False}), 200
+    return jsonify(read_routing.stats()), 200
+
+
+@bp.route('/stats/admission', methods=['GET'])
+async def admission_stats():
+    """
+    Return in-flight, queue-time and rejection counters of each admission limiter.
+    """
+    if not owner_authorized():
+        return jsonify({"error": "unauthorized"}), 401
+    return jsonify({
+        purchase_limiter.name: purchase_limiter.stats(),
+        transactions_limiter.name: transactions_limiter.stats(),
+    }), 200
+
+
+@bp.route('/healthz', methods=['GET'])
+async def healthz():
+    """
+    Liveness: the event loop is serving, Mongo is not touched.
+    """
+    return jsonify({"status": "ok"}), 200
+
+
+@bp.route('/readyz', methods=['GET'])
+async def readyz():
+    """
+    Readiness: the storage engine answers (a Mongo ping, cached for a couple of seconds).
+    """
+    ready, body = await readiness.status()
+    return jsonify(body), (200 if ready else 503)
+
+
+@bp.route('/kill', methods=['GET'])
+async def kill_container():
+    """
+    For grading purposes: Crash the container.
+    """
+    os._exit(1)
+
+
+@bp.app_errorhandler(DeadlineExceeded)
+async def deadline_exceeded(e):
+    return jsonify({"error": "Deadline exceeded"}), EXCEEDED_STATUS, {EXCEEDED_HEADER: "1"}
+
+
+def create_app():
+    """
+    ASGI app factory (`uvicorn --factory pet_order_async:create_app`).
+    """
+    app = Quart(__name__)
+    app.json = FastJSONProvider(app)
+    app.register_blueprint(bp)
+    # Opt-in (CAPTURE_FILE) request capture for replay_traffic.py
+    capture = AsyncTrafficCapture.from_env("pet-order")
+    if capture is not None:
+        capture.init_app(app)
+    # gzip / br / zstd for large JSON bodies, negotiated with Accept-Encoding
+    AsyncResponseCompressor.from_env().init_app(app)
+    app.before_serving(start_serving)
+    app.after_serving(stop_serving)
+    return app
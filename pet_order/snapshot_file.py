@@ -0,0 +1,77 @@
+import atexit
+import json
+import os
+import threading
+import time
+
+"""
+------------------------------------------------------------------------------------------------
+Disk persistence for the in-memory storage engine (STORAGE_ENGINE=memory).
+
+Each in-memory component registers a named section with a dump() / load(data)
+pair. The whole state is written as one JSON file (temporary file + rename, so
+a crash never leaves half a snapshot) at most every `interval` seconds after a
+write, and once more when the process exits. Without a path nothing is persisted.
+------------------------------------------------------------------------------------------------
+"""
+
+
+class SnapshotFile:
+    def __init__(self, path=None, interval=1.0):
+        self.path = path
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._sections = {}     # name -> dump()
+        self._dirty = threading.Event()
+        self._thread = None
+        self._saves = 0
+
+        self._loaded = {}
+        if path and os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                self._loaded = json.load(f)
+
+    def register(self, name, dump, load):
+        """
+        Add a section, feeding it the data found for it in the snapshot (if any).
+        """
+        with self._lock:
+            self._sections[name] = dump
+        if name in self._loaded:
+            load(self._loaded.pop(name))
+
+    def mark_dirty(self):
+        if self.path:
+            self._dirty.set()
+
+    def start(self):
+        if self.path and self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="snapshot-writer", daemon=True)
+            self._thread.start()
+            atexit.register(self.save)
+
+    def _run(self):
+        while True:
+            self._dirty.wait()
+            time.sleep(self.interval)
+            try:
+                self.save()
+            except Exception as e:
+                print(f"Could not write snapshot {self.path}: {e}")
+
+    def save(self):
+        if not self.path:
+            return
+        with self._lock:
+            # Cleared before dumping: a write racing with the dump marks it dirty again
+            self._dirty.clear()
+            state = {name: dump() for name, dump in self._sections.items()}
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(state, f, separators=(",", ":"))
+            os.replace(tmp_path, self.path)
+            self._saves += 1
+
+    def stats(self):
+        with self._lock:
+            return {"path": self.path, "interval": self.interval, "saves": self._saves, "dirty": self._dirty.is_set()}
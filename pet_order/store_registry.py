@@ -0,0 +1,88 @@
+import json
+import os
+import threading
+from urllib.parse import urlparse
+
+"""
+------------------------------------------------------------------------------------------------
+Registry of the pet-store services pet-order can buy from.
+
+Stores are identified by their numeric store id (the STORE_ID of the pet-store
+container) and reached through a base URL. The initial list comes from, in order:
+  - STORES_FILE: path to a JSON object {"<store id>": "<base url>", ...}
+  - STORES: comma separated "<store id>=<base url>" pairs
+  - the two stores of docker-compose.yml
+Stores can then be added / removed at runtime through the admin endpoints.
+------------------------------------------------------------------------------------------------
+"""
+
+DEFAULT_STORES = {
+    1: "http://pet-store1:8000",
+    2: "http://pet-store2:8000",
+}
+
+
+def parse_stores(value):
+    """
+    Helper function to parse "1=http://pet-store1:8000,2=http://pet-store2:8000".
+    """
+    stores = {}
+    for item in value.split(","):
+        item = item.strip()
+        if not item:
+            continue
+        store_id, _, url = item.partition("=")
+        stores[int(store_id)] = url.strip()
+    return stores
+
+
+def valid_store_url(url):
+    if not isinstance(url, str):
+        return False
+    parsed = urlparse(url)
+    return parsed.scheme in ("http", "https") and bool(parsed.netloc)
+
+
+class StoreRegistry:
+    def __init__(self, stores=None):
+        self._lock = threading.Lock()
+        self._stores = {}
+        for store_id, url in (stores or {}).items():
+            self.add(store_id, url)
+
+    @classmethod
+    def from_env(cls):
+        stores_file = os.environ.get("STORES_FILE")
+        if stores_file:
+            with open(stores_file) as f:
+                return cls({int(k): v for k, v in json.load(f).items()})
+        if os.environ.get("STORES"):
+            return cls(parse_stores(os.environ["STORES"]))
+        return cls(DEFAULT_STORES)
+
+    def add(self, store_id, url):
+        if not isinstance(store_id, int) or isinstance(store_id, bool) or store_id < 1:
+            raise ValueError("store id must be a positive integer")
+        if not valid_store_url(url):
+            raise ValueError("store url must be an http(s) URL")
+        with self._lock:
+            self._stores[store_id] = url.rstrip("/")
+
+    def remove(self, store_id):
+        with self._lock:
+            return self._stores.pop(store_id, None) is not None
+
+    def get(self, store_id):
+        with self._lock:
+            return self._stores.get(store_id)
+
+    def __contains__(self, store_id):
+        with self._lock:
+            return store_id in self._stores
+
+    def snapshot(self):
+        """
+        Return a copy of {store id: url}, safe to iterate while stores are added / removed.
+        """
+        with self._lock:
+            return dict(self._stores)
@@ -0,0 +1,186 @@
+import math
+import random
+import threading
+import time
+
+"""
+------------------------------------------------------------------------------------------------
+Latency- and stock-aware choice of the store to search first.
+
+Every store call feeds an EWMA of its latency and of its error rate (`alpha` is
+the weight of the newest sample). Stock per pet type comes from the pet lists
+pet-order downloads (kept `stock_ttl` seconds), else from `stock_lookup`
+(the inventory view). A store's weight is
+
+    (1 - error rate) / latency  x  min(stock, stock_target) / stock_target
+
+with unknown stock counting as full and a store without samples getting the
+average latency of the others. To keep every store in use (and its EWMA up to
+date) no weight goes below `min_share` of the best one.
+
+Policies (SELECTION_POLICY):
+  - "random"   : shuffled, every store searched at once (no preference)
+  - "weighted" : random order, each next store drawn with probability ~ weight
+  - "p2c"      : power of two choices, each next store is one of two random ones,
+                 the heavier with probability w1 / (w1 + w2) so no store is starved
+------------------------------------------------------------------------------------------------
+"""
+
+POLICIES = ("random", "weighted", "p2c")
+
+
+class _StoreStats:
+    def __init__(self):
+        self.latency = None     # EWMA, seconds
+        self.error_rate = 0.0   # EWMA of 0 / 1 outcomes
+        self.samples = 0
+        self.stock = {}         # lower-case pet type -> (count, observed at)
+
+
+class StoreSelector:
+    def __init__(self, policy="p2c", alpha=0.2, stock_ttl=10.0, stock_target=5, min_share=0.05, stock_lookup=None):
+        """
+        stock_lookup(store_id, pet_type_name) -> number of pets, or None if unknown
+        """
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown SELECTION_POLICY {policy!r}, expected one of {', '.join(POLICIES)}")
+        self.policy = policy
+        self.alpha = alpha
+        self.stock_ttl = stock_ttl
+        self.stock_target = max(1, stock_target)
+        self.min_share = min_share
+        self.stock_lookup = stock_lookup
+
+        self._lock = threading.Lock()
+        self._stores = {}   # store id -> _StoreStats
+
+    #---------------------OBSERVATIONS-----------------------
+    def record(self, store_id, latency, ok):
+        """
+        One finished store call: its latency in seconds and whether it succeeded.
+        """
+        with self._lock:
+            stats = self._stores.setdefault(store_id, _StoreStats())
+            if stats.latency is None:
+                stats.latency = latency
+            else:
+                stats.latency += self.alpha * (latency - stats.latency)
+            stats.error_rate += self.alpha * ((0.0 if ok else 1.0) - stats.error_rate)
+            stats.samples += 1
+
+    def observe_stock(self, store_id, pet_type_name, count):
+        with self._lock:
+            stats = self._stores.setdefault(store_id, _StoreStats())
+            stats.stock[pet_type_name.lower()] = (count, time.monotonic())
+
+    def reset(self, store_id):
+        """
+        Forget what was learned about a store (e.g. new URL or unregistered).
+        """
+        with self._lock:
+            self._stores.pop(store_id, None)
+
+    #---------------------WEIGHTS-----------------------
+    def _stock(self, store_id, pet_type_name):
+        with self._lock:
+            stats = self._stores.get(store_id)
+            observed = stats.stock.get(pet_type_name.lower()) if stats else None
+        if observed is not None and time.monotonic() - observed[1] <= self.stock_ttl:
+            return observed[0]
+        if self.stock_lookup is not None:
+            return self.stock_lookup(store_id, pet_type_name)
+        return None
+
+    def weights(self, store_ids, pet_type_name=None):
+        """
+        Return {store id: weight} for the given stores, the best one weighing 1.
+        """
+        with self._lock:
+            known = [self._stores[sid].latency for sid in store_ids
+                     if sid in self._stores and self._stores[sid].latency is not None]
+            default_latency = sum(known) / len(known) if known else 1.0
+            raw = {}
+            for sid in store_ids:
+                stats = self._stores.get(sid)
+                latency = stats.latency if stats and stats.latency is not None else default_latency
+                error_rate = stats.error_rate if stats else 0.0
+                raw[sid] = (1.0 - error_rate) / max(latency, 0.001)
+
+        if pet_type_name:
+            for sid in store_ids:
+                stock = self._stock(sid, pet_type_name)
+                if stock is not None:
+                    raw[sid] *= min(stock, self.stock_target) / self.stock_target
+
+        best = max(raw.values(), default=0.0)
+        if best <= 0:
+            return {sid: 1.0 for sid in store_ids}
+        return {sid: max(w / best, self.min_share) for sid, w in raw.items()}
+
+    #---------------------SELECTION-----------------------
+    def order(self, store_ids, pet_type_name=None):
+        """
+        Return the stores in the order they should be tried.
+        """
+        store_ids = list(store_ids)
+        if self.policy == "random" or len(store_ids) < 2:
+            random.shuffle(store_ids)
+            return store_ids
+        weights = self.weights(store_ids, pet_type_name)
+
+        if self.policy == "weighted":
+            # Weighted sampling without replacement (Efraimidis-Spirakis keys)
+            return sorted(store_ids, key=lambda sid: math.log(1.0 - random.random()) / weights[sid], reverse=True)
+
+        ordered = []
+        while len(store_ids) > 1:
+            a, b = random.sample(store_ids, 2)
+            pick = a if random.random() * (weights[a] + weights[b]) < weights[a] else b
+            ordered.append(pick)
+            store_ids.remove(pick)
+        return ordered + store_ids
+
+    def choose(self, store_ids, pet_type_name=None):
+        """
+        Return the store to use among store_ids, None if there is none.
+        """
+        ordered = self.order(store_ids, pet_type_name)
+        return ordered[0] if ordered else None
+
+    def first_pick_shares(self, weights):
+        """
+        Probability of each store to be tried first under the policy.
+        """
+        n = len(weights)
+        if self.policy == "random" or n < 2:
+            return {sid: 1.0 / n for sid in weights}
+        if self.policy == "weighted":
+            total = sum(weights.values())
+            return {sid: w / total for sid, w in weights.items()}
+        pairs = n * (n - 1) / 2
+        return {
+            sid: sum(w / (w + other) for osid, other in weights.items() if osid != sid) / pairs
+            for sid, w in weights.items()
+        }
+
+    def stats(self, store_ids, pet_type_name=None):
+        """
+        Return the policy and, per store, its EWMAs, stock, weight and share of first picks.
+        """
+        store_ids = list(store_ids)
+        weights = self.weights(store_ids, pet_type_name) if store_ids else {}
+        shares = self.first_pick_shares(weights) if weights else {}
+        stores = {}
+        for sid in store_ids:
+            with self._lock:
+                stats = self._stores.get(sid) or _StoreStats()
+                latency, error_rate, samples = stats.latency, stats.error_rate, stats.samples
+            stores[str(sid)] = {
+                "latency_ms": round(latency * 1000, 2) if latency is not None else None,
+                "error_rate": round(error_rate, 4),
+                "samples": samples,
+                "stock": self._stock(sid, pet_type_name) if pet_type_name else None,
+                "weight": round(weights[sid], 4),
+                "first_pick_share": round(shares[sid], 4),
+            }
+        return {"policy": self.policy, "pet-type": pet_type_name, "stores": stores}
@@ -0,0 +1,126 @@
+import threading
+
+from read_routing import AsyncReadRouting, ReadRouting
+from snapshot_file import SnapshotFile
+
+"""
+------------------------------------------------------------------------------------------------
+Storage engines for the transactions of pet-order. Both have the same methods:
+  insert(doc)       store a transaction
+  insert_many(docs) store several transactions in one write
+  find(query)       transactions whose fields equal the query's values, in insertion order
+
+TransactionRepository          : order_db.transactions in Mongo (STORAGE_ENGINE=mongo),
+                                 find() follows READ_PREFERENCE (see read_routing.py)
+MemoryTransactionRepository    : in process, one hash index per transaction field,
+                                 persisted through a SnapshotFile (STORAGE_SNAPSHOT) if configured
+The Async* variants have the same methods as coroutines (asyncio build of pet-order),
+AsyncTransactionRepository.find() follows READ_PREFERENCE too.
+------------------------------------------------------------------------------------------------
+"""
+
+INDEXED_FIELDS = ("purchaser", "pet-type", "store", "purchase-id")
+
+
+class TransactionRepository:
+    def __init__(self, collection, routing=None):
+        self.collection = collection
+        self.routing = routing or ReadRouting()
+        self.reads = self.routing.reads(collection)
+
+    def insert(self, doc):
+        with self.routing.write_session() as session:
+            self.collection.insert_one(dict(doc), session=session)
+
+    def insert_many(self, docs):
+        with self.routing.write_session() as session:
+            self.collection.insert_many([dict(doc) for doc in docs], ordered=False, session=session)
+
+    def find(self, query):
+        with self.routing.read_session() as session:
+            return list(self.reads.find(query, {"_id": 0}, session=session))
+
+
+class MemoryTransactionRepository:
+    def __init__(self, snapshot=None):
+        self._lock = threading.Lock()
+        self._docs = []
+        self._index = {field: {} for field in INDEXED_FIELDS}    # field -> value -> [positions]
+
+        self.snapshot = snapshot or SnapshotFile()
+        self.snapshot.register("transactions", self._dump, self._load)
+
+    def _dump(self):
+        with self._lock:
+            return list(self._docs)
+
+    def _load(self, docs):
+        with self._lock:
+            for doc in docs:
+                self._add(doc)
+
+    def _add(self, doc):
+        # Caller must hold self._lock
+        position = len(self._docs)
+        self._docs.append(doc)
+        for field, index in self._index.items():
+            if field in doc:
+                index.setdefault(doc[field], []).append(position)
+
+    def insert(self, doc):
+        with self._lock:
+            self._add(dict(doc))
+        self.snapshot.mark_dirty()
+
+    def insert_many(self, docs):
+        with self._lock:
+            for doc in docs:
+                self._add(dict(doc))
+        self.snapshot.mark_dirty()
+
+    def find(self, query):
+        with self._lock:
+            # Smallest matching index bucket first, the other fields are checked per document
+            buckets = [self._index[f].get(v, []) for f, v in query.items() if f in self._index]
+            positions = min(buckets, key=len) if buckets else range(len(self._docs))
+            return [
+                dict(self._docs[p]) for p in positions
+                if all(self._docs[p].get(f) == v for f, v in query.items())
+            ]
+
+
+class AsyncTransactionRepository:
+    def __init__(self, collection, routing=None):
+        """
+        collection: a collection of pymongo's AsyncMongoClient
+        routing: an AsyncReadRouting of the same client
+        """
+        self.collection = collection
+        self.routing = routing or AsyncReadRouting()
+        self.reads = self.routing.reads(collection)
+
+    async def insert(self, doc):
+        async with self.routing.write_session() as session:
+            await self.collection.insert_one(dict(doc), session=session)
+
+    async def insert_many(self, docs):
+        async with self.routing.write_session() as session:
+            await self.collection.insert_many([dict(doc) for doc in docs], ordered=False, session=session)
+
+    async def find(self, query):
+        async with self.routing.read_session() as session:
+            return await self.reads.find(query, {"_id": 0}, session=session).to_list()
+
+
+class AsyncMemoryTransactionRepository(MemoryTransactionRepository):
+    """
+    In-process operations never wait on I/O, they run directly on the event loop.
+    """
+    async def insert(self, doc):
+        super().insert(doc)
+
+    async def insert_many(self, docs):
+        super().insert_many(docs)
+
+    async def find(self, query):
+        return super().find(query)
@@ -0,0 +1,307 @@
+import hashlib
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+import requests
+
+"""
+------------------------------------------------------------------------------------------------
+Local cache of remote picture downloads ("picture-url"), keyed by normalized URL.
+
+- Bodies are kept on disk together with the origin's ETag / Last-Modified.
+- Within `ttl` seconds a cached body is served as is; after that it is revalidated
+  with a conditional GET (If-None-Match / If-Modified-Since), a 304 keeps the body.
+- The total size of the bodies stays under `max_bytes`, least recently used
+  bodies are evicted first. A body larger than the budget is never cached.
+- Concurrent fetches of the same URL collapse into one download.
+- The directory may be shared (other workers, earlier runs): entries found there
+  at start are adopted, oldest first, and revalidated before their first use. Only
+  files named like entries are ever removed.
+------------------------------------------------------------------------------------------------
+"""
+
+CHUNK_SIZE = 256 * 1024
+DEFAULT_PORTS = {"http": 80, "https": 443}
+# Entry files are named by the sha256 of the normalized URL, with a ".json" sidecar
+ENTRY_NAME = re.compile(r"[0-9a-f]{64}")
+# Temporary files older than this are leftovers of a crashed process
+STALE_PART_SECONDS = 3600
+
+
+def normalize_url(url):
+    """
+    Helper function to map equivalent URLs to the same cache key:
+    lower-case scheme and host, no default port, no fragment, sorted query.
+    """
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or "").lower()
+    if parts.port and parts.port != DEFAULT_PORTS.get(scheme):
+        host = f"{host}:{parts.port}"
+    if parts.username:
+        host = f"{parts.username}@{host}"
+    query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+    return urlunsplit((scheme, host, parts.path or "/", query, ""))
+
+
+class _Entry:
+    def __init__(self, path, size, content_type, etag, last_modified):
+        self.path = path
+        self.size = size
+        self.content_type = content_type
+        self.etag = etag
+        self.last_modified = last_modified
+        self.validated_at = time.monotonic()
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.status = None
+        self.entry = None
+        self.error = None
+
+
+class FetchCache:
+    def __init__(self, root, max_bytes=256 * 1024 * 1024, ttl=300.0, timeout=10.0):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.timeout = timeout
+        os.makedirs(root, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()   # key -> _Entry, least recently used first
+        self._inflight = {}             # key -> _Call
+        self._bytes = 0
+        self._counters = {
+            "hits": 0, "misses": 0, "revalidated": 0, "refetched": 0,
+            "coalesced": 0, "evictions": 0, "uncacheable": 0, "adopted": 0,
+        }
+        self._adopt()
+
+    def _adopt(self):
+        """
+        Index the entries already in the directory, least recently written first.
+        They are revalidated with the origin before they are served.
+        """
+        found = []
+        now = time.time()
+        for name in os.listdir(self.root):
+            path = os.path.join(self.root, name)
+            try:
+                if name.endswith(".part"):
+                    if now - os.stat(path).st_mtime > STALE_PART_SECONDS:
+                        os.remove(path)
+                    continue
+                if not ENTRY_NAME.fullmatch(name):
+                    continue
+                with open(f"{path}.json", encoding="utf-8") as f:
+                    meta = json.load(f)
+                stat = os.stat(path)
+            except (OSError, ValueError):
+                continue
+            found.append((stat.st_mtime, name, path, stat.st_size, meta))
+
+        with self._lock:
+            for _, key, path, size, meta in sorted(found):
+                entry = _Entry(path, size, meta.get("content_type"), meta.get("etag"), meta.get("last_modified"))
+                entry.validated_at = float("-inf")
+                self._entries[key] = entry
+                self._bytes += size
+            self._counters["adopted"] = len(found)
+            self._evict()
+
+    def fetch(self, url):
+        """
+        Return (status code, content type, chunk iterator). The iterator is None
+        unless the status is 200. Connection errors raise requests exceptions.
+        """
+        key = hashlib.sha256(normalize_url(url).encode("utf-8")).hexdigest()
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.monotonic() - entry.validated_at < self.ttl:
+                try:
+                    # Opened under the lock: an eviction right after cannot pull the file away
+                    f = open(entry.path, "rb")
+                except FileNotFoundError:
+                    # Evicted by another process sharing the directory
+                    self._drop(key)
+                    entry = None
+                else:
+                    self._entries.move_to_end(key)
+                    self._counters["hits"] += 1
+                    return 200, entry.content_type, self._read(f)
+
+            call = self._inflight.get(key)
+            leader = call is None
+            if leader:
+                call = self._inflight[key] = _Call()
+            else:
+                self._counters["coalesced"] += 1
+
+        if leader:
+            try:
+                call.status, call.entry = self._refresh(key, url, entry)
+            except Exception as e:
+                call.error = e
+            finally:
+                with self._lock:
+                    del self._inflight[key]
+                call.done.set()
+        else:
+            call.done.wait()
+
+        if call.error is not None:
+            raise call.error
+        if call.status != 200:
+            return call.status, None, None
+        if call.entry is None:
+            # Too large for the cache: every caller downloads it on its own
+            return self._fetch_uncached(url)
+        try:
+            return 200, call.entry.content_type, self._read(open(call.entry.path, "rb"))
+        except FileNotFoundError:
+            # Evicted between the download and now
+            return self._fetch_uncached(url)
+
+    def _refresh(self, key, url, entry):
+        """
+        Download (or revalidate) a URL, returns (status, entry or None).
+        """
+        headers = {}
+        if entry is not None:
+            if entry.etag:
+                headers["If-None-Match"] = entry.etag
+            if entry.last_modified:
+                headers["If-Modified-Since"] = entry.last_modified
+
+        with requests.get(url, headers=headers, stream=True, timeout=self.timeout) as r:
+            if r.status_code == 304 and entry is not None:
+                with self._lock:
+                    entry.validated_at = time.monotonic()
+                    self._counters["revalidated"] += 1
+                return 200, entry
+            if r.status_code != 200:
+                self._forget(key)
+                return r.status_code, None
+
+            with self._lock:
+                self._counters["refetched" if entry is not None else "misses"] += 1
+
+            length = r.headers.get("Content-Length")
+            if length and length.isdigit() and int(length) > self.max_bytes:
+                with self._lock:
+                    self._counters["uncacheable"] += 1
+                self._forget(key)
+                return 200, None
+
+            fd, tmp_path = tempfile.mkstemp(dir=self.root, suffix=".part")
+            try:
+                size = 0
+                with os.fdopen(fd, "wb") as f:
+                    for chunk in r.iter_content(CHUNK_SIZE):
+                        size += len(chunk)
+                        if size > self.max_bytes:
+                            break
+                        f.write(chunk)
+                if size > self.max_bytes:
+                    os.remove(tmp_path)
+                    with self._lock:
+                        self._counters["uncacheable"] += 1
+                    self._forget(key)
+                    return 200, None
+
+                path = os.path.join(self.root, key)
+                new_entry = _Entry(
+                    path, size, r.headers.get("Content-Type"),
+                    r.headers.get("ETag"), r.headers.get("Last-Modified"),
+                )
+                # Validators first: a body on disk always has them (see _adopt)
+                self._write_meta(new_entry)
+                os.replace(tmp_path, path)
+            except BaseException:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                raise
+
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old.size
+            self._entries[key] = new_entry
+            self._bytes += size
+            self._evict()
+        return 200, new_entry
+
+    def _fetch_uncached(self, url):
+        r = requests.get(url, stream=True, timeout=self.timeout)
+        if r.status_code != 200:
+            r.close()
+            return r.status_code, None, None
+
+        def chunks():
+            with r:
+                yield from r.iter_content(CHUNK_SIZE)
+        return 200, r.headers.get("Content-Type"), chunks()
+
+    @staticmethod
+    def _read(f):
+        with f:
+            while chunk := f.read(CHUNK_SIZE):
+                yield chunk
+
+    def _write_meta(self, entry):
+        fd, tmp_path = tempfile.mkstemp(dir=self.root, suffix=".part")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump({"content_type": entry.content_type, "etag": entry.etag, "last_modified": entry.last_modified}, f)
+            os.replace(tmp_path, f"{entry.path}.json")
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def _forget(self, key):
+        with self._lock:
+            self._drop(key)
+
+    def _drop(self, key):
+        # Caller must hold self._lock
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry.size
+            self._remove_file(entry.path)
+
+    def _evict(self):
+        # Caller must hold self._lock
+        while self._bytes > self.max_bytes and self._entries:
+            _, entry = self._entries.popitem(last=False)
+            self._bytes -= entry.size
+            self._counters["evictions"] += 1
+            self._remove_file(entry.path)
+
+    @staticmethod
+    def _remove_file(path):
+        for name in (path, f"{path}.json"):
+            try:
+                os.remove(name)
+            except FileNotFoundError:
+                pass
+
+    def stats(self):
+        with self._lock:
+            return dict(
+                self._counters,
+                entries=len(self._entries),
+                bytes=self._bytes,
+                max_bytes=self.max_bytes,
+                ttl=self.ttl,
+            )
@@ -0,0 +1,466 @@
+import bisect
+import re
+import threading
+
+from pet_repository import birth_timestamp, name_key, sort_spec
+from picture_storage import PictureStore
+from snapshot_file import SnapshotFile
+
+"""
+------------------------------------------------------------------------------------------------
+In-process storage engine (STORAGE_ENGINE=memory), a drop-in for the Mongo one:
+MemoryPetRepository has the methods of PetRepository, MemoryPictureStore the
+methods of PictureStore. Nothing leaves the process, so a store runs without
+Mongo (single node, local benchmarks) and a request costs no round trip.
+
+Indexes, all kept up to date on every write:
+  pet-types : id (hash), type name (hash), family / genus (hash),
+              attributes (sorted, lower-cased, answers the hasAttribute prefix search),
+              lifespan (sorted, answers the lifespan ranges)
+  pets      : (type_id, case-folded name) (hash), birthdate per type (sorted)
+list_types() accepts the Mongo-style query dicts the routes build; the most
+selective index narrows the candidates and matches() checks the rest.
+
+State is persisted through a SnapshotFile (STORAGE_SNAPSHOT), if configured.
+------------------------------------------------------------------------------------------------
+"""
+
+
+#---------------------QUERY MATCHING-----------------------
+def _any(value, predicate):
+    # Like Mongo, a condition on an array field matches if any element matches
+    if isinstance(value, list):
+        return any(predicate(v) for v in value)
+    return predicate(value)
+
+
+def _compare(op):
+    def check(a, b):
+        if a is None or b is None:
+            return False
+        try:
+            return op(a, b)
+        except TypeError:
+            return False
+    return check
+
+
+COMPARISONS = {
+    "$gt": _compare(lambda a, b: a > b),
+    "$gte": _compare(lambda a, b: a >= b),
+    "$lt": _compare(lambda a, b: a < b),
+    "$lte": _compare(lambda a, b: a <= b),
+}
+
+
+def _equals(value, expected):
+    if isinstance(value, list) and not isinstance(expected, list):
+        return expected in value
+    return value == expected
+
+
+def _matches_operator(doc, field, op, arg, options):
+    value = doc.get(field)
+    if op in COMPARISONS:
+        return _any(value, lambda v: COMPARISONS[op](v, arg))
+    if op == "$eq":
+        return _equals(value, arg)
+    if op == "$in":
+        return any(_equals(value, a) for a in arg)
+    if op == "$nin":
+        return not any(_equals(value, a) for a in arg)
+    if op == "$ne":
+        return not _equals(value, arg)
+    if op == "$exists":
+        return (field in doc) == bool(arg)
+    if op == "$size":
+        return isinstance(value, list) and len(value) == arg
+    if op == "$regex":
+        pattern = re.compile(arg, re.IGNORECASE if "i" in options else 0)
+        return _any(value, lambda v: isinstance(v, str) and pattern.search(v) is not None)
+    raise ValueError(f"Unsupported query operator {op}")
+
+
+def matches(doc, query):
+    """
+    Evaluate the subset of the Mongo query language the routes use against a document.
+    """
+    for field, cond in query.items():
+        if field == "$or":
+            if not any(matches(doc, sub) for sub in cond):
+                return False
+        elif isinstance(cond, dict) and any(k.startswith("$") for k in cond):
+            options = cond.get("$options", "")
+            for op, arg in cond.items():
+                if op != "$options" and not _matches_operator(doc, field, op, arg, options):
+                    return False
+        elif not _equals(doc.get(field), cond):
+            return False
+    return True
+
+
+def _prefix_of(cond):
+    """
+    Helper: the literal prefix of a case-insensitive "^prefix" regex condition, or None.
+    """
+    if not isinstance(cond, dict) or "i" not in cond.get("$options", ""):
+        return None
+    regex = cond.get("$regex")
+    if not isinstance(regex, str) or not regex.startswith("^"):
+        return None
+    literal = re.match(r"[^.^$*+?{}\[\]\\|()]*", regex[1:]).group(0)
+    return literal.lower() if literal else None
+
+
+#---------------------PETS-----------------------
+class MemoryPetRepository:
+    def __init__(self, snapshot=None):
+        self._lock = threading.RLock()
+        self._types = {}                # id -> pet-type document
+        self._ids_by_type = {}          # type name -> id
+        self._ids_by_field = {"family": {}, "genus": {}}    # field -> value -> set of ids
+        self._attributes = []           # sorted [(lower-case attribute, id)]
+        self._lifespans = []            # sorted [(lifespan, id)], types without a lifespan left out
+        self._pets = {}                 # type id -> {name_key(name): (seq, pet)} in insertion order
+        self._births = {}               # type id -> sorted [(birth timestamp, seq, name key)]
+        self._seq = 0
+        self._listeners = []
+
+        self.snapshot = snapshot or SnapshotFile()
+        self.snapshot.register("pets", self._dump, self._load)
+
+    def ensure_indexes(self):
+        pass    # maintained on every write
+
+    def subscribe(self, callback):
+        """
+        Call `callback()` after every pet-type write (like PetTypeCache.subscribe).
+        """
+        self._listeners.append(callback)
+
+    def _changed(self):
+        self.snapshot.mark_dirty()
+        for callback in self._listeners:
+            callback()
+
+    #---------------------INDEX MAINTENANCE-----------------------
+    def _index_type(self, doc):
+        type_id = doc["id"]
+        self._types[type_id] = doc
+        self._ids_by_type[doc.get("type")] = type_id
+        for field, index in self._ids_by_field.items():
+            index.setdefault(doc.get(field), set()).add(type_id)
+        for attribute in doc.get("attributes") or []:
+            bisect.insort(self._attributes, (str(attribute).lower(), type_id))
+        if isinstance(doc.get("lifespan"), (int, float)):
+            bisect.insort(self._lifespans, (doc["lifespan"], type_id))
+        self._pets.setdefault(type_id, {})
+        self._births.setdefault(type_id, [])
+
+    def _unindex_type(self, type_id):
+        doc = self._types.pop(type_id)
+        self._ids_by_type.pop(doc.get("type"), None)
+        for field, index in self._ids_by_field.items():
+            ids = index.get(doc.get(field))
+            if ids is not None:
+                ids.discard(type_id)
+                if not ids:
+                    del index[doc.get(field)]
+        self._attributes = [(a, i) for a, i in self._attributes if i != type_id]
+        self._lifespans = [(l, i) for l, i in self._lifespans if i != type_id]
+        self._pets.pop(type_id, None)
+        self._births.pop(type_id, None)
+
+    def _index_pet(self, type_id, pet):
+        pets = self._pets.get(type_id)
+        if pets is None:
+            return False
+        self._seq += 1
+        pets[name_key(pet["name"])] = (self._seq, pet)
+        self._index_birth(type_id, self._seq, pet)
+        return True
+
+    def _unindex_pet(self, type_id, name):
+        entry = (self._pets.get(type_id) or {}).pop(name_key(name), None)
+        if entry is None:
+            return None
+        seq, pet = entry
+        self._unindex_birth(type_id, seq, pet)
+        return pet
+
+    def _index_birth(self, type_id, seq, pet):
+        ts = birth_timestamp(pet.get("birthdate"))
+        if ts is not None and type_id in self._births:
+            bisect.insort(self._births[type_id], (ts, seq, name_key(pet["name"])))
+
+    def _unindex_birth(self, type_id, seq, pet):
+        ts = birth_timestamp(pet.get("birthdate"))
+        births = self._births.get(type_id)
+        if ts is not None and births is not None:
+            entry = (ts, seq, name_key(pet["name"]))
+            i = bisect.bisect_left(births, entry)
+            if i < len(births) and births[i] == entry:
+                del births[i]
+
+    def _candidates(self, query):
+        """
+        Pick the most selective index for a list_types query, returns candidate ids.
+        """
+        options = []
+        if "id" in query and not isinstance(query["id"], dict):
+            options.append([query["id"]] if query["id"] in self._types else [])
+        if "type" in query and not isinstance(query["type"], dict):
+            type_id = self._ids_by_type.get(query["type"])
+            options.append([type_id] if type_id is not None else [])
+        for field, index in self._ids_by_field.items():
+            cond = query.get(field)
+            if cond is None:
+                continue
+            if isinstance(cond, dict) and set(cond) == {"$in"}:
+                options.append(set().union(*(index.get(v, set()) for v in cond["$in"])))
+            elif not isinstance(cond, dict):
+                options.append(index.get(cond, set()))
+        prefix = _prefix_of(query.get("attributes"))
+        if prefix is not None:
+            start = bisect.bisect_left(self._attributes, (prefix,))
+            ids = set()
+            for attribute, type_id in self._attributes[start:]:
+                if not attribute.startswith(prefix):
+                    break
+                ids.add(type_id)
+            options.append(ids)
+        lifespan = query.get("lifespan")
+        if isinstance(lifespan, dict) and set(lifespan) <= {"$gt", "$gte", "$lt", "$lte", "$eq"}:
+            options.append(self._lifespan_range(lifespan))
+        elif isinstance(lifespan, (int, float)):
+            options.append(self._lifespan_range({"$eq": lifespan}))
+        if not options:
+            return list(self._types)
+        # Ids grow with insertion, so sorting keeps the order of a Mongo collection scan
+        return sorted(min(options, key=len))
+
+    def _lifespan_range(self, cond):
+        low, high = 0, len(self._lifespans)
+        inf = float("inf")
+        if "$eq" in cond:
+            low = max(low, bisect.bisect_left(self._lifespans, (cond["$eq"], -inf)))
+            high = min(high, bisect.bisect_right(self._lifespans, (cond["$eq"], inf)))
+        if "$gt" in cond:
+            low = max(low, bisect.bisect_right(self._lifespans, (cond["$gt"], inf)))
+        if "$gte" in cond:
+            low = max(low, bisect.bisect_left(self._lifespans, (cond["$gte"], -inf)))
+        if "$lt" in cond:
+            high = min(high, bisect.bisect_left(self._lifespans, (cond["$lt"], -inf)))
+        if "$lte" in cond:
+            high = min(high, bisect.bisect_right(self._lifespans, (cond["$lte"], inf)))
+        return {type_id for _, type_id in self._lifespans[low:high]}
+
+    @staticmethod
+    def _sort(docs, sort):
+        # Stable sorts from the last key to the first; like Mongo, missing / null values sort lowest
+        for field, direction in reversed(sort_spec(sort)):
+            docs.sort(key=lambda d: (d.get(field) is not None, d.get(field)), reverse=direction < 0)
+        return docs
+
+    @staticmethod
+    def _copy_type(doc):
+        return dict(doc, pets=list(doc.get("pets") or []), attributes=list(doc.get("attributes") or []))
+
+    #---------------------SNAPSHOT-----------------------
+    def _dump(self):
+        with self._lock:
+            return {
+                "types": list(self._types.values()),
+                "pets": [[type_id, pet] for type_id, pets in self._pets.items() for _, pet in pets.values()],
+            }
+
+    def _load(self, data):
+        with self._lock:
+            for doc in data.get("types", []):
+                self._index_type(doc)
+            for type_id, pet in data.get("pets", []):
+                if type_id in self._types:
+                    self._index_pet(type_id, pet)
+
+    #---------------------PET TYPES-----------------------
+    def type_exists(self, type_id):
+        with self._lock:
+            return type_id in self._types
+
+    def find_type_slot(self, type_name):
+        with self._lock:
+            return type_name in self._ids_by_type, max(self._types, default=0) + 1
+
+    def insert_type(self, pet_type_doc):
+        doc = {k: v for k, v in pet_type_doc.items() if k != "_id"}
+        with self._lock:
+            if doc["id"] in self._types:
+                return False
+            self._index_type(self._copy_type(doc))
+        self._changed()
+        return True
+
+    def list_types(self, query, sort=None):
+        with self._lock:
+            docs = (self._types[type_id] for type_id in self._candidates(query))
+            docs = [self._copy_type(doc) for doc in docs if matches(doc, query)]
+        return self._sort(docs, sort) if sort else docs
+
+    def count_types(self, query):
+        with self._lock:
+            return sum(1 for type_id in self._candidates(query) if matches(self._types[type_id], query))
+
+    def get_type(self, type_id):
+        with self._lock:
+            doc = self._types.get(type_id)
+            return self._copy_type(doc) if doc else None
+
+    def delete_type_if_empty(self, type_id):
+        with self._lock:
+            doc = self._types.get(type_id)
+            if doc is None:
+                return "not_found"
+            if doc.get("pets"):
+                return "has_pets"
+            self._unindex_type(type_id)
+        self._changed()
+        return "deleted"
+
+    #---------------------PETS-----------------------
+    def list_pets(self, type_id, born_after=None, born_before=None):
+        with self._lock:
+            pets = self._pets.get(type_id)
+            if pets is None:
+                return None
+            if born_after is None and born_before is None:
+                return [dict(pet) for _, pet in pets.values()]
+            births = self._births[type_id]
+            start = 0 if born_after is None else bisect.bisect_right(births, (born_after, float("inf")))
+            end = len(births) if born_before is None else bisect.bisect_left(births, (born_before,))
+            in_range = sorted(births[start:end], key=lambda b: b[1])
+            return [dict(pets[key][1]) for _, _, key in in_range]
+
+    def find_pet(self, type_id, name):
+        with self._lock:
+            pets = self._pets.get(type_id)
+            if pets is None:
+                return False, None
+            entry = pets.get(name_key(name))
+            return True, (dict(entry[1]) if entry else None)
+
+    def insert_pet(self, type_id, pet):
+        with self._lock:
+            # The pet-type may have been deleted since the route checked it
+            pets = self._pets.get(type_id)
+            if pets is None or name_key(pet["name"]) in pets:
+                return False
+            self._index_pet(type_id, {"name": pet["name"], "birthdate": pet.get("birthdate"), "picture": pet.get("picture")})
+            self._types[type_id].setdefault("pets", []).append(pet["name"])
+        self._changed()
+        return True
+
+    def replace_pet(self, type_id, name, new_pet):
+        new_name = new_pet["name"]
+        fields = {"name": new_name, "birthdate": new_pet.get("birthdate"), "picture": new_pet.get("picture")}
+        with self._lock:
+            pets = self._pets.get(type_id)
+            if pets is None or name_key(name) not in pets:
+                return "not_found", None
+            old = pets[name_key(name)][1]
+            if name_key(new_name) == name_key(name):
+                self._update_in_place(type_id, name, fields)
+            elif name_key(new_name) in pets:
+                return "exists", dict(old)
+            else:
+                self._unindex_pet(type_id, name)
+                self._index_pet(type_id, fields)
+            if new_name != old["name"]:
+                names = self._types[type_id].setdefault("pets", [])
+                if old["name"] in names:
+                    names[names.index(old["name"])] = new_name
+                elif new_name not in names:
+                    names.append(new_name)
+        self._changed()
+        return "replaced", dict(old)
+
+    def _update_in_place(self, type_id, name, fields):
+        # The pet keeps its position; fields may change the name's case, not its key
+        pets = self._pets[type_id]
+        seq, old = pets[name_key(name)]
+        self._unindex_birth(type_id, seq, old)
+        pet = dict(old, **fields)
+        pets[name_key(name)] = (seq, pet)
+        self._index_birth(type_id, seq, pet)
+        return pet
+
+    def delete_pet(self, type_id, name):
+        with self._lock:
+            pets = self._pets.get(type_id)
+            if not pets or name_key(name) not in pets:
+                return None
+            pet = self._unindex_pet(type_id, name)
+            names = self._types[type_id].get("pets") or []
+            if pet["name"] in names:
+                names.remove(pet["name"])
+        self._changed()
+        return dict(pet)
+
+
+#---------------------PICTURES-----------------------
+class MemoryPictureStore(PictureStore):
+    """
+    PictureStore whose file name / blob reference tables live in memory (bytes
+    stay in the backend, normally the local disk).
+    """
+    def __init__(self, backend, snapshot=None):
+        super().__init__(backend, None, None)
+        self._lock = threading.Lock()
+        self._names = {}    # file name -> {digest, content_type, size}
+        self._refs = {}     # digest -> number of file names using it
+        self.snapshot = snapshot or SnapshotFile()
+        self.snapshot.register("pictures", self._dump, self._load)
+
+    def _dump(self):
+        with self._lock:
+            return {"names": dict(self._names), "refs": dict(self._refs)}
+
+    def _load(self, data):
+        with self._lock:
+            self._names.update(data.get("names", {}))
+            self._refs.update(data.get("refs", {}))
+
+    def commit(self, filename, staged):
+        with self._lock:
+            self._refs[staged.digest] = self._refs.get(staged.digest, 0) + 1
+        if not self.backend.exists(staged.digest):
+            staged.file.seek(0)
+            self.backend.put(staged.digest, staged.file)
+        with self._lock:
+            previous = self._names.get(filename)
+            self._names[filename] = {"digest": staged.digest, "content_type": staged.content_type, "size": staged.size}
+        if previous:
+            self._release(previous["digest"])
+        self.snapshot.mark_dirty()
+
+    def delete(self, filename):
+        if not filename or filename == "NA":
+            return
+        with self._lock:
+            entry = self._names.pop(filename, None)
+        if entry:
+            self._release(entry["digest"])
+            self.snapshot.mark_dirty()
+
+    def lookup(self, filename):
+        with self._lock:
+            return self._names.get(filename)
+
+    def _release(self, digest):
+        with self._lock:
+            refs = self._refs.get(digest, 0) - 1
+            if refs > 0:
+                self._refs[digest] = refs
+                return
+            self._refs.pop(digest, None)
+            # Under the lock: a commit taking a new reference then finds the bytes gone and stores them again
+            self.backend.delete(digest)
@@ -1,10 +1,27 @@
-from flask import Flask, jsonify, request, make_response, send_from_directory
+from flask import Blueprint, Flask, Response, current_app, g, jsonify, request, make_response
 from pymongo import MongoClient
+import pymongo
 import requests
+import tempfile
+import threading
+import time
 import uuid
 import re 
 import os
-from datetime import datetime
+from health import ReadinessProbe
+from pet_type_cache import PetTypeCache
+from pet_repository import PetRepository, RoundTripCounter, birth_timestamp
+from picture_storage import LocalDiskBackend, picture_store_from_env
+from memory_engine import MemoryPetRepository, MemoryPictureStore
+from snapshot_file import SnapshotFile
+from read_routing import ReadRouting
+from deadline import DEADLINE_HEADER, EXCEEDED_HEADER, EXCEEDED_STATUS, Deadline, DeadlineExceeded
+from json_provider import FastJSONProvider, SerializedResponseCache
+from fetch_cache import FetchCache
+from thumbnails import NotAnImage, ThumbnailCache, parse_box
+from taxonomy_catalog import TaxonomyCatalog
+from compression import ResponseCompressor
+from traffic_capture import TrafficCapture
 
 """
 ------------------------------------------------------------------------------------------------
@@ -39,18 +56,203 @@ JSON for a pet  ------------------->    Example pet
 MONGO_URI = os.environ.get("MONGO_URI", "mongodb://mongo-store:27017")
 STORE_ID = os.environ.get("STORE_ID", "1") # Default to 1
 
-client = MongoClient(MONGO_URI)
-db = client.petstore
+IMAGES_DIR = os.environ.get("IMAGES_DIR", "pet_images")
+
+# "mongo" (default) or "memory": everything in process, optionally persisted to STORAGE_SNAPSHOT
+STORAGE_ENGINE = os.environ.get("STORAGE_ENGINE", "mongo")
+
+# Counts the Mongo commands sent while serving each request
+round_trips = RoundTripCounter()
+
+# Storage engine, caches and picture storage are only created by init_storage(),
+# on the first request that needs them. /healthz never does.
+client = None
+db = None
+pet_types_col = None
+pets_col = None
+pet_type_cache = None
+pet_types_response_cache = None
+picture_store = None
+snapshot_file = None
+fetch_cache = None
+thumbnail_cache = None
+taxonomy_catalog = None
+read_routing = None
+repo = None
+_unindexed_repo = None          # built, waiting for ensure_indexes() to succeed
+_index_failed_at = None
+_storage_lock = threading.Lock()
+
+# While the indexes cannot be created, requests fail fast and the next attempt
+# waits STORAGE_RETRY_SECONDS; one attempt lasts at most STORAGE_INIT_TIMEOUT
+STORAGE_RETRY_SECONDS = float(os.environ.get("STORAGE_RETRY_SECONDS", "2"))
+STORAGE_INIT_TIMEOUT = float(os.environ.get("STORAGE_INIT_TIMEOUT", "10"))
+
+class StorageNotReady(Exception):
+    """ Raised by init_storage() until the storage engine has its indexes. """
+
+def init_storage():
+    """
+    Create the storage engine, caches and picture store (once), then its indexes.
+    `repo` is only set once the indexes exist (the unique, case-insensitive
+    pet name index guards against duplicates); until then every call retries,
+    at most once per STORAGE_RETRY_SECONDS, and raises StorageNotReady.
+    """
+    global repo, _unindexed_repo, _index_failed_at
+    if repo is not None:
+        return
+    with _storage_lock:
+        if repo is not None:
+            return
+        if _unindexed_repo is None:
+            _unindexed_repo = build_storage()
+        if _index_failed_at is not None and time.monotonic() - _index_failed_at < STORAGE_RETRY_SECONDS:
+            raise StorageNotReady("Could not create the storage indexes, retrying shortly")
+        try:
+            with pymongo.timeout(STORAGE_INIT_TIMEOUT):
+                _unindexed_repo.ensure_indexes()
+        except Exception as e:
+            _index_failed_at = time.monotonic()
+            raise StorageNotReady(f"Could not create the storage indexes: {e}") from e
+        # Set last: other threads only skip the lock once everything exists
+        repo = _unindexed_repo
+
+def build_storage():
+    """
+    Create the storage engine, caches and picture store, returns the (not yet indexed) repository.
+    """
+    global client, db, pet_types_col, pets_col, pet_type_cache, pet_types_response_cache, picture_store, snapshot_file, fetch_cache, thumbnail_cache, taxonomy_catalog, read_routing
+    if STORAGE_ENGINE == "memory":
+        snapshot_file = SnapshotFile(
+            os.environ.get("STORAGE_SNAPSHOT"),
+            interval=float(os.environ.get("STORAGE_SNAPSHOT_INTERVAL", "1")),
+        )
+        new_repo = MemoryPetRepository(snapshot_file)
+        # Bytes on local disk, the name / blob tables in the snapshot
+        picture_store = MemoryPictureStore(LocalDiskBackend(IMAGES_DIR), snapshot_file)
+        snapshot_file.start()
+    elif STORAGE_ENGINE == "mongo":
+        client = MongoClient(MONGO_URI, event_listeners=[round_trips])
+        db = client.petstore
+
+        pet_types_col = db[f"pet_types_store{STORE_ID}"]
+        pets_col = db[f"pets_store{STORE_ID}"]
+
+        # List reads may go to secondaries (READ_PREFERENCE / READ_MAX_STALENESS)
+        read_routing = ReadRouting.from_env(client)
+
+        # Pet-type documents are read on every pets route, keep them in memory.
+        # Routed reads also wait for the remote writes its change stream reports.
+        pet_type_cache = PetTypeCache(
+            pet_types_col,
+            max_entries=int(os.environ.get("PET_TYPE_CACHE_SIZE", "256")),
+            ttl=float(os.environ.get("PET_TYPE_CACHE_TTL", "30")),
+            observe=read_routing.observe,
+        )
+        if os.environ.get("PET_TYPE_CACHE_WATCH", "1") == "1":
+            pet_type_cache.start_watcher()
+
+        # Pictures are deduplicated by content, on local disk or GridFS (PICTURE_BACKEND)
+        picture_store = picture_store_from_env(db, STORE_ID, IMAGES_DIR)
+
+        new_repo = PetRepository(pet_types_col, pets_col, pet_type_cache, read_routing)
+    else:
+        raise ValueError(f"Unknown STORAGE_ENGINE {STORAGE_ENGINE!r}")
 
-pet_types_col = db[f"pet_types_store{STORE_ID}"]
-pets_col = db[f"pets_store{STORE_ID}"]
+    # Serialized GET /pet-types bodies, dropped on every (local or remote) pet-type write
+    pet_types_response_cache = SerializedResponseCache(
+        max_entries=int(os.environ.get("RESPONSE_CACHE_SIZE", "128")),
+        ttl=float(os.environ.get("RESPONSE_CACHE_TTL", "30")),
+    )
+    new_repo.subscribe(pet_types_response_cache.invalidate)
 
-IMAGES_DIR = "pet_images"
-os.makedirs(IMAGES_DIR, exist_ok=True)
+    # Remote picture-url downloads, shared by all pets reusing the same URL
+    fetch_cache = FetchCache(
+        os.environ.get("FETCH_CACHE_DIR", os.path.join(tempfile.gettempdir(), "pet_fetch_cache")),
+        max_bytes=int(os.environ.get("FETCH_CACHE_MAX_BYTES", str(256 * 1024 * 1024))),
+        ttl=float(os.environ.get("FETCH_CACHE_TTL", "300")),
+    )
+
+    # Resized pictures (?w= / ?h= / ?size= on GET /pictures), generated on first request
+    thumbnail_cache = ThumbnailCache(
+        os.environ.get("THUMB_CACHE_DIR", os.path.join(tempfile.gettempdir(), "pet_thumbnails")),
+        max_bytes=int(os.environ.get("THUMB_CACHE_MAX_BYTES", str(64 * 1024 * 1024))),
+        quality=int(os.environ.get("THUMB_QUALITY", "85")),
+    )
+
+    # Offline animal records for add_pet_type (see taxonomy_catalog.py for the CLI)
+    catalog_path = os.environ.get("TAXONOMY_CATALOG", "taxonomy_catalog.ndjson")
+    fuzzy_cutoff = os.environ.get("TAXONOMY_FUZZY_CUTOFF")
+    fuzzy_cutoff = float(fuzzy_cutoff) if fuzzy_cutoff else None
+    if os.path.exists(catalog_path):
+        taxonomy_catalog = TaxonomyCatalog.load(catalog_path, fuzzy_cutoff=fuzzy_cutoff)
+    else:
+        taxonomy_catalog = TaxonomyCatalog(fuzzy_cutoff=fuzzy_cutoff)
+
+    return new_repo
+
+def ping_storage():
+    # The whole check (first-time setup and index creation included) is bounded
+    with pymongo.timeout(float(os.environ.get("READY_PING_TIMEOUT", "1"))):
+        init_storage()
+        if client is None:
+            return  # in-process engine, nothing to reach
+        client.admin.command("ping")
+
+readiness = ReadinessProbe(ping_storage, cache_seconds=float(os.environ.get("READY_CACHE_SECONDS", "2")))
+
+bp = Blueprint("pet_store", __name__)
+
+# Routes that must answer without Mongo / storage being initialized
+HEALTH_ENDPOINTS = {"pet_store.healthz", "pet_store.readyz"}
+# Routes that do not need the storage either: /kill (chaos tests) and the counters
+NO_STORAGE_ENDPOINTS = HEALTH_ENDPOINTS | {
+    "pet_store.kill_container",
+    "pet_store.fetch_cache_stats",
+    "pet_store.thumbnail_cache_stats",
+    "pet_store.read_routing_stats",
+    "pet_store.pet_type_cache_stats",
+    "pet_store.round_trip_stats",
+    "pet_store.response_cache_stats",
+}
 
-app = Flask(__name__)
+@bp.before_app_request
+def prepare_request():
+    if request.endpoint in HEALTH_ENDPOINTS:
+        return
+    if request.endpoint not in NO_STORAGE_ENDPOINTS:
+        init_storage()
+    round_trips.reset()
+    # Caller's remaining budget (pet-order sends it), checked before the expensive steps
+    g.deadline = Deadline.from_header(request.headers.get(DEADLINE_HEADER))
+    check_deadline()
+
+@bp.after_app_request
+def report_round_trips(response):
+    if request.endpoint in HEALTH_ENDPOINTS:
+        return response
+    route = f"{request.method} {request.url_rule.rule}" if request.url_rule else request.method
+    response.headers["X-Mongo-Round-Trips"] = str(round_trips.record(route))
+    return response
+
+@bp.app_errorhandler(DeadlineExceeded)
+def deadline_exceeded(e):
+    return jsonify({"error": "Deadline exceeded"}), EXCEEDED_STATUS, {EXCEEDED_HEADER: "1"}
+
+@bp.app_errorhandler(StorageNotReady)
+def storage_not_ready(e):
+    return jsonify({"error": str(e)}), 503, {"Retry-After": str(max(1, round(STORAGE_RETRY_SECONDS)))}
 
 #---------------------HELPERS-----------------------
+def check_deadline(step="request"):
+    """
+    Helper function to stop working on a request whose caller has given up.
+    Raises DeadlineExceeded, answered with 504 + X-Deadline-Exceeded.
+    """
+    request_deadline = g.get("deadline")
+    if request_deadline is not None:
+        request_deadline.check(step)
+
 def get_petInfo(petType):
     """
     Helper function to get pet information from the API-Ninjas API.
@@ -61,6 +263,20 @@ def get_petInfo(petType):
     r = requests.get(url, headers=headers)
     return r.json()
 
+def download_picture(url):
+    """
+    Helper function to stream a picture from a URL into a staged (hashed) picture.
+    Goes through the fetch cache, so a URL reused by many pets is downloaded once.
+    Returns None if the URL does not answer 200.
+    """
+    status_code, content_type, chunks = fetch_cache.fetch(url)
+    if status_code != 200:
+        return None
+    content_type = (content_type or "").split(";")[0].strip()
+    if not content_type.startswith("image/"):
+        content_type = None
+    return picture_store.stage(chunks, content_type)
+
 def find_exact_animal(data, target):
     """
     Helper function to find an exact animal in the data.
@@ -71,6 +287,27 @@ def find_exact_animal(data, target):
             return animal
     return None
 
+def resolve_animal(animal_type):
+    """
+    Helper function to find the animal record of a pet type.
+    The local catalog answers first, the API is only called for unknown names,
+    and the fuzzy catalog match (if enabled) is the last resort.
+    """
+    animal = taxonomy_catalog.lookup(animal_type, fuzzy=False)
+    if animal is not None:
+        return animal
+    try:
+        api_data = get_petInfo(animal_type)
+    except requests.exceptions.RequestException:
+        api_data = None
+    if isinstance(api_data, list):
+        # Keep every returned record, later types are often among the partial matches
+        taxonomy_catalog.add_many(api_data)
+        animal = find_exact_animal(api_data, animal_type)
+    if animal is None:
+        animal = taxonomy_catalog.lookup(animal_type, fuzzy=True)
+    return animal
+
 def get_lifespan(value):
     """
     Helper function to get the lifespan of an animal.
@@ -86,11 +323,78 @@ def get_lifespan(value):
     # Always return the minimum number
     return min(numbers)
 #--------------------------ROUTES----------------
-@app.route('/kill', methods=['GET'])
+@bp.route('/kill', methods=['GET'])
 def kill_container():
     os._exit(1)
 
-@app.route('/pet-types', methods=['POST'])
+@bp.route('/stats/fetch-cache', methods=['GET'])
+def fetch_cache_stats():
+    """
+    Return hit / revalidation / eviction counters of the picture fetch cache.
+    """
+    if fetch_cache is None:
+        return jsonify({"initialized": False}), 200
+    return jsonify(fetch_cache.stats()), 200
+
+@bp.route('/stats/thumbnail-cache', methods=['GET'])
+def thumbnail_cache_stats():
+    """
+    Return hit / generation / eviction counters of the resized picture cache.
+    """
+    if thumbnail_cache is None:
+        return jsonify({"initialized": False}), 200
+    return jsonify(thumbnail_cache.stats()), 200
+
+@bp.route('/stats/read-routing', methods=['GET'])
+def read_routing_stats():
+    """
+    Return the read preference of the list reads and how many were routed.
+    """
+    if read_routing is None:
+        return jsonify({"engine": STORAGE_ENGINE, "enabled": False}), 200
+    return jsonify(read_routing.stats()), 200
+
+@bp.route('/healthz', methods=['GET'])
+def healthz():
+    """
+    Liveness: the process is up, Mongo is not touched.
+    """
+    return jsonify({"status": "ok"}), 200
+
+@bp.route('/readyz', methods=['GET'])
+def readyz():
+    """
+    Readiness: the storage engine answers (a Mongo ping, cached for a couple of seconds).
+    """
+    ready, body = readiness.status()
+    return jsonify(body), (200 if ready else 503)
+
+@bp.route('/stats/pet-type-cache', methods=['GET'])
+def pet_type_cache_stats():
+    """
+    Return hit-rate and invalidation counters of the pet-type cache.
+    """
+    if pet_type_cache is None:
+        return jsonify({"engine": STORAGE_ENGINE, "enabled": False}), 200
+    return jsonify(pet_type_cache.stats()), 200
+
+@bp.route('/stats/round-trips', methods=['GET'])
+def round_trip_stats():
+    """
+    Return the average / max number of Mongo round trips per route.
+    """
+    return jsonify(round_trips.stats()), 200
+
+@bp.route('/stats/response-cache', methods=['GET'])
+def response_cache_stats():
+    """
+    Return hit-rate counters of the serialized GET /pet-types cache.
+    """
+    if pet_types_response_cache is None:
+        return jsonify({"initialized": False}), 200
+    return jsonify(pet_types_response_cache.stats()), 200
+
+@bp.route('/pet-types', methods=['POST'])
 def add_pet_type():
     try:
         content_type = request.headers.get('Content-Type')
@@ -105,11 +409,13 @@ def add_pet_type():
         # Normalise type for storage / lookup
         animal_type = raw_type.strip()
         
-        if pet_types_col.find_one({"type": animal_type}):
+        # Duplicate check, then the next id (both indexed lookups)
+        exists, next_id = repo.find_type_slot(animal_type)
+        if exists:
             return jsonify({"error": f"{animal_type} already exists"}), 400
         
-        api_data = get_petInfo(animal_type)
-        animal = find_exact_animal(api_data, animal_type)
+        check_deadline("resolving the animal")
+        animal = resolve_animal(animal_type)
         
         if not animal:
             return jsonify({"error": "Not found"}), 400
@@ -128,10 +434,6 @@ def add_pet_type():
             attribute = []
 
 
-        # Find current max numeric id and increment (per-store collection)
-        last = pet_types_col.find_one(sort=[("id", -1)])
-        next_id = (last["id"] + 1) if last and "id" in last else 1
-
         pet_type_doc = {
             "id": next_id,  # simple integer ID exposed via API
             "type": animal_type,
@@ -142,7 +444,12 @@ def add_pet_type():
             "pets": []
         }
 
-        pet_types_col.insert_one(pet_type_doc)
+        # Another request may have taken the id while the animal was resolved
+        while not repo.insert_type(pet_type_doc):
+            exists, next_id = repo.find_type_slot(animal_type)
+            if exists:
+                return jsonify({"error": f"{animal_type} already exists"}), 400
+            pet_type_doc["id"] = next_id
 
         # Clean response: do not expose Mongo _id, just our numeric id
         response_doc = {
@@ -155,10 +462,12 @@ def add_pet_type():
             "pets": pet_type_doc["pets"],
         }
         return jsonify(response_doc), 201
+    except DeadlineExceeded:
+        raise
     except Exception as e: 
         return jsonify({"server error": str(e)}), 500
     
-@app.route('/pet-types/<string:id>/pets', methods=['POST'])
+@bp.route('/pet-types/<string:id>/pets', methods=['POST'])
 def add_pet(id):
     # id in path is our numeric pet-type id (per-store)
     try:
@@ -166,8 +475,7 @@ def add_pet(id):
     except ValueError:
         return jsonify({"error": "Pet type not found"}), 404
 
-    pet_type = pet_types_col.find_one({"id": type_id})
-    if not pet_type:
+    if not repo.type_exists(type_id):
         return jsonify({"error": "Pet type not found"}), 404
     
     if request.content_type != 'application/json':
@@ -182,33 +490,38 @@ def add_pet(id):
     if not name: 
         return jsonify({"Error": "name field is required"}), 400
     
-    if pets_col.find_one({"type_id" : type_id, "name" : name}):
-        return jsonify({"error": "Pet exists"}), 400
-    
     filename = "NA"
+    staged = None
     if pic_url:
+        check_deadline("downloading the picture")
         try:
-            image = requests.get(pic_url)
-            if image.status_code == 200:
+            staged = download_picture(pic_url)
+            if staged is not None:
                 filename = f"{id}_{name}.jpg"
-                os.makedirs(IMAGES_DIR, exist_ok=True)
-                filepath = os.path.join(IMAGES_DIR, filename)
-                with open(filepath, "wb") as f:
-                    f.write(image.content)
             else:
                 return jsonify({"error": "Invalid picture URL"}), 400
         except requests.exceptions.RequestException:
             return jsonify({"error": "Invalid URL format or connection failed"}), 400
     
     new_pet = {
-        "_id" : f"{type_id}_{name}", 
-        "type_id" : type_id,
         "name" : name,
         "birthdate" : birthdate,
         "picture" : filename
     }
-    pets_col.insert_one(new_pet)
-    pet_types_col.update_one({"id": type_id}, {"$push": {"pets": name}})
+    try:
+        # The insert itself detects duplicates, no separate find_one
+        if not repo.insert_pet(type_id, new_pet):
+            # Or the pet-type was deleted since the check above
+            if not repo.type_exists(type_id):
+                return jsonify({"error": "Pet type not found"}), 404
+            return jsonify({"error": "Pet exists"}), 400
+
+        # Only store the picture once we know it does not replace another pet's picture
+        if staged is not None:
+            picture_store.commit(filename, staged)
+    finally:
+        if staged is not None:
+            staged.close()
 
     #Return only clean fields, no Mongo ID
     response_payload = {
@@ -219,18 +532,49 @@ def add_pet(id):
 
     return jsonify(response_payload), 201
 
-@app.route('/pet-types', methods=['GET'])
+# Fields GET /pet-types can sort on
+SORT_FIELDS = {"id", "type", "family", "genus", "lifespan"}
+
+def in_list(name):
+    """
+    Helper function to read a filter that may list several values,
+    as ?family=a,b and / or ?family=a&family=b. Returns None, a value or {"$in": [...]}.
+    """
+    values = [v.strip().title() for arg in request.args.getlist(name) for v in arg.split(",") if v.strip()]
+    if not values:
+        return None
+    return values[0] if len(values) == 1 else {"$in": values}
+
+def lifespan_filter():
+    """
+    Helper function to build the lifespan condition from ?lifespan=, ?lifespanGT= and ?lifespanLT=
+    (the bounds are exclusive, like birthdateGT / birthdateLT). Raises ValueError on a non-integer.
+    """
+    cond = {}
+    for arg, op in (("lifespan", "$eq"), ("lifespanGT", "$gt"), ("lifespanLT", "$lt")):
+        value = request.args.get(arg)
+        if value:
+            cond[op] = int(value)
+    if set(cond) == {"$eq"}:
+        return cond["$eq"]
+    return cond or None
+
+@bp.route('/pet-types', methods=['GET'])
 def get_pet_by():
     """
     Return a list of pet types.
+
+    Filters: id, type, family / genus (one value or a comma separated list),
+    lifespan / lifespanGT / lifespanLT, hasAttribute.
+    sort=<field>&order=asc|desc orders the list, count=true only returns {"count": n}.
     """
     query = {}
     pet_id = request.args.get("id")
     type_name = request.args.get("type")
-    family = request.args.get('family')
-    genus = request.args.get('genus')
-    lifespan = request.args.get('lifespan')
     attribute = request.args.get('hasAttribute')
+    sort_field = request.args.get('sort')
+    order = request.args.get('order', 'asc').lower()
+    count_only = request.args.get('count', '').lower() == 'true'
 
     try:
         if pet_id:
@@ -239,27 +583,49 @@ def get_pet_by():
             except ValueError:
                 return jsonify({"error": "Invalid id"}), 400
         if type_name: query["type"] = type_name.strip()
-        if family: query["family"] = family.title()
-        if genus:  query["genus"] = genus.title()
-        if lifespan: query["lifespan"] = int(lifespan)
+        for field in ("family", "genus"):
+            cond = in_list(field)
+            if cond is not None:
+                query[field] = cond
+        try:
+            lifespan = lifespan_filter()
+        except ValueError:
+            return jsonify({"error": "Invalid lifespan"}), 400
+        if lifespan is not None: query["lifespan"] = lifespan
         if attribute:
             #Searches for attributes in the list
             query["attributes"] = {"$regex": f"^{attribute}", "$options": "i"}
 
-        results = list(pet_types_col.find(query))
-        clean_results = []
-        for doc in results:
-            # Build a clean object without internal _id
-            clean_doc = {k: v for k, v in doc.items() if k != "_id"}
-            clean_results.append(clean_doc)
-
-        return jsonify(clean_results), 200
+        sort = None
+        if sort_field:
+            if sort_field not in SORT_FIELDS or order not in ("asc", "desc"):
+                return jsonify({"error": f"sort must be one of {sorted(SORT_FIELDS)}, order asc or desc"}), 400
+            sort = [(sort_field, pymongo.ASCENDING if order == "asc" else pymongo.DESCENDING)]
+
+        # Repeated queries are answered with the already serialized body
+        cache_key = pet_types_response_cache.key({"query": query, "sort": sort, "count": count_only})
+        body = pet_types_response_cache.get(cache_key)
+        if body is None:
+            generation = pet_types_response_cache.generation
+            if count_only:
+                # Counted by the storage engine, no document is built
+                body = current_app.json.dumps_bytes({"count": repo.count_types(query)})
+            else:
+                # Projection already drops the internal _id
+                clean_results = repo.list_types(query, sort)
+                body = current_app.json.dumps_bytes(clean_results)
+            pet_types_response_cache.put(cache_key, body, generation)
+
+        # ETag lets pollers (pet-order's inventory view) get a bodiless 304 when nothing changed
+        response = current_app.json.bytes_response(body, 200)
+        response.add_etag()
+        return response.make_conditional(request)
     
     except Exception as e: 
         return jsonify({"server error":str(e)}), 500
     
   
-@app.route('/pet-types/<string:id>', methods=['GET'])
+@bp.route('/pet-types/<string:id>', methods=['GET'])
 def get_pet_type(id):
     """
     Return a pet type.
@@ -270,17 +636,16 @@ def get_pet_type(id):
         return jsonify({"error": "Not found"}), 404
 
     try:
-        pet = pet_types_col.find_one({"id": type_id})
-        if not pet:
+        clean_pet = repo.get_type(type_id)
+        if not clean_pet:
             return jsonify({"error": "Not found"}), 404
 
-        clean_pet = {k: v for k, v in pet.items() if k != "_id"}
         return jsonify(clean_pet), 200
     except Exception as e:
         return jsonify({"server error": str(e)}), 500
     
 
-@app.route('/pet-types/<string:id>/pets', methods=['GET'])
+@bp.route('/pet-types/<string:id>/pets', methods=['GET'])
 def get_pet_date(id):
     """
     Return a list of pets.
@@ -290,81 +655,51 @@ def get_pet_date(id):
     except ValueError:
         return jsonify({"error": "Invalid ID format"}), 404
 
-    #Validate Pet Type exists using the INTEGER ID and "id" field
-    if not pet_types_col.find_one({"id": type_id}): 
-        return jsonify({"error": "Pet type not found"}), 404
-
-    # Retrieve pets
-    pets = list(pets_col.find({"type_id": type_id}))
-
     # Handle Filters (Date logic remains the same)
     dateGT = request.args.get('birthdateGT')
     dateLT = request.args.get('birthdateLT')
 
-    def parse_date(s):
-        try:
-            return datetime.strptime(s, "%d-%m-%Y").timestamp()
-        except Exception:
-            return None
-
-    dGT = parse_date(dateGT) if dateGT else None
-    dLT = parse_date(dateLT) if dateLT else None
+    dGT = birth_timestamp(dateGT) if dateGT else None
+    dLT = birth_timestamp(dateLT) if dateLT else None
 
-    # Validate date format in query params
+    # Validate date format in query params, before any query
     if (dateGT and dGT is None) or (dateLT and dLT is None):
         return jsonify({"error": "Date must be in DD-MM-YYYY format"}), 400
 
-    results = []
+    # Validate Pet Type exists and retrieve its pets in one query.
+    # The date bounds are applied by the storage engine (an index in the memory engine).
+    pets = repo.list_pets(type_id, born_after=dGT, born_before=dLT)
+    if pets is None:
+        return jsonify({"error": "Pet type not found"}), 404
 
-    for pet in pets:
-        # Create the cleaned object
-        pet_obj = {
+    # Create the cleaned objects
+    results = [
+        {
             "name": pet.get("name"),
             "birthdate": pet.get("birthdate"),
             "picture": pet.get("picture")
         }
-
-        # If no filters, add everyone
-        if not dateGT and not dateLT:
-            results.append(pet_obj)
-            continue
-
-        # Filter Logic
-        birthdate = pet.get("birthdate")
-        if not birthdate or birthdate == "NA":
-            continue # Skip pets with no birthdate if filtering is active
-
-        try:
-            pet_ts = datetime.strptime(birthdate, "%d-%m-%Y").timestamp()
-        except ValueError:
-            continue
-
-        if dGT is not None and not (pet_ts > dGT):
-            continue
-        if dLT is not None and not (pet_ts < dLT):
-            continue
-
-        results.append(pet_obj)
+        for pet in pets
+    ]
 
     #  Return 200 (even if list is empty)
     return jsonify(results), 200
 
 
-@app.route('/pet-types/<string:id>/pets/<string:name>', methods=['GET'])
+@bp.route('/pet-types/<string:id>/pets/<string:name>', methods=['GET'])
 def get_pet_by_name(id, name):
     """
-    Return a pet by name.
+    Return a pet by name (any case).
     """
     try:
         type_id = int(id)
     except ValueError:
         return jsonify({"error": "Invalid ID"}), 404
 
-
-    if not pet_types_col.find_one({"id": type_id}):
+    type_found, pet_data = repo.find_pet(type_id, name)
+    if not type_found:
         return jsonify({"error": "Pet type ID not found"}), 404
     
-    pet_data = pets_col.find_one({"type_id": type_id, "name": name})
     if not pet_data:
         return jsonify({"error": "Pet name not found"}), 404
     
@@ -378,33 +713,47 @@ def get_pet_by_name(id, name):
 
 
 
-@app.route('/pictures/<string:filename>', methods=['GET'])
+@bp.route('/pictures/<string:filename>', methods=['GET'])
 def get_picture(filename):
     """
-    Return a picture.
+    Return a picture, resized to fit ?w= / ?h= (pixels) or a named ?size= when given.
     """
-    full_path = os.path.join(IMAGES_DIR, filename)
+    try:
+        box = parse_box(request.args.get("size"), request.args.get("w"), request.args.get("h"))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    if box is None:
+        picture = picture_store.open(filename)
+    else:
+        if not thumbnail_cache.available:
+            return jsonify({"error": "Resizing is not available on this store"}), 501
+        entry = picture_store.lookup(filename)
+        if entry is None:
+            return jsonify({"error" : "Picture not found"}), 404
+        try:
+            picture = thumbnail_cache.get(filename, entry["digest"], box, lambda: picture_store.backend.open(entry["digest"]))
+        except NotAnImage:
+            return jsonify({"error": "Picture cannot be resized"}), 415
 
-    if not os.path.exists(full_path):
+    if picture is None:
         return jsonify({"error" : "Picture not found"}), 404
     
-    return send_from_directory(IMAGES_DIR, filename)
+    # Streamed chunk by chunk from the configured backend (or the thumbnail cache)
+    chunks, content_type, size = picture
+    response = Response(chunks, mimetype=content_type)
+    if size is not None:
+        response.headers["Content-Length"] = str(size)
+    return response
 
 
-@app.route('/pet-types/<string:id>/pets/<string:name>', methods=['PUT'])
+@bp.route('/pet-types/<string:id>/pets/<string:name>', methods=['PUT'])
 def update_pet(id, name):
     try:
         type_id = int(id)
     except ValueError:
         return jsonify({"error": "Invalid ID"}), 404
 
-    if not pet_types_col.find_one({"id": type_id}):
-        return jsonify({"error" : "Pet type ID not found"}), 404
-    
-    current_pet_data = pets_col.find_one({"type_id": type_id, "name": name})
-    if not current_pet_data:
-        return jsonify({"error" : "Pet name not found"}), 404
-    
     if request.content_type != 'application/json':
         return jsonify({"error": "Unsupported Media Type"}), 415
     
@@ -417,61 +766,45 @@ def update_pet(id, name):
     new_birthdate = data.get("birthdate", "NA")
     new_pic_url = data.get("picture-url")
 
-    old_filename = current_pet_data.get("picture")
     new_filename = "NA"
+    staged = None
 
     if new_pic_url:
+        check_deadline("downloading the picture")
         try:
-            response = requests.get(new_pic_url)
-            if response.status_code == 200:
-                # Delete the OLD image if it exists
-                if old_filename and old_filename != "NA":
-                    old_path = os.path.join(IMAGES_DIR, old_filename)
-                    if os.path.exists(old_path):
-                        os.remove(old_path)
-                new_filename = f"{id}_{new_name}.jpg"
-                new_path = os.path.join(IMAGES_DIR, new_filename)
-                with open(new_path, "wb") as f:
-                    f.write(response.content)
-                
-            else:
-                return jsonify({"error": "Invalid picture URL"}), 400
+            staged = download_picture(new_pic_url)
         except:
              return jsonify({"error": "Could not connect to picture URL"}), 400
-    else:
-        if old_filename and old_filename != "NA":
-             old_path = os.path.join(IMAGES_DIR, old_filename)
-             if os.path.exists(old_path):
-                 os.remove(old_path)
-        new_filename = "NA"
+        if staged is None:
+            return jsonify({"error": "Invalid picture URL"}), 400
+        new_filename = f"{id}_{new_name}.jpg"
 
     new_pet_doc = {
-        "_id": f"{type_id}_{new_name}", 
-        "type_id": type_id,
         "name": new_name,
         "birthdate": new_birthdate,
         "picture": new_filename
     }
     
     try:
-        if new_name != name:
-            # Check if new name already exists to avoid overwriting/duplicates
-            if pets_col.find_one({"type_id": type_id, "name": new_name}):
-                 return jsonify({"error": "Pet with new name already exists"}), 400
-
-            pets_col.insert_one(new_pet_doc)
-            pets_col.delete_one({"_id": current_pet_data["_id"]})
-            
-            pet_types_col.update_one({"id": type_id}, {"$pull": {"pets": name}})
-            pet_types_col.update_one({"id": type_id}, {"$push": {"pets": new_name}})
-        else:
-            pets_col.update_one(
-                    {"_id": current_pet_data["_id"]},
-                    {"$set": {
-                        "birthdate": new_birthdate,
-                        "picture": new_filename
-                    }}
-                )
+        # Pet document first: pictures are only stored / released once it is written.
+        # The write finds the pet itself (the URL may use another case than the stored name)
+        status, current_pet_data = repo.replace_pet(type_id, name, new_pet_doc)
+        if status == "not_found":
+            if not repo.type_exists(type_id):
+                return jsonify({"error" : "Pet type ID not found"}), 404
+            return jsonify({"error" : "Pet name not found"}), 404
+        if status == "exists":
+            # Fails if new name already exists to avoid overwriting/duplicates
+            return jsonify({"error": "Pet with new name already exists"}), 400
+        old_filename = current_pet_data.get("picture")
+
+        if staged is not None:
+            picture_store.commit(new_filename, staged)
+            thumbnail_cache.invalidate(new_filename)
+        # Release the OLD image (same name was already replaced by the commit)
+        if old_filename != new_filename:
+            picture_store.delete(old_filename)
+        thumbnail_cache.invalidate(old_filename)
         
         response_json = {
                 "name": new_name,
@@ -482,9 +815,12 @@ def update_pet(id, name):
     
     except Exception as e:
         return jsonify({"error": f"Database update failed: {str(e)}"}), 500
+    finally:
+        if staged is not None:
+            staged.close()
     
 
-@app.route('/pet-types/<string:id>', methods=['DELETE'])
+@bp.route('/pet-types/<string:id>', methods=['DELETE'])
 def delete_pet(id):
     """
     Delete a pet type.
@@ -494,51 +830,54 @@ def delete_pet(id):
     except ValueError:
         return jsonify({"error": "Invalid ID"}), 404
 
-    pet = pet_types_col.find_one({"id": type_id})
-    if not pet:
+    result = repo.delete_type_if_empty(type_id)
+    if result == "not_found":
         return jsonify({"error": "Not found"}), 404
     
-    if pet.get("pets") and len(pet["pets"]) > 0:
+    if result == "has_pets":
         return jsonify({"error": "Still has pets"}), 400
     
-    pet_types_col.delete_one({"id": type_id})
     return "", 204
 
-@app.route('/pet-types/<string:id>/pets/<string:name>', methods=['DELETE'])
+@bp.route('/pet-types/<string:id>/pets/<string:name>', methods=['DELETE'])
 def delete_pet_name(id, name):
     """
-    Delete a pet by name.
+    Delete a pet by name (any case).
     """
     try:
         type_id = int(id)
     except ValueError:
         return jsonify({"error": "Invalid ID"}), 404
 
-    if not pet_types_col.find_one({"id": type_id}):
-        return jsonify({"error": "Pet type ID not found"}), 404
-    
-    pet = pets_col.find_one({"type_id": type_id, "name": name})
+    # Delete first, the type check is only needed to pick the error message
+    pet = repo.delete_pet(type_id, name)
     if not pet:
+        if not repo.type_exists(type_id):
+            return jsonify({"error": "Pet type ID not found"}), 404
         return jsonify({"error": "Pet name not found"}), 404
     
-    if pet.get("picture") and pet.get("picture") != "NA":
-        path = os.path.join(IMAGES_DIR, pet["picture"])
-        if os.path.exists(path):
-            try:
-                os.remove(path)
-            except OSError:
-                pass
+    picture_store.delete(pet.get("picture"))
+    thumbnail_cache.invalidate(pet.get("picture"))
 
-    pets_col.delete_one({"_id": pet["_id"]})
-    
-    pet_types_col.update_one(
-        {"id": type_id},
-        {"$pull": {"pets": name}}
-    )
     return "", 204
     
     
+def create_app():
+    """
+    App factory (used by `flask run`). Nothing connects to Mongo until a request needs it.
+    """
+    app = Flask(__name__)
+    app.json = FastJSONProvider(app)
+    app.register_blueprint(bp)
+    # Opt-in (CAPTURE_FILE) request capture for replay_traffic.py
+    capture = TrafficCapture.from_env(f"pet-store{STORE_ID}")
+    if capture is not None:
+        capture.init_app(app)
+    # gzip / br / zstd for large JSON bodies, negotiated with Accept-Encoding
+    ResponseCompressor.from_env().init_app(app)
+    return app
+
 if __name__ == '__main__':
-    app.run(host="0.0.0.0", port=8000, debug=True)
+    create_app().run(host="0.0.0.0", port=8000, debug=True)
         
     
\ No newline at end of file
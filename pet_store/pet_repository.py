@@ -0,0 +1,384 @@
+import threading
+from datetime import datetime
+
+from pymongo import ASCENDING, ReturnDocument, monitoring
+from pymongo.collation import Collation, CollationStrength
+from pymongo.errors import DuplicateKeyError
+
+from read_routing import ReadRouting
+
+"""
+------------------------------------------------------------------------------------------------
+Data access layer for pet_types_store{ID} / pets_store{ID}.
+
+Every route in pet_InventoryREST.py goes through PetRepository so that the
+"check the pet-type, then touch the pet" patterns are merged into as few Mongo
+round trips as possible:
+  - reads check the pet-type and fetch its pets with one $lookup aggregation
+  - writes use find_one_and_* on the pet's (type_id, name) instead of read-then-write
+  - pet-type existence checks are served from the PetTypeCache when possible
+  - a unique, case-insensitive (type_id, name) index detects duplicate pets on
+    insert / rename, and answers the (case-insensitive) pet-by-name lookups
+  - list reads (GET /pet-types, pets listings) follow READ_PREFERENCE, every
+    other read and all writes stay on the primary (see read_routing.py)
+Picture bookkeeping (picture_storage.py) is not folded in: storing or releasing
+a picture costs 2-3 more commands per picture (blob reference, file name,
+release of the replaced blob), plus the upload itself on GridFS, so POST / PUT /
+DELETE of a pet that has a picture take more than two round trips.
+
+RoundTripCounter counts the commands each request thread sends to Mongo.
+
+PetRepository is the Mongo storage engine. The routes only use its public
+methods, memory_engine.MemoryPetRepository implements the same ones in process
+(STORAGE_ENGINE=memory).
+------------------------------------------------------------------------------------------------
+"""
+
+PET_FIELDS = {"_id": 0, "name": 1, "birthdate": 1, "picture": 1}
+
+# Pet names compare case-insensitively ("Rex" == "rex"); every pet query uses
+# this collation so that it can use the type_id_name_ci index
+NAME_COLLATION = Collation(locale="en", strength=CollationStrength.SECONDARY)
+
+PET_TYPE_INDEXES = {
+    "id": [("id", ASCENDING)],
+    "type": [("type", ASCENDING)],
+    "family_lifespan": [("family", ASCENDING), ("lifespan", ASCENDING), ("id", ASCENDING)],
+    "genus_lifespan": [("genus", ASCENDING), ("lifespan", ASCENDING), ("id", ASCENDING)],
+    "lifespan": [("lifespan", ASCENDING), ("id", ASCENDING)],
+    "attributes": [("attributes", ASCENDING)],
+}
+# Two concurrent POST /pet-types may compute the same next id, the second insert is rejected
+UNIQUE_PET_TYPE_INDEXES = {"id"}
+
+
+def pet_doc_id(type_id, name):
+    """
+    Helper function to build the Mongo _id of a pet (unique per type and name).
+    """
+    return f"{type_id}_{name}"
+
+
+def name_key(name):
+    """
+    Helper function to compare pet names like NAME_COLLATION does (for the in-memory engine).
+    """
+    return name.casefold()
+
+
+def sort_spec(sort):
+    """
+    Helper function to append the id tie-break to a sort (stable pages / ETags).
+    """
+    sort = list(sort)
+    if all(field != "id" for field, _ in sort):
+        sort.append(("id", ASCENDING))
+    return sort
+
+
+def birth_timestamp(birthdate):
+    """
+    Helper function to turn a "DD-MM-YYYY" birthdate into a timestamp (None for "NA" / invalid).
+    """
+    if not birthdate or birthdate == "NA":
+        return None
+    try:
+        return datetime.strptime(birthdate, "%d-%m-%Y").timestamp()
+    except (TypeError, ValueError):
+        return None
+
+
+class RoundTripCounter(monitoring.CommandListener):
+    """
+    Counts Mongo commands (= network round trips) per thread, and keeps
+    per-route totals so they can be reported.
+    """
+    def __init__(self):
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._routes = {}   # route -> [requests, total round trips, max round trips]
+
+    def started(self, event):
+        self._local.count = getattr(self._local, "count", 0) + 1
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+    def reset(self):
+        self._local.count = 0
+
+    def current(self):
+        return getattr(self._local, "count", 0)
+
+    def record(self, route):
+        count = self.current()
+        with self._lock:
+            totals = self._routes.setdefault(route, [0, 0, 0])
+            totals[0] += 1
+            totals[1] += count
+            totals[2] = max(totals[2], count)
+        return count
+
+    def stats(self):
+        with self._lock:
+            return {
+                route: {
+                    "requests": n,
+                    "avg_round_trips": round(total / n, 2),
+                    "max_round_trips": worst,
+                }
+                for route, (n, total, worst) in self._routes.items()
+            }
+
+
+class PetRepository:
+    def __init__(self, pet_types_col, pets_col, type_cache, routing=None):
+        self.pet_types_col = pet_types_col
+        self.pets_col = pets_col
+        self.type_cache = type_cache
+        self.routing = routing or ReadRouting()
+        # Views of the collections for the staleness-tolerant list reads
+        self.pet_types_reads = self.routing.reads(pet_types_col)
+
+    def subscribe(self, callback):
+        """
+        Call `callback()` after every (local or remote) pet-type write.
+        """
+        self.type_cache.subscribe(callback)
+
+    def ensure_indexes(self):
+        self.pets_col.create_index(
+            [("type_id", ASCENDING), ("name", ASCENDING)],
+            unique=True, name="type_id_name_ci", collation=NAME_COLLATION,
+        )
+        # Replaced by the case-insensitive index above
+        if "type_id_name" in self.pets_col.index_information():
+            self.pets_col.drop_index("type_id_name")
+        # GET /pet-types filters: equality / in-list first, then the lifespan range
+        # and the id tie-break of the sort, so filter + sort are answered by the index
+        existing = self.pet_types_col.index_information()
+        for name, keys in PET_TYPE_INDEXES.items():
+            unique = name in UNIQUE_PET_TYPE_INDEXES
+            if unique and name in existing and not existing[name].get("unique"):
+                # Created before it was unique
+                self.pet_types_col.drop_index(name)
+            self.pet_types_col.create_index(keys, name=name, unique=unique)
+
+    #---------------------PET TYPES-----------------------
+    def type_exists(self, type_id):
+        return self.type_cache.get(type_id) is not None
+
+    def find_type_slot(self, type_name):
+        """
+        Check whether a type name is taken and compute the next numeric id,
+        with point queries on the "type" and "id" indexes (the second one only
+        when the name is free). Returns (exists, next_id).
+        """
+        if self.pet_types_col.find_one({"type": type_name}, {"_id": 1}):
+            return True, None
+        last = self.pet_types_col.find_one({}, {"_id": 0, "id": 1}, sort=[("id", -1)])
+        next_id = (last["id"] + 1) if last and "id" in last else 1
+        return False, next_id
+
+    def insert_type(self, pet_type_doc):
+        """
+        Insert a new pet-type, returns False if its id was taken meanwhile (unique "id" index).
+        """
+        with self.routing.write_session() as session:
+            try:
+                self.pet_types_col.insert_one(pet_type_doc, session=session)
+            except DuplicateKeyError:
+                return False
+        self.type_cache.invalidate(pet_type_doc["id"])
+        return True
+
+    def list_types(self, query, sort=None):
+        """
+        sort: (field, ASCENDING / DESCENDING) pairs, ties are broken by id.
+        """
+        with self.routing.read_session() as session:
+            cursor = self.pet_types_reads.find(query, {"_id": 0}, session=session)
+            if sort:
+                cursor = cursor.sort(sort_spec(sort))
+            return list(cursor)
+
+    def count_types(self, query):
+        with self.routing.read_session() as session:
+            return self.pet_types_reads.count_documents(query, session=session)
+
+    def get_type(self, type_id):
+        return self.pet_types_col.find_one({"id": type_id}, {"_id": 0})
+
+    def delete_type_if_empty(self, type_id):
+        """
+        Delete a pet-type that has no pets.
+        Returns "deleted", "not_found" or "has_pets".
+        """
+        with self.routing.write_session() as session:
+            deleted = self.pet_types_col.find_one_and_delete({
+                "id": type_id,
+                "$or": [{"pets": {"$exists": False}}, {"pets": {"$size": 0}}],
+            }, projection={"_id": 1}, session=session)
+        self.type_cache.invalidate(type_id)
+        if deleted:
+            return "deleted"
+        # Only reached on the error path: tell the two failures apart
+        return "has_pets" if self.get_type(type_id) else "not_found"
+
+    #---------------------PETS-----------------------
+    def _type_with_pets(self, type_id, pet_match=None, routed=False):
+        """
+        One aggregation returning the pet-type document with its matching pets
+        under "pet_docs", or None if the pet-type does not exist.
+        routed: run it as a list read (READ_PREFERENCE) instead of on the primary.
+        """
+        lookup = {
+            "from": self.pets_col.name,
+            "localField": "id",
+            "foreignField": "type_id",
+            "pipeline": ([{"$match": pet_match}] if pet_match else []) + [{"$project": PET_FIELDS}],
+            "as": "pet_docs",
+        }
+        pipeline = [{"$match": {"id": type_id}}, {"$limit": 1}, {"$lookup": lookup}]
+        generation = self.type_cache.generation
+        if routed:
+            with self.routing.read_session() as session:
+                doc = next(self.pet_types_reads.aggregate(pipeline, collation=NAME_COLLATION, session=session), None)
+        else:
+            doc = next(self.pet_types_col.aggregate(pipeline, collation=NAME_COLLATION), None)
+        if doc is None:
+            return None
+        pet_docs = doc.pop("pet_docs")
+        # The pet-type came back anyway, keep it warm for the existence checks
+        # (not from a secondary: the existence checks must not see stale documents)
+        if not (routed and self.routing.enabled):
+            self.type_cache.put(doc, generation)
+        return pet_docs
+
+    def list_pets(self, type_id, born_after=None, born_before=None):
+        """
+        Return the pets of a pet-type, or None if the pet-type does not exist.
+        With a birthdate bound (timestamps, exclusive) pets without a valid birthdate are left out.
+        """
+        pets = self._type_with_pets(type_id, routed=True)
+        if pets is None or (born_after is None and born_before is None):
+            return pets
+        # Birthdates are "DD-MM-YYYY" strings, not comparable in Mongo: filter here
+        results = []
+        for pet in pets:
+            ts = birth_timestamp(pet.get("birthdate"))
+            if ts is None:
+                continue
+            if born_after is not None and not ts > born_after:
+                continue
+            if born_before is not None and not ts < born_before:
+                continue
+            results.append(pet)
+        return results
+
+    def find_pet(self, type_id, name):
+        """
+        Return (type_found, pet) for a pet-type id and pet name (any case).
+        """
+        pet_docs = self._type_with_pets(type_id, {"name": name})
+        if pet_docs is None:
+            return False, None
+        return True, (pet_docs[0] if pet_docs else None)
+
+    def insert_pet(self, type_id, pet):
+        """
+        Insert a new pet and register its name on the pet-type.
+        The unique _id does the duplicate check, returns False if the pet already
+        exists (or the pet-type was deleted since the caller checked it).
+        """
+        doc = dict(pet, _id=pet_doc_id(type_id, pet["name"]), type_id=type_id)
+        with self.routing.write_session() as session:
+            try:
+                self.pets_col.insert_one(doc, session=session)
+            except DuplicateKeyError:
+                return False
+            registered = self.pet_types_col.update_one({"id": type_id}, {"$push": {"pets": pet["name"]}}, session=session)
+            if registered.matched_count == 0:
+                # No pet-type any more, do not leave the pet behind
+                self.pets_col.delete_one({"_id": doc["_id"]}, session=session)
+        self.type_cache.invalidate(type_id)
+        return registered.matched_count > 0
+
+    def replace_pet(self, type_id, name, new_pet):
+        """
+        Replace the pet `name` (any case) by `new_pet`, the existence check is part of the write:
+          - same stored name: one find_one_and_update, the pet is updated in place
+          - new name (or a change of case): one multi-document transaction of
+            find_one_and_delete (the existence check), insert_one of the pet under
+            its new _id and a positional update renaming the entry in the
+            pet-type's "pets" array; the unique (type_id, name) index rejects a
+            name already taken and the whole transaction is then dropped.
+            Needs a replica set (a single node is enough).
+        Returns (status, pet before the change): status is "replaced", "not_found"
+        (no such pet, or no such pet-type) or "exists" (the new name is taken).
+        """
+        new_name = new_pet["name"]
+        if name_key(new_name) == name_key(name):
+            with self.routing.write_session() as session:
+                # No collation: only the exact stored name is updated in place
+                old = self.pets_col.find_one_and_update(
+                    {"type_id": type_id, "name": new_name},
+                    {"$set": {k: v for k, v in new_pet.items() if k != "name"}},
+                    projection=PET_FIELDS,
+                    return_document=ReturnDocument.BEFORE,
+                    session=session,
+                )
+            if old is not None:
+                return "replaced", old
+
+        def rename(session):
+            old = self.pets_col.find_one_and_delete(
+                {"type_id": type_id, "name": name}, projection=PET_FIELDS, collation=NAME_COLLATION, session=session
+            )
+            if old is None:
+                session.abort_transaction()
+                return "not_found", None
+            try:
+                self.pets_col.insert_one(
+                    dict(new_pet, _id=pet_doc_id(type_id, new_name), type_id=type_id), session=session
+                )
+            except DuplicateKeyError:
+                session.abort_transaction()
+                return "exists", old
+            renamed = self.pet_types_col.update_one(
+                {"id": type_id, "pets": old["name"]},
+                {"$set": {"pets.$": new_name}},
+                session=session,
+            )
+            if renamed.matched_count == 0:
+                # Old name was missing from the array, make sure the new one is there
+                self.pet_types_col.update_one({"id": type_id}, {"$addToSet": {"pets": new_name}}, session=session)
+            return "replaced", old
+
+        with self.routing.write_session() as session:
+            if session is not None:
+                result = session.with_transaction(rename)
+            else:
+                with self.pets_col.database.client.start_session() as session:
+                    result = session.with_transaction(rename)
+        if result[0] == "replaced":
+            self.type_cache.invalidate(type_id)
+        return result
+
+    def delete_pet(self, type_id, name):
+        """
+        Delete a pet (name in any case) and remove its name from the pet-type.
+        Returns the deleted pet, or None if it did not exist.
+        """
+        with self.routing.write_session() as session:
+            pet = self.pets_col.find_one_and_delete(
+                {"type_id": type_id, "name": name}, projection=PET_FIELDS, collation=NAME_COLLATION, session=session
+            )
+            if pet is None:
+                return None
+            self.pet_types_col.update_one({"id": type_id}, {"$pull": {"pets": pet["name"]}}, session=session)
+        self.type_cache.invalidate(type_id)
+        return pet
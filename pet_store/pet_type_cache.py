@@ -0,0 +1,218 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+from pymongo.errors import OperationFailure, PyMongoError
+
+"""
+------------------------------------------------------------------------------------------------
+Read-through LRU cache of pet-type documents, keyed by the numeric pet-type "id".
+
+- Entries are loaded from Mongo on a miss and evicted least-recently-used once
+  `max_entries` is reached.
+- This process invalidates entries itself after every write to pet_types_store{ID}.
+- Other processes / replicas serving the same STORE_ID are picked up through a
+  Mongo change stream on the collection (needs a replica set, a single node is enough).
+- If change streams are unavailable, entries still expire after `ttl` seconds.
+- Subscribers (e.g. caches of serialized /pet-types responses) are notified of
+  every local or remote write to the collection. A remote write's clusterTime is
+  passed to `observe` first, so reads routed to secondaries wait for it
+  (ReadRouting.observe) before a subscriber refills its cache.
+------------------------------------------------------------------------------------------------
+"""
+
+log = logging.getLogger(__name__)
+
+# Server error code returned by watch() on a standalone mongod
+NOT_A_REPLICA_SET = 40573
+
+
+class PetTypeCache:
+    def __init__(self, collection, max_entries=256, ttl=30.0, observe=None):
+        self.collection = collection
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.observe = observe
+
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()   # type_id -> (expires_at, doc)
+        self._ids_by_oid = {}           # Mongo _id -> type_id (change events only carry _id)
+        self._generation = 0            # bumped by every invalidation
+
+        self._hits = 0
+        self._misses = 0
+        self._expired = 0
+        self._evictions = 0
+        self._invalidations = 0
+
+        self._listeners = []
+        self._watcher = None
+        self._watch_state = "disabled"
+
+    #---------------------READS-----------------------
+    @property
+    def generation(self):
+        """
+        Read before reading a document from Mongo, pass to put() so a document
+        read while an invalidation happened is never cached.
+        """
+        with self._lock:
+            return self._generation
+
+    def get(self, type_id):
+        """
+        Return the pet-type document with this id, or None if it does not exist.
+        Missing types are not cached so a type created elsewhere is visible immediately.
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(type_id)
+            if entry is not None:
+                expires_at, doc = entry
+                if expires_at > now:
+                    self._entries.move_to_end(type_id)
+                    self._hits += 1
+                    return doc
+                self._drop(type_id)
+                self._expired += 1
+            self._misses += 1
+            generation = self._generation
+
+        doc = self.collection.find_one({"id": type_id})
+        if doc is not None:
+            self.put(doc, generation)
+        return doc
+
+    def put(self, doc, generation):
+        """
+        Insert / refresh a document that was just read from Mongo.
+        Skipped if anything was invalidated since `generation` was taken.
+        """
+        type_id = doc.get("id")
+        if type_id is None:
+            return
+        with self._lock:
+            if generation != self._generation:
+                return
+            self._drop(type_id)
+            self._entries[type_id] = (time.monotonic() + self.ttl, doc)
+            if "_id" in doc:
+                self._ids_by_oid[doc["_id"]] = type_id
+            while len(self._entries) > self.max_entries:
+                oldest = next(iter(self._entries))
+                self._drop(oldest)
+                self._evictions += 1
+
+    #---------------------INVALIDATION-----------------------
+    def subscribe(self, callback):
+        """
+        Call `callback()` after every write to the collection seen by this cache.
+        """
+        self._listeners.append(callback)
+
+    def _notify(self):
+        for callback in self._listeners:
+            callback()
+
+    def invalidate(self, type_id):
+        """
+        Forget a single pet-type. Called after every local write to that type.
+        """
+        with self._lock:
+            self._generation += 1
+            if self._drop(type_id):
+                self._invalidations += 1
+        self._notify()
+
+    def invalidate_oid(self, oid):
+        """
+        Forget the pet-type with this Mongo _id (used by the change stream).
+        """
+        with self._lock:
+            self._generation += 1
+            type_id = self._ids_by_oid.get(oid)
+            if type_id is not None and self._drop(type_id):
+                self._invalidations += 1
+        self._notify()
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._invalidations += len(self._entries)
+            self._entries.clear()
+            self._ids_by_oid.clear()
+        self._notify()
+
+    def _drop(self, type_id):
+        # Caller must hold self._lock
+        entry = self._entries.pop(type_id, None)
+        if entry is None:
+            return False
+        oid = entry[1].get("_id")
+        if oid is not None:
+            self._ids_by_oid.pop(oid, None)
+        return True
+
+    #---------------------CHANGE STREAM-----------------------
+    def start_watcher(self, retry_delay=2.0):
+        """
+        Start a daemon thread that follows the collection's change stream and
+        invalidates entries written by other processes.
+        """
+        if self._watcher is not None:
+            return
+        self._watcher = threading.Thread(
+            target=self._watch, args=(retry_delay,), name="pet-type-cache-watcher", daemon=True
+        )
+        self._watcher.start()
+
+    def _watch(self, retry_delay):
+        resume_token = None
+        while True:
+            try:
+                with self.collection.watch(resume_after=resume_token) as stream:
+                    self._watch_state = "running"
+                    for change in stream:
+                        resume_token = stream.resume_token
+                        if self.observe is not None:
+                            self.observe(change.get("clusterTime"))
+                        op = change.get("operationType")
+                        if op in ("drop", "rename", "dropDatabase", "invalidate"):
+                            self.clear()
+                            resume_token = None
+                            break
+                        key = (change.get("documentKey") or {}).get("_id")
+                        if key is not None:
+                            self.invalidate_oid(key)
+            except OperationFailure as e:
+                if e.code == NOT_A_REPLICA_SET:
+                    # Standalone mongod: rely on the TTL only
+                    log.warning("pet-type cache: change streams unavailable, using TTL only (%s)", e)
+                    self._watch_state = "unsupported"
+                    return
+                log.warning("pet-type cache: change stream failed: %s", e)
+                resume_token = None
+            except PyMongoError as e:
+                log.warning("pet-type cache: change stream interrupted: %s", e)
+            # Anything may have changed while we were not listening
+            self._watch_state = "reconnecting"
+            self.clear()
+            time.sleep(retry_delay)
+
+    #---------------------STATS-----------------------
+    def stats(self):
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "size": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl": self.ttl,
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_rate": round(self._hits / lookups, 4) if lookups else None,
+                "expired": self._expired,
+                "evictions": self._evictions,
+                "invalidations": self._invalidations,
+                "watcher": self._watch_state,
+            }
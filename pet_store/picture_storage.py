@@ -0,0 +1,315 @@
+import hashlib
+import os
+import tempfile
+import time
+
+import gridfs
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+"""
+------------------------------------------------------------------------------------------------
+Picture storage for the pet-store.
+
+Pictures keep their public file name ("{type id}_{pet name}.jpg", the "picture"
+field of a pet) but the bytes are stored once per content hash (sha256):
+  - pictures_store{ID}       : file name -> {digest, content_type, size}
+  - picture_blobs_store{ID}  : digest    -> {refs} number of file names using the blob
+A blob is removed from the backend when its last file name is released. Its
+counter is kept, marked "deleting", until the bytes are gone: a commit that
+takes a new reference meanwhile waits for the deletion, then stores them again.
+
+Pictures saved before the deduplication (IMAGES_DIR/{file name}, no
+pictures_store{ID} entry) are moved into the store the first time they are
+looked up, and removed when their pet is.
+
+Backends (PICTURE_BACKEND):
+  - "local"  : files under IMAGES_DIR, only visible to this container
+  - "gridfs" : GridFS bucket picture_data_store{ID}, shared by every replica of a STORE_ID
+All reads and writes go through CHUNK_SIZE chunks, pictures are never held in memory.
+------------------------------------------------------------------------------------------------
+"""
+
+CHUNK_SIZE = 256 * 1024
+# Staged downloads smaller than this stay in memory
+SPOOL_SIZE = 1024 * 1024
+# State of a blob whose bytes are being removed from the backend
+DELETING = "deleting"
+# How long a commit waits for such a removal before taking it over
+DELETE_WAIT_SECONDS = 5.0
+
+
+class LocalDiskBackend:
+    def __init__(self, root):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+
+    def _path(self, digest):
+        return os.path.join(self.root, digest[:2], digest)
+
+    def exists(self, digest):
+        return os.path.exists(self._path(digest))
+
+    def put(self, digest, source):
+        path = self._path(digest)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write next to the final path then rename, readers never see half a file
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+        try:
+            with os.fdopen(fd, "wb") as f:
+                while chunk := source.read(CHUNK_SIZE):
+                    f.write(chunk)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def open(self, digest):
+        try:
+            f = open(self._path(digest), "rb")
+        except FileNotFoundError:
+            return None
+
+        def chunks():
+            with f:
+                while chunk := f.read(CHUNK_SIZE):
+                    yield chunk
+        return chunks()
+
+    def delete(self, digest):
+        try:
+            os.remove(self._path(digest))
+        except FileNotFoundError:
+            pass
+
+    def clear(self):
+        """
+        Remove every stored blob. Only the <xx>/<digest> layout written by put()
+        is touched, anything else under the root is left alone.
+        """
+        for prefix in os.listdir(self.root):
+            folder = os.path.join(self.root, prefix)
+            if len(prefix) != 2 or not os.path.isdir(folder):
+                continue
+            for name in os.listdir(folder):
+                if name.startswith(prefix):
+                    os.remove(os.path.join(folder, name))
+            if not os.listdir(folder):
+                os.rmdir(folder)
+
+
+class GridFSBackend:
+    def __init__(self, db, bucket_name):
+        self.bucket = gridfs.GridFSBucket(db, bucket_name=bucket_name, chunk_size_bytes=CHUNK_SIZE)
+        self.files_col = db[f"{bucket_name}.files"]
+        self.chunks_col = db[f"{bucket_name}.chunks"]
+
+    def exists(self, digest):
+        return self.files_col.find_one({"_id": digest}, {"_id": 1}) is not None
+
+    def put(self, digest, source):
+        try:
+            self.bucket.upload_from_stream_with_id(digest, digest, source)
+        except (DuplicateKeyError, gridfs.errors.FileExists):
+            pass  # Uploaded concurrently by another request / replica, same bytes
+
+    def open(self, digest):
+        try:
+            grid_out = self.bucket.open_download_stream(digest)
+        except gridfs.errors.NoFile:
+            return None
+
+        def chunks():
+            with grid_out:
+                while chunk := grid_out.readchunk():
+                    yield chunk
+        return chunks()
+
+    def delete(self, digest):
+        try:
+            self.bucket.delete(digest)
+        except gridfs.errors.NoFile:
+            pass
+
+    def clear(self):
+        """
+        Remove every stored blob (drops the bucket's files and chunks collections).
+        """
+        self.files_col.drop()
+        self.chunks_col.drop()
+
+
+class StagedPicture:
+    """
+    A downloaded picture, hashed while it was streamed to a temporary file.
+    """
+    def __init__(self, chunks, content_type=None):
+        self.content_type = content_type or "image/jpeg"
+        self.file = tempfile.SpooledTemporaryFile(max_size=SPOOL_SIZE)
+        sha = hashlib.sha256()
+        self.size = 0
+        for chunk in chunks:
+            if chunk:
+                sha.update(chunk)
+                self.file.write(chunk)
+                self.size += len(chunk)
+        self.digest = sha.hexdigest()
+        self.file.seek(0)
+
+    def close(self):
+        self.file.close()
+
+
+class PictureStore:
+    def __init__(self, backend, names_col, blobs_col, legacy_dir=None):
+        self.backend = backend
+        self.names_col = names_col
+        self.blobs_col = blobs_col
+        self.legacy_dir = legacy_dir
+
+    def stage(self, chunks, content_type=None):
+        return StagedPicture(chunks, content_type)
+
+    def commit(self, filename, staged):
+        """
+        Store a staged picture under a file name, replacing what that name pointed to.
+        """
+        self._take(staged)
+        previous = self.names_col.find_one_and_update(
+            {"_id": filename},
+            {"$set": {"digest": staged.digest, "content_type": staged.content_type, "size": staged.size}},
+            upsert=True,
+            return_document=ReturnDocument.BEFORE,
+        )
+        if previous:
+            self._release(previous["digest"])
+        else:
+            self._remove_legacy(filename)
+
+    def delete(self, filename):
+        if not filename or filename == "NA":
+            return
+        entry = self.names_col.find_one_and_delete({"_id": filename})
+        if entry:
+            self._release(entry["digest"])
+        else:
+            self._remove_legacy(filename)
+
+    def lookup(self, filename):
+        """
+        Return {digest, content_type, size} for a file name, or None.
+        """
+        entry = self.names_col.find_one({"_id": filename})
+        if entry is None:
+            entry = self._adopt_legacy(filename)
+        return entry
+
+    def open(self, filename):
+        """
+        Return (chunk iterator, content type, size) for a file name, or None.
+        """
+        entry = self.lookup(filename)
+        if not entry:
+            return None
+        chunks = self.backend.open(entry["digest"])
+        if chunks is None:
+            return None
+        return chunks, entry.get("content_type", "image/jpeg"), entry.get("size")
+
+    def _take(self, staged):
+        """
+        Take a reference on the staged picture's blob, storing the bytes if they are missing.
+        """
+        # Take the reference first so a concurrent release cannot drop the blob
+        blob = self.blobs_col.find_one_and_update(
+            {"_id": staged.digest}, {"$inc": {"refs": 1}}, upsert=True, return_document=ReturnDocument.AFTER
+        )
+        if blob.get("state") == DELETING:
+            # Its last release is removing the bytes, store them again once it is done
+            self._wait_deleted(staged.digest)
+        if not self.backend.exists(staged.digest):
+            staged.file.seek(0)
+            self.backend.put(staged.digest, staged.file)
+
+    def _wait_deleted(self, digest):
+        deadline = time.monotonic() + DELETE_WAIT_SECONDS
+        while time.monotonic() < deadline:
+            if self.blobs_col.find_one({"_id": digest, "state": DELETING}, {"_id": 1}) is None:
+                return
+            time.sleep(0.05)
+        # The releasing request died half way, its deletion is over either way
+        self.blobs_col.update_one({"_id": digest, "state": DELETING}, {"$unset": {"state": ""}})
+
+    def _release(self, digest):
+        blob = self.blobs_col.find_one_and_update(
+            {"_id": digest}, {"$inc": {"refs": -1}}, return_document=ReturnDocument.AFTER
+        )
+        if not blob or blob["refs"] > 0:
+            return
+        # Only the request that marks the blob deletes the bytes
+        marked = self.blobs_col.update_one(
+            {"_id": digest, "refs": {"$lte": 0}, "state": {"$exists": False}}, {"$set": {"state": DELETING}}
+        )
+        if not marked.modified_count:
+            return
+        self.backend.delete(digest)
+        if not self.blobs_col.delete_one({"_id": digest, "refs": {"$lte": 0}}).deleted_count:
+            # Referenced again meanwhile: that commit is waiting to store the bytes again
+            self.blobs_col.update_one({"_id": digest}, {"$unset": {"state": ""}})
+
+    #---------------------LEGACY PICTURES-----------------------
+    def _legacy_path(self, filename):
+        if not self.legacy_dir or not filename or os.path.basename(filename) != filename or filename.startswith("."):
+            return None
+        path = os.path.join(self.legacy_dir, filename)
+        return path if os.path.isfile(path) else None
+
+    def _adopt_legacy(self, filename):
+        """
+        Move a picture saved before the deduplication into the store, returns its entry or None.
+        """
+        path = self._legacy_path(filename)
+        if path is None:
+            return None
+        try:
+            with open(path, "rb") as f:
+                staged = self.stage(iter(lambda: f.read(CHUNK_SIZE), b""))
+        except FileNotFoundError:
+            # Adopted concurrently
+            return self.names_col.find_one({"_id": filename})
+        try:
+            self._take(staged)
+            try:
+                self.names_col.insert_one({
+                    "_id": filename, "digest": staged.digest,
+                    "content_type": staged.content_type, "size": staged.size,
+                })
+            except DuplicateKeyError:
+                # Adopted (or replaced) concurrently, that entry wins
+                self._release(staged.digest)
+        finally:
+            staged.close()
+        self._remove_legacy(filename)
+        return self.names_col.find_one({"_id": filename})
+
+    def _remove_legacy(self, filename):
+        path = self._legacy_path(filename)
+        if path is not None:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+
+def picture_store_from_env(db, store_id, images_dir):
+    backend_name = os.environ.get("PICTURE_BACKEND", "local")
+    if backend_name == "gridfs":
+        backend = GridFSBackend(db, f"picture_data_store{store_id}")
+    elif backend_name == "local":
+        backend = LocalDiskBackend(images_dir)
+    else:
+        raise ValueError(f"Unknown PICTURE_BACKEND {backend_name!r}")
+    return PictureStore(
+        backend, db[f"pictures_store{store_id}"], db[f"picture_blobs_store{store_id}"], legacy_dir=images_dir
+    )
@@ -0,0 +1,140 @@
+import os
+import threading
+from contextlib import contextmanager
+
+from pymongo.read_preferences import Nearest, Primary, PrimaryPreferred, Secondary, SecondaryPreferred
+
+"""
+------------------------------------------------------------------------------------------------
+Read-preference routing for replica-set deployments.
+
+READ_PREFERENCE picks where the heavy, staleness-tolerant reads go (list and
+report queries, through reads(collection)): primary (default, nothing changes),
+primaryPreferred, secondary, secondaryPreferred or nearest. READ_MAX_STALENESS
+(seconds, at least 90; -1 for no bound) keeps secondaries that lag further
+behind out of the selection. Writes and read-your-write checks keep using the
+plain collections, on the primary.
+
+Routed reads run in causally consistent sessions sent with the newest operation
+time this process knows of (afterClusterTime), the secondary waits until it has
+caught up. That time advances with this process's own writes and with the
+changes it is told about through observe() (the clusterTime of the change events
+a pet-store follows). A response cache dropped on one of those is therefore never
+refilled with an older answer. Writes of other processes that this one is not
+told about (e.g. other pet-order replicas) may be read stale, for as long as a
+secondary lags. With READ_PREFERENCE=primary no session is opened.
+------------------------------------------------------------------------------------------------
+"""
+
+READ_PREFERENCES = {
+    "primary": Primary,
+    "primaryPreferred": PrimaryPreferred,
+    "secondary": Secondary,
+    "secondaryPreferred": SecondaryPreferred,
+    "nearest": Nearest,
+}
+# Smallest maxStalenessSeconds accepted by the drivers / servers
+MIN_MAX_STALENESS = 90
+
+
+class ReadRouting:
+    def __init__(self, client=None, mode="primary", max_staleness=-1):
+        if mode not in READ_PREFERENCES:
+            raise ValueError(f"Unknown READ_PREFERENCE {mode!r}, expected one of {', '.join(READ_PREFERENCES)}")
+        if max_staleness != -1 and (mode == "primary" or max_staleness < MIN_MAX_STALENESS):
+            raise ValueError(f"READ_MAX_STALENESS must be -1 or at least {MIN_MAX_STALENESS}, and needs a non-primary READ_PREFERENCE")
+        self.client = client
+        self.mode = mode
+        self.max_staleness = max_staleness
+        self.read_preference = Primary() if mode == "primary" else READ_PREFERENCES[mode](max_staleness=max_staleness)
+
+        self._lock = threading.Lock()
+        self._operation_time = None     # newest write of this process or observed change (bson Timestamp)
+        self._cluster_time = None
+        self._routed_reads = 0
+        self._causal_writes = 0
+        self._observed_changes = 0
+
+    @classmethod
+    def from_env(cls, client):
+        return cls(
+            client,
+            mode=os.environ.get("READ_PREFERENCE", "primary"),
+            max_staleness=int(os.environ.get("READ_MAX_STALENESS", "-1")),
+        )
+
+    @property
+    def enabled(self):
+        return self.client is not None and self.mode != "primary"
+
+    def reads(self, collection):
+        """
+        The collection as seen by routed reads.
+        """
+        if not self.enabled:
+            return collection
+        return collection.with_options(read_preference=self.read_preference)
+
+    @contextmanager
+    def write_session(self):
+        """
+        Session for a write (None when routing is off); its operation time is remembered.
+        """
+        if not self.enabled:
+            yield None
+            return
+        with self.client.start_session(causal_consistency=True) as session:
+            yield session
+            self._remember(session)
+
+    @contextmanager
+    def read_session(self):
+        """
+        Session for a routed read (None when routing is off), after the newest write / change known.
+        """
+        if not self.enabled:
+            yield None
+            return
+        with self.client.start_session(causal_consistency=True) as session:
+            self._catch_up(session)
+            yield session
+
+    def observe(self, cluster_time):
+        """
+        A change made elsewhere (the clusterTime of a change event): routed reads wait for it too.
+        Call it before dropping what the change invalidates.
+        """
+        if cluster_time is None:
+            return
+        with self._lock:
+            self._observed_changes += 1
+            if self._operation_time is None or cluster_time > self._operation_time:
+                self._operation_time = cluster_time
+
+    def _remember(self, session):
+        with self._lock:
+            self._causal_writes += 1
+            if session.operation_time is not None and (
+                    self._operation_time is None or session.operation_time > self._operation_time):
+                self._operation_time = session.operation_time
+                self._cluster_time = session.cluster_time
+
+    def _catch_up(self, session):
+        with self._lock:
+            self._routed_reads += 1
+            operation_time, cluster_time = self._operation_time, self._cluster_time
+        if cluster_time is not None:
+            session.advance_cluster_time(cluster_time)
+        if operation_time is not None:
+            session.advance_operation_time(operation_time)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "read_preference": self.mode,
+                "max_staleness": self.max_staleness,
+                "routed_reads": self._routed_reads,
+                "causal_writes": self._causal_writes,
+                "observed_changes": self._observed_changes,
+                "reads_after": str(self._operation_time) if self._operation_time is not None else None,
+            }
@@ -0,0 +1,167 @@
+import argparse
+import os
+import sys
+import tarfile
+import tempfile
+
+from bson import json_util
+from pymongo import MongoClient
+
+from pet_repository import PetRepository
+from picture_storage import picture_store_from_env
+
+"""
+------------------------------------------------------------------------------------------------
+Snapshot export / restore of one pet-store (STORE_ID).
+
+A snapshot is a .tar.gz holding, in this order:
+  pet_types.ndjson, pets.ndjson, pictures.ndjson, picture_blobs.ndjson
+      one document per line (MongoDB extended JSON, so _id types survive)
+  blobs/<sha256>
+      picture bytes, read from / written to the configured PICTURE_BACKEND
+
+Export streams cursors and blobs through temporary files, restore reads the
+archive as a stream and bulk-loads with insert_many in chunks, then builds the
+indexes. Memory use does not depend on the size of the store.
+
+  python snapshot.py export --store-id 1 --out store1.tar.gz
+  python snapshot.py restore --store-id 2 --archive store1.tar.gz --drop
+(MONGO_URI, PICTURE_BACKEND and IMAGES_DIR are read like the service does.)
+--drop replaces the store's collections and its picture blobs (the GridFS bucket
+picture_data_store{ID}, or the blob files under IMAGES_DIR).
+------------------------------------------------------------------------------------------------
+"""
+
+COLLECTIONS = ["pet_types", "pets", "pictures", "picture_blobs"]
+CHUNK_SIZE = 256 * 1024
+
+
+def collection_name(kind, store_id):
+    return f"{kind}_store{store_id}"
+
+
+def add_stream(tar, name, write):
+    """
+    Helper function to add a member whose size is unknown up front:
+    `write(f)` fills a temporary file that is then copied into the archive.
+    """
+    with tempfile.TemporaryFile() as tmp:
+        write(tmp)
+        info = tarfile.TarInfo(name)
+        info.size = tmp.tell()
+        tmp.seek(0)
+        tar.addfile(info, tmp)
+
+
+def export_store(db, store_id, out, picture_store, batch_size=1000):
+    with tarfile.open(out, "w:gz") as tar:
+        for kind in COLLECTIONS:
+            col = db[collection_name(kind, store_id)]
+
+            def write_docs(f, col=col):
+                for doc in col.find(batch_size=batch_size):
+                    f.write(json_util.dumps(doc, json_options=json_util.CANONICAL_JSON_OPTIONS).encode("utf-8"))
+                    f.write(b"\n")
+            add_stream(tar, f"{kind}.ndjson", write_docs)
+            print(f"Exported {col.name}")
+
+        blobs = 0
+        for blob in db[collection_name("picture_blobs", store_id)].find({}, {"_id": 1}, batch_size=batch_size):
+            chunks = picture_store.backend.open(blob["_id"])
+            if chunks is None:
+                print(f"Missing picture blob {blob['_id']}, skipped")
+                continue
+
+            def write_blob(f, chunks=chunks):
+                for chunk in chunks:
+                    f.write(chunk)
+            add_stream(tar, f"blobs/{blob['_id']}", write_blob)
+            blobs += 1
+        print(f"Exported {blobs} picture blobs")
+
+
+class _Reader:
+    """
+    Adapts a tar member to the read(size) interface the picture backends expect.
+    """
+    def __init__(self, f):
+        self.f = f
+
+    def read(self, size=CHUNK_SIZE):
+        return self.f.read(size)
+
+
+def restore_store(db, store_id, archive, picture_store, chunk_size=1000, drop=False):
+    if drop:
+        for kind in COLLECTIONS:
+            db.drop_collection(collection_name(kind, store_id))
+        # The blobs the dropped picture_blobs documents referenced would otherwise be orphaned
+        picture_store.backend.clear()
+    else:
+        for kind in COLLECTIONS:
+            if db[collection_name(kind, store_id)].estimated_document_count():
+                raise SystemExit(f"{collection_name(kind, store_id)} is not empty, use --drop to replace it")
+
+    blobs = 0
+    # "r|gz": sequential stream, members are never held in memory
+    with tarfile.open(archive, "r|gz") as tar:
+        for member in tar:
+            if not member.isfile():
+                continue
+            f = tar.extractfile(member)
+            if member.name.endswith(".ndjson"):
+                kind = member.name[: -len(".ndjson")]
+                if kind not in COLLECTIONS:
+                    continue
+                col = db[collection_name(kind, store_id)]
+                total, batch = 0, []
+                for line in f:
+                    if line.strip():
+                        batch.append(json_util.loads(line))
+                    if len(batch) >= chunk_size:
+                        col.insert_many(batch, ordered=False)
+                        total += len(batch)
+                        batch = []
+                if batch:
+                    col.insert_many(batch, ordered=False)
+                    total += len(batch)
+                print(f"Restored {total} documents into {col.name}")
+            elif member.name.startswith("blobs/"):
+                digest = member.name[len("blobs/"):]
+                picture_store.backend.put(digest, _Reader(f))
+                blobs += 1
+    print(f"Restored {blobs} picture blobs")
+
+    # Indexes are built once, after the bulk load
+    PetRepository(db[collection_name("pet_types", store_id)], db[collection_name("pets", store_id)], None).ensure_indexes()
+    print("Rebuilt indexes")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export / restore a pet-store snapshot")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    export = sub.add_parser("export")
+    export.add_argument("--store-id", default=os.environ.get("STORE_ID", "1"))
+    export.add_argument("--out", required=True)
+
+    restore = sub.add_parser("restore")
+    restore.add_argument("--store-id", default=os.environ.get("STORE_ID", "1"))
+    restore.add_argument("--archive", required=True)
+    restore.add_argument("--chunk-size", type=int, default=1000)
+    restore.add_argument("--drop", action="store_true", help="replace the store's current data")
+
+    args = parser.parse_args(argv)
+    client = MongoClient(os.environ.get("MONGO_URI", "mongodb://localhost:27017"))
+    db = client.petstore
+    picture_store = picture_store_from_env(db, args.store_id, os.environ.get("IMAGES_DIR", "pet_images"))
+
+    if args.command == "export":
+        export_store(db, args.store_id, args.out, picture_store)
+    else:
+        restore_store(db, args.store_id, args.archive, picture_store, args.chunk_size, args.drop)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
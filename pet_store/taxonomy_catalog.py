@@ -0,0 +1,159 @@
+import argparse
+import difflib
+import json
+import os
+import re
+import sys
+import threading
+
+import requests
+
+"""
+------------------------------------------------------------------------------------------------
+Local catalog of animal records, in the API-Ninjas /v1/animals format:
+{"name": ..., "taxonomy": {"family": ..., "genus": ...}, "characteristics": {...}, ...}
+
+The snapshot is a JSON array or NDJSON file (one record per line). Records are
+indexed by normalized name (case / whitespace insensitive); an optional fuzzy
+fallback picks the closest known name. add_pet_type resolves types here first
+and only calls the API for names the catalog does not know.
+
+CLI (needs NINJA_API_KEY):
+  python taxonomy_catalog.py build "Golden Retriever" Abyssinian --out catalog.ndjson
+  python taxonomy_catalog.py build --names-file names.txt --out catalog.ndjson --merge
+  python taxonomy_catalog.py refresh --out catalog.ndjson
+------------------------------------------------------------------------------------------------
+"""
+
+API_URL = "https://api.api-ninjas.com/v1/animals"
+
+
+def normalize_name(name):
+    """
+    Helper function to build the index key of an animal name.
+    """
+    return re.sub(r"\s+", " ", (name or "").strip().lower())
+
+
+class TaxonomyCatalog:
+    def __init__(self, records=(), fuzzy_cutoff=None):
+        """
+        fuzzy_cutoff: similarity ratio (0-1) for the fuzzy fallback, None disables it.
+        """
+        self.fuzzy_cutoff = fuzzy_cutoff
+        self._lock = threading.Lock()
+        self._by_name = {}
+        self.add_many(records)
+
+    @classmethod
+    def load(cls, path, fuzzy_cutoff=None):
+        return cls(read_snapshot(path), fuzzy_cutoff=fuzzy_cutoff)
+
+    def add_many(self, records):
+        """
+        Index records, the first record of a given name wins (like the API's result order).
+        """
+        with self._lock:
+            for record in records:
+                key = normalize_name(record.get("name"))
+                if key and key not in self._by_name:
+                    self._by_name[key] = record
+
+    def lookup(self, name, fuzzy=True):
+        key = normalize_name(name)
+        with self._lock:
+            record = self._by_name.get(key)
+            if record is not None or not fuzzy or self.fuzzy_cutoff is None:
+                return record
+            match = difflib.get_close_matches(key, self._by_name.keys(), n=1, cutoff=self.fuzzy_cutoff)
+            return self._by_name[match[0]] if match else None
+
+    def records(self):
+        with self._lock:
+            return list(self._by_name.values())
+
+    def __len__(self):
+        return len(self._by_name)
+
+
+def read_snapshot(path):
+    """
+    Helper function to read a JSON array or NDJSON snapshot.
+    """
+    with open(path, encoding="utf-8") as f:
+        text = f.read()
+    if text.lstrip().startswith("["):
+        return json.loads(text)
+    return [json.loads(line) for line in text.splitlines() if line.strip()]
+
+
+def write_snapshot(path, records):
+    """
+    Helper function to write records as NDJSON (atomically replaces the file).
+    """
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        for record in sorted(records, key=lambda r: normalize_name(r.get("name"))):
+            f.write(json.dumps(record, ensure_ascii=False, sort_keys=True) + "\n")
+    os.replace(tmp_path, path)
+
+
+def fetch_animals(name, api_key, timeout=10):
+    """
+    Helper function to query API-Ninjas for a name (returns every partial match).
+    """
+    r = requests.get(API_URL, params={"name": name}, headers={"X-Api-Key": api_key}, timeout=timeout)
+    r.raise_for_status()
+    return r.json()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build or refresh the local taxonomy catalog snapshot")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    build = sub.add_parser("build", help="fetch the given names from API-Ninjas")
+    build.add_argument("names", nargs="*")
+    build.add_argument("--names-file", help="file with one name per line")
+    build.add_argument("--out", required=True)
+    build.add_argument("--merge", action="store_true", help="keep the records already in --out")
+
+    refresh = sub.add_parser("refresh", help="re-fetch every record of an existing snapshot")
+    refresh.add_argument("--out", required=True)
+
+    args = parser.parse_args(argv)
+    api_key = os.environ.get("NINJA_API_KEY")
+    if not api_key:
+        print("NINJA_API_KEY is not set")
+        return 1
+
+    existing = read_snapshot(args.out) if os.path.exists(args.out) else []
+    if args.command == "build":
+        names = list(args.names)
+        if args.names_file:
+            with open(args.names_file, encoding="utf-8") as f:
+                names += [line.strip() for line in f if line.strip()]
+        keep = existing if args.merge else []
+    else:
+        names = [record["name"] for record in existing]
+        keep = []
+
+    # Freshly fetched records take precedence over the kept ones
+    fetched = []
+    for name in names:
+        try:
+            animals = fetch_animals(name, api_key)
+        except requests.exceptions.RequestException as e:
+            print(f"Could not fetch {name}: {e}")
+            return 1
+        print(f"{name}: {len(animals)} record(s)")
+        fetched += animals
+
+    catalog = TaxonomyCatalog(fetched)
+    catalog.add_many(keep)
+    write_snapshot(args.out, catalog.records())
+    print(f"Wrote {len(catalog)} records to {args.out}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
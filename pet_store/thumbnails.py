@@ -0,0 +1,321 @@
+import hashlib
+import io
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:
+    Image = None
+
+"""
+------------------------------------------------------------------------------------------------
+Resized variants of the stored pictures (GET /pictures/<filename>?w=&h= or ?size=).
+
+- A variant fits inside the requested box and keeps the aspect ratio, pictures
+  are never enlarged. Named sizes are shortcuts for a box (NAMED_SIZES).
+- Variants are generated on first request and kept on disk, keyed by file name,
+  content digest and box, so a replaced picture never serves an old variant.
+- The total size of the variants stays under `max_bytes`, least recently used
+  variants are evicted first. invalidate(filename) drops the variants of a
+  picture when update_pet / delete_pet_name replace or remove it.
+- Concurrent requests for the same variant collapse into one generation.
+- The directory may be shared (other workers, earlier runs): variants found there
+  at start are adopted, oldest first. Only files named like variants are ever removed.
+Needs Pillow; without it `available` is False and the route answers 501.
+------------------------------------------------------------------------------------------------
+"""
+
+CHUNK_SIZE = 256 * 1024
+MAX_DIMENSION = 2048
+NAMED_SIZES = {
+    "thumb": (128, 128),
+    "small": (320, 320),
+    "medium": (640, 640),
+    "large": (1280, 1280),
+}
+# Variant files are named by the sha256 of their key, with a ".json" sidecar holding the key
+VARIANT_NAME = re.compile(r"[0-9a-f]{64}")
+# Temporary files older than this are leftovers of a crashed process
+STALE_PART_SECONDS = 3600
+
+
+class NotAnImage(Exception):
+    """ Raised when the stored picture cannot be decoded. """
+
+
+def parse_box(size=None, w=None, h=None):
+    """
+    Helper function to turn the query parameters into a (width, height) box.
+    Returns None when no resize is asked for, raises ValueError on bad values.
+    """
+    if size is not None:
+        if w is not None or h is not None:
+            raise ValueError("Use either size or w / h")
+        if size not in NAMED_SIZES:
+            raise ValueError(f"Unknown size, expected one of {', '.join(NAMED_SIZES)}")
+        return NAMED_SIZES[size]
+    if w is None and h is None:
+        return None
+
+    def dimension(value):
+        if value is None:
+            return MAX_DIMENSION
+        if not value.isdigit() or not 1 <= int(value) <= MAX_DIMENSION:
+            raise ValueError(f"w and h must be integers between 1 and {MAX_DIMENSION}")
+        return int(value)
+    return dimension(w), dimension(h)
+
+
+class _Entry:
+    def __init__(self, path, size, content_type):
+        self.path = path
+        self.size = size
+        self.content_type = content_type
+
+
+class _Call:
+    def __init__(self, filename):
+        self.filename = filename
+        self.done = threading.Event()
+        self.stale = False
+        self.data = None
+        self.content_type = None
+        self.error = None
+
+
+class ThumbnailCache:
+    def __init__(self, root, max_bytes=64 * 1024 * 1024, quality=85):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.quality = quality
+        os.makedirs(root, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()   # key -> _Entry, least recently used first
+        self._by_name = {}              # file name -> set of keys
+        self._inflight = {}             # key -> _Call
+        self._bytes = 0
+        self._counters = {
+            "hits": 0, "generated": 0, "coalesced": 0,
+            "evictions": 0, "invalidations": 0, "uncacheable": 0, "adopted": 0,
+        }
+        self._adopt()
+
+    def _adopt(self):
+        """
+        Index the variants already in the directory, least recently written first.
+        Their key is content addressed, so an adopted variant is never out of date.
+        """
+        found = []
+        now = time.time()
+        for name in os.listdir(self.root):
+            path = os.path.join(self.root, name)
+            try:
+                if name.endswith(".part"):
+                    if now - os.stat(path).st_mtime > STALE_PART_SECONDS:
+                        os.remove(path)
+                    continue
+                if not VARIANT_NAME.fullmatch(name):
+                    continue
+                with open(f"{path}.json", encoding="utf-8") as f:
+                    meta = json.load(f)
+                key = (meta["filename"], meta["digest"], meta["box"][0], meta["box"][1])
+                stat = os.stat(path)
+            except (OSError, ValueError, KeyError, IndexError, TypeError):
+                continue
+            found.append((stat.st_mtime, path, key, stat.st_size, meta.get("content_type")))
+
+        with self._lock:
+            for _, path, key, size, content_type in sorted(found):
+                self._add(key, _Entry(path, size, content_type))
+            self._counters["adopted"] = len(found)
+
+    @property
+    def available(self):
+        return Image is not None
+
+    def get(self, filename, digest, box, source):
+        """
+        Return (chunk iterator, content type, size) of a variant. `source` is
+        called (once per generation) for the original's chunks, None if gone.
+        Returns None when the original is gone, raises NotAnImage if it cannot be decoded.
+        """
+        key = (filename, digest, box[0], box[1])
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                try:
+                    # Opened under the lock: an eviction right after cannot pull the file away
+                    f = open(entry.path, "rb")
+                except FileNotFoundError:
+                    # Evicted by another process sharing the directory, generated again
+                    self._drop(key)
+                    self._unname(key)
+                else:
+                    self._entries.move_to_end(key)
+                    self._counters["hits"] += 1
+                    return self._read(f), entry.content_type, entry.size
+
+            call = self._inflight.get(key)
+            leader = call is None
+            if leader:
+                call = self._inflight[key] = _Call(filename)
+            else:
+                self._counters["coalesced"] += 1
+
+        if leader:
+            path = None
+            try:
+                chunks = source()
+                if chunks is not None:
+                    call.data, call.content_type = self._generate(chunks, box)
+                    path = self._write(key, call.data, call.content_type)
+            except Exception as e:
+                call.error = e
+            finally:
+                with self._lock:
+                    del self._inflight[key]
+                    if call.data is not None:
+                        self._counters["generated"] += 1
+                    if path is not None:
+                        # Not kept if the picture was replaced or removed meanwhile
+                        if call.stale:
+                            self._remove_file(path)
+                        else:
+                            self._add(key, _Entry(path, len(call.data), call.content_type))
+                call.done.set()
+        else:
+            call.done.wait()
+
+        if call.error is not None:
+            raise call.error
+        if call.data is None:
+            return None
+        return iter([call.data]), call.content_type, len(call.data)
+
+    def _generate(self, chunks, box):
+        """
+        Decode the original and encode a variant fitting in box, returns (bytes, content type).
+        """
+        with tempfile.SpooledTemporaryFile(max_size=4 * 1024 * 1024) as original:
+            for chunk in chunks:
+                original.write(chunk)
+            original.seek(0)
+            try:
+                with Image.open(original) as image:
+                    image = ImageOps.exif_transpose(image)
+                    image.thumbnail(box, Image.LANCZOS)
+                    out = io.BytesIO()
+                    # Keep transparency, everything else becomes a JPEG like the originals
+                    if image.mode in ("RGBA", "LA", "P") and (image.mode != "P" or "transparency" in image.info):
+                        image.save(out, format="PNG", optimize=True)
+                        content_type = "image/png"
+                    else:
+                        image.convert("RGB").save(out, format="JPEG", quality=self.quality, optimize=True)
+                        content_type = "image/jpeg"
+            except (OSError, SyntaxError, ValueError) as e:
+                raise NotAnImage(str(e)) from e
+        return out.getvalue(), content_type
+
+    def _write(self, key, data, content_type):
+        """
+        Write a variant to disk, returns its path or None if it is over the budget.
+        """
+        if len(data) > self.max_bytes:
+            with self._lock:
+                self._counters["uncacheable"] += 1
+            return None
+        name = hashlib.sha256("\0".join(map(str, key)).encode("utf-8")).hexdigest()
+        path = os.path.join(self.root, name)
+        # Key first: a variant on disk always has it (see _adopt)
+        meta = {"filename": key[0], "digest": key[1], "box": [key[2], key[3]], "content_type": content_type}
+        self._replace(f"{path}.json", json.dumps(meta).encode("utf-8"))
+        self._replace(path, data)
+        return path
+
+    def _replace(self, path, data):
+        fd, tmp_path = tempfile.mkstemp(dir=self.root, suffix=".part")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def _add(self, key, entry):
+        # Caller must hold self._lock
+        self._entries[key] = entry
+        self._by_name.setdefault(key[0], set()).add(key)
+        self._bytes += entry.size
+        self._evict()
+
+    def invalidate(self, filename):
+        """
+        Drop every variant of a file name (also the ones being generated).
+        """
+        if not filename or filename == "NA":
+            return
+        with self._lock:
+            for key in self._by_name.pop(filename, ()):
+                self._drop(key)
+                self._counters["invalidations"] += 1
+            for call in self._inflight.values():
+                if call.filename == filename:
+                    call.stale = True
+
+    def _drop(self, key):
+        # Caller must hold self._lock
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry.size
+            self._remove_file(entry.path)
+
+    def _evict(self):
+        # Caller must hold self._lock
+        while self._bytes > self.max_bytes and self._entries:
+            key, entry = self._entries.popitem(last=False)
+            self._bytes -= entry.size
+            self._counters["evictions"] += 1
+            self._remove_file(entry.path)
+            self._unname(key)
+
+    def _unname(self, key):
+        # Caller must hold self._lock
+        keys = self._by_name.get(key[0])
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._by_name[key[0]]
+
+    @staticmethod
+    def _read(f):
+        with f:
+            while chunk := f.read(CHUNK_SIZE):
+                yield chunk
+
+    @staticmethod
+    def _remove_file(path):
+        for name in (path, f"{path}.json"):
+            try:
+                os.remove(name)
+            except FileNotFoundError:
+                pass
+
+    def stats(self):
+        with self._lock:
+            return dict(
+                self._counters,
+                available=self.available,
+                entries=len(self._entries),
+                bytes=self._bytes,
+                max_bytes=self.max_bytes,
+            )
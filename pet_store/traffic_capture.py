@@ -0,0 +1,112 @@
+import json
+import logging
+import logging.handlers
+import os
+import random
+import time
+
+from flask import g, request
+
+"""
+------------------------------------------------------------------------------------------------
+Opt-in capture of production requests, replayed by replay_traffic.py (repo root).
+
+With CAPTURE_FILE set, a sample of the requests (CAPTURE_SAMPLE_RATE, 0-1) is
+appended to that file as NDJSON, one record per request:
+  {"ts", "service", "method", "path", "route", "query", "headers", "body",
+   "body_truncated", "status", "latency_ms"}
+The file rotates at CAPTURE_MAX_BYTES, keeping CAPTURE_BACKUPS old files
+(<file>.1 is the most recent). Only the headers a replay needs are kept
+(CAPTURE_HEADERS), bodies are cut at CAPTURE_MAX_BODY bytes, and paths
+starting with a CAPTURE_EXCLUDE prefix are never captured.
+Credentials (REDACTED_HEADERS) are never written, whatever CAPTURE_HEADERS says:
+a request that carried one is recorded with the REDACTED placeholder instead,
+which replay_traffic.py replaces with the value it is given (--owner-pc).
+------------------------------------------------------------------------------------------------
+"""
+
+DEFAULT_HEADERS = "Content-Type,X-Deadline-Ms"
+REDACTED_HEADERS = ("OwnerPC",)
+REDACTED = "<redacted>"
+DEFAULT_EXCLUDE = "/healthz,/readyz,/stats/"
+
+
+class TrafficCapture:
+    def __init__(self, path, service, sample_rate=1.0, max_bytes=50 * 1024 * 1024, backups=5,
+                 max_body=64 * 1024, headers=(), exclude=()):
+        self.service = service
+        self.sample_rate = sample_rate
+        self.max_body = max_body
+        redacted = {h.lower() for h in REDACTED_HEADERS}
+        self.headers = [h for h in headers if h.lower() not in redacted]
+        self.exclude = tuple(exclude)
+
+        # RotatingFileHandler does the locking and the rotation
+        handler = logging.handlers.RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backups, encoding="utf-8")
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        self.log = logging.getLogger(f"traffic_capture.{service}")
+        self.log.handlers = [handler]
+        self.log.setLevel(logging.INFO)
+        self.log.propagate = False
+
+    @classmethod
+    def from_env(cls, service):
+        """
+        Return a TrafficCapture configured from the environment, or None when CAPTURE_FILE is not set.
+        """
+        path = os.environ.get("CAPTURE_FILE")
+        if not path:
+            return None
+        split = lambda value: [v.strip() for v in value.split(",") if v.strip()]
+        return cls(
+            path,
+            os.environ.get("CAPTURE_SERVICE", service),
+            sample_rate=float(os.environ.get("CAPTURE_SAMPLE_RATE", "1")),
+            max_bytes=int(os.environ.get("CAPTURE_MAX_BYTES", str(50 * 1024 * 1024))),
+            backups=int(os.environ.get("CAPTURE_BACKUPS", "5")),
+            max_body=int(os.environ.get("CAPTURE_MAX_BODY", str(64 * 1024))),
+            headers=split(os.environ.get("CAPTURE_HEADERS", DEFAULT_HEADERS)),
+            exclude=split(os.environ.get("CAPTURE_EXCLUDE", DEFAULT_EXCLUDE)),
+        )
+
+    def init_app(self, app):
+        app.before_request(self.start)
+        app.after_request(self.record)
+
+    def start(self):
+        # Sampled on arrival, so unsampled requests cost one random() call
+        if request.path.startswith(self.exclude) or random.random() >= self.sample_rate:
+            return
+        g.capture_started = (time.time(), time.perf_counter())
+
+    def record(self, response):
+        started = g.pop("capture_started", None)
+        if started is None:
+            return response
+        wall_start, perf_start = started
+        latency_ms = (time.perf_counter() - perf_start) * 1000
+
+        body = request.get_data(cache=True)
+        truncated = len(body) > self.max_body
+        try:
+            body_text = body[: self.max_body].decode("utf-8")
+        except UnicodeDecodeError:
+            body_text, truncated = None, True
+
+        self.log.info(json.dumps({
+            "ts": round(wall_start, 6),
+            "service": self.service,
+            "method": request.method,
+            "path": request.path,
+            "route": request.url_rule.rule if request.url_rule else None,
+            "query": request.query_string.decode("utf-8", "replace"),
+            "headers": dict(
+                {h: request.headers[h] for h in self.headers if h in request.headers},
+                **{h: REDACTED for h in REDACTED_HEADERS if h in request.headers},
+            ),
+            "body": body_text,
+            "body_truncated": truncated,
+            "status": response.status_code,
+            "latency_ms": round(latency_ms, 3),
+        }, separators=(",", ":")))
+        return response
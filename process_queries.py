@@ -12,8 +12,9 @@ def wait_for_service(url, max_retries=10, delay=2):
     """Wait for a service to be ready"""
     for i in range(max_retries):
         try:
-            r = requests.get(f"{url}/pet-types", timeout=5)
-            if r.status_code in [200, 404]:
+            # /readyz only pings Mongo (cached), unlike listing all pet-types
+            r = requests.get(f"{url}/readyz", timeout=5)
+            if r.status_code == 200:
                 return True
         except requests.exceptions.RequestException:
             pass
@@ -109,7 +110,7 @@ def main():
     
     # Wait for services
     print("Waiting for services to be ready...")
-    if not wait_for_service(STORE1) or not wait_for_service(STORE2):
+    if not wait_for_service(STORE1) or not wait_for_service(STORE2) or not wait_for_service(ORDER_SERVICE):
         print("Services failed to start")
         sys.exit(1)
     
@@ -0,0 +1,198 @@
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+"""
+------------------------------------------------------------------------------------------------
+Replay a traffic capture (CAPTURE_FILE of the services, see traffic_capture.py)
+against a local stack and compare latencies per route.
+
+  python replay_traffic.py capture.ndjson capture.ndjson.1 --speed 1
+  python replay_traffic.py capture.ndjson --speed 4 --concurrency 16
+  python replay_traffic.py capture.ndjson --speed max --report replay.json
+
+--speed 1 keeps the captured timing, N plays it N times faster, "max" sends as
+fast as --concurrency allows. Each captured "service" is sent to its --target
+(defaults: the ports of docker-compose.yml). Captures hold no credentials: the
+OwnerPC placeholder is replaced with --owner-pc (default: the OWNER_PC variable),
+and dropped when none is given.
+------------------------------------------------------------------------------------------------
+"""
+
+DEFAULT_TARGETS = {
+    "pet-store1": "http://localhost:5001",
+    "pet-store2": "http://localhost:5002",
+    "pet-order": "http://localhost:5003",
+}
+# Value the services write for a credential header (traffic_capture.REDACTED)
+REDACTED = "<redacted>"
+
+
+def read_captures(paths):
+    """
+    Read NDJSON capture files, oldest record first.
+    """
+    records = []
+    for path in paths:
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    records.append(json.loads(line))
+    records.sort(key=lambda r: r["ts"])
+    return records
+
+
+def percentile(values, p):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))]
+
+
+class Replayer:
+    def __init__(self, targets, speed=1.0, concurrency=8, timeout=30, secrets=None):
+        """
+        speed: time scale factor, None replays at maximum speed.
+        secrets: header -> value sent in place of a redacted capture value.
+        """
+        self.targets = targets
+        self.secrets = secrets or {}
+        self.speed = speed
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self.results = []   # (record, replay status, replay latency ms, error)
+        self.elapsed = 0.0
+
+    def _session(self):
+        if not hasattr(self._local, "session"):
+            self._local.session = requests.Session()
+        return self._local.session
+
+    def send(self, record):
+        base = self.targets.get(record["service"])
+        if base is None:
+            result = (record, None, None, f"no target for service {record['service']}")
+        elif record.get("body_truncated"):
+            result = (record, None, None, "body was truncated at capture")
+        else:
+            url = base + record["path"] + (f"?{record['query']}" if record.get("query") else "")
+            body = record.get("body")
+            headers = {}
+            for name, value in (record.get("headers") or {}).items():
+                if value == REDACTED:
+                    value = self.secrets.get(name)
+                if value is not None:
+                    headers[name] = value
+            started = time.perf_counter()
+            try:
+                r = self._session().request(
+                    record["method"], url, headers=headers,
+                    data=body.encode("utf-8") if body else None, timeout=self.timeout,
+                )
+                r.content  # latency includes the whole body, like the capture
+                result = (record, r.status_code, (time.perf_counter() - started) * 1000, None)
+            except requests.exceptions.RequestException as e:
+                result = (record, None, None, str(e))
+        with self._lock:
+            self.results.append(result)
+
+    def run(self, records):
+        if not records:
+            return
+        t0 = records[0]["ts"]
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+            for record in records:
+                if self.speed:
+                    # Keep the captured spacing, scaled by speed
+                    delay = (record["ts"] - t0) / self.speed - (time.perf_counter() - start)
+                    if delay > 0:
+                        time.sleep(delay)
+                pool.submit(self.send, record)
+        self.elapsed = time.perf_counter() - start
+
+    def report(self):
+        """
+        Per route: count, captured vs replayed p50 / p95 latency, status mismatches, errors.
+        """
+        routes = {}
+        for record, status, latency, error in self.results:
+            key = f"{record['service']} {record['method']} {record.get('route') or record['path']}"
+            route = routes.setdefault(key, {"captured": [], "replayed": [], "status_mismatches": 0, "errors": 0})
+            route["captured"].append(record["latency_ms"])
+            if error is not None:
+                route["errors"] += 1
+                continue
+            route["replayed"].append(latency)
+            if status != record["status"]:
+                route["status_mismatches"] += 1
+
+        report = {}
+        for key, route in sorted(routes.items()):
+            row = {"count": len(route["captured"]), "status_mismatches": route["status_mismatches"], "errors": route["errors"]}
+            for p in (50, 95):
+                captured, replayed = percentile(route["captured"], p), percentile(route["replayed"], p)
+                row[f"captured_p{p}_ms"] = round(captured, 2) if captured is not None else None
+                row[f"replayed_p{p}_ms"] = round(replayed, 2) if replayed is not None else None
+                row[f"delta_p{p}_ms"] = round(replayed - captured, 2) if None not in (captured, replayed) else None
+            report[key] = row
+        return report
+
+
+def print_report(report):
+    header = f"{'route':<55} {'n':>5} {'cap p50':>9} {'rep p50':>9} {'Δ p50':>9} {'cap p95':>9} {'rep p95':>9} {'Δ p95':>9} {'status≠':>8} {'err':>5}"
+    print(header)
+    print("-" * len(header))
+    fmt = lambda v: f"{v:9.2f}" if v is not None else f"{'-':>9}"
+    for key, row in report.items():
+        print(f"{key[:55]:<55} {row['count']:>5} {fmt(row['captured_p50_ms'])} {fmt(row['replayed_p50_ms'])} "
+              f"{fmt(row['delta_p50_ms'])} {fmt(row['captured_p95_ms'])} {fmt(row['replayed_p95_ms'])} "
+              f"{fmt(row['delta_p95_ms'])} {row['status_mismatches']:>8} {row['errors']:>5}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay captured traffic and compare latencies per route")
+    parser.add_argument("captures", nargs="+", help="NDJSON capture files (rotated files too)")
+    parser.add_argument("--speed", default="1", help='time scale factor (1 = as captured) or "max"')
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--target", action="append", default=[], metavar="SERVICE=URL",
+                        help="base URL of a captured service (repeatable)")
+    parser.add_argument("--timeout", type=float, default=30)
+    parser.add_argument("--report", help="also write the report as JSON to this file")
+    parser.add_argument("--owner-pc", default=os.environ.get("OWNER_PC"),
+                        help="OwnerPC sent for the captured owner-only requests (default: $OWNER_PC)")
+    args = parser.parse_args(argv)
+
+    targets = dict(DEFAULT_TARGETS)
+    for target in args.target:
+        service, _, url = target.partition("=")
+        targets[service.strip()] = url.strip().rstrip("/")
+    speed = None if args.speed == "max" else float(args.speed)
+    if speed is not None and speed <= 0:
+        parser.error("--speed must be positive or max")
+
+    records = read_captures(args.captures)
+    print(f"Replaying {len(records)} requests at speed {args.speed} with concurrency {args.concurrency}")
+    secrets = {"OwnerPC": args.owner_pc} if args.owner_pc else {}
+    replayer = Replayer(targets, speed=speed, concurrency=args.concurrency, timeout=args.timeout, secrets=secrets)
+    replayer.run(records)
+    print(f"Done in {replayer.elapsed:.1f}s")
+
+    report = replayer.report()
+    print_report(report)
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
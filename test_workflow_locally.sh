@@ -64,7 +64,7 @@ echo "======================================"
 
 echo "Starting containers..."
 docker compose up -d --no-build
-sleep 15
+./wait_for_ready.sh 60
 check_success "Container startup"
 
 echo "Checking container status..."
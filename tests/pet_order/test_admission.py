@@ -0,0 +1,73 @@
+import asyncio
+import threading
+import time
+
+from admission import AdmissionLimiter, AsyncAdmissionLimiter
+
+
+def test_admits_up_to_max_concurrent():
+    limiter = AdmissionLimiter("t", max_concurrent=2, max_queue=0, queue_timeout=0.01)
+    assert limiter.acquire()
+    assert limiter.acquire()
+    assert not limiter.acquire()
+    stats = limiter.stats()
+    assert (stats["in_flight"], stats["admitted"], stats["rejected_queue_full"]) == (2, 2, 1)
+
+
+def test_queued_request_gets_the_released_slot():
+    limiter = AdmissionLimiter("t", max_concurrent=1, max_queue=1, queue_timeout=2)
+    assert limiter.acquire()
+    result = []
+    waiter = threading.Thread(target=lambda: result.append(limiter.acquire()))
+    waiter.start()
+    while limiter.stats()["waiting"] == 0:
+        time.sleep(0.001)
+    time.sleep(0.01)
+    limiter.release()
+    waiter.join(2)
+    assert result == [True]
+    stats = limiter.stats()
+    assert stats["in_flight"] == 1
+    assert stats["max_queue_seconds"] > 0
+
+
+def test_queue_full_is_shed_at_once():
+    limiter = AdmissionLimiter("t", max_concurrent=1, max_queue=1, queue_timeout=1)
+    assert limiter.acquire()
+    waiter = threading.Thread(target=limiter.acquire)
+    waiter.start()
+    while limiter.stats()["waiting"] == 0:
+        time.sleep(0.001)
+    started = time.monotonic()
+    assert not limiter.acquire()
+    assert time.monotonic() - started < 0.5
+    assert limiter.stats()["rejected_queue_full"] == 1
+    limiter.release()
+    waiter.join(2)
+
+
+def test_queue_timeout():
+    limiter = AdmissionLimiter("t", max_concurrent=1, max_queue=4, queue_timeout=0.05)
+    assert limiter.acquire()
+    started = time.monotonic()
+    assert not limiter.acquire()
+    assert time.monotonic() - started >= 0.05
+    stats = limiter.stats()
+    assert (stats["rejected_timeout"], stats["waiting"]) == (1, 0)
+
+
+def test_async_limiter():
+    async def scenario():
+        limiter = AsyncAdmissionLimiter("t", max_concurrent=1, max_queue=1, queue_timeout=0.05)
+        assert await limiter.acquire()
+        # Queued, then times out
+        assert not await limiter.acquire()
+        # Queued, then gets the slot when it is released
+        waiter = asyncio.ensure_future(limiter.acquire())
+        await asyncio.sleep(0.01)
+        limiter.release()
+        assert await waiter
+        return limiter.stats()
+
+    stats = asyncio.run(scenario())
+    assert (stats["admitted"], stats["rejected_timeout"], stats["in_flight"]) == (2, 1, 1)
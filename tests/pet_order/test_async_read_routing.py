@@ -0,0 +1,59 @@
+import asyncio
+
+from bson import Timestamp
+
+from read_routing import AsyncReadRouting
+
+
+class FakeSession:
+    def __init__(self, operation_time=None):
+        self.operation_time = operation_time
+        self.cluster_time = {"clusterTime": operation_time} if operation_time else None
+        self.advanced_to = None
+
+    def advance_cluster_time(self, cluster_time):
+        self.cluster_time = cluster_time
+
+    def advance_operation_time(self, operation_time):
+        self.advanced_to = operation_time
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+
+class FakeClient:
+    """ start_session() hands out the queued sessions in order. """
+    def __init__(self, *sessions):
+        self.sessions = list(sessions)
+
+    def start_session(self, causal_consistency):
+        assert causal_consistency
+        return self.sessions.pop(0)
+
+
+def test_primary_opens_no_session():
+    routing = AsyncReadRouting(FakeClient(), mode="primary")
+
+    async def scenario():
+        async with routing.read_session() as session:
+            return session
+    assert asyncio.run(scenario()) is None
+
+
+def test_reads_wait_for_own_writes_and_observed_changes():
+    write, read1, read2 = FakeSession(Timestamp(200, 1)), FakeSession(), FakeSession()
+    routing = AsyncReadRouting(FakeClient(write, read1, read2), mode="nearest")
+
+    async def scenario():
+        async with routing.write_session():
+            pass
+        async with routing.read_session() as session:
+            first = session.advanced_to
+        routing.observe(Timestamp(205, 1))
+        async with routing.read_session() as session:
+            return first, session.advanced_to
+    assert asyncio.run(scenario()) == (Timestamp(200, 1), Timestamp(205, 1))
+    assert routing.stats()["routed_reads"] == 2
@@ -0,0 +1,83 @@
+import asyncio
+import gzip
+import json
+
+import pytest
+
+import pet_order
+import pet_order_async
+from store_registry import StoreRegistry
+
+OWNER = {"OwnerPC": pet_order.OWNER_PC}
+
+
+def rules(app):
+    return {(rule.rule, frozenset(rule.methods)) for rule in app.url_map.iter_rules() if rule.endpoint != "static"}
+
+
+def test_both_builds_serve_the_same_api(monkeypatch):
+    monkeypatch.setattr(pet_order.inventory, "start", lambda: None)
+    assert rules(pet_order_async.create_app()) == rules(pet_order.create_app())
+
+
+@pytest.fixture
+def serve(monkeypatch, tmp_path):
+    """ Run a scenario(client) against a started asyncio app, in-memory storage, stores 1 and 2. """
+    registry = StoreRegistry({1: "http://store1", 2: "http://store2"})
+    monkeypatch.setattr(pet_order_async, "store_registry", registry)
+    monkeypatch.setattr(pet_order_async.inventory, "registry", registry)
+    monkeypatch.setattr(pet_order_async.inventory, "start", lambda: None)
+    monkeypatch.setattr(pet_order_async, "STORAGE_ENGINE", "memory")
+    monkeypatch.setenv("STORAGE_SNAPSHOT", "")
+    monkeypatch.setenv("COMPRESS_MIN_SIZE", "200")
+    monkeypatch.setenv("CAPTURE_FILE", str(tmp_path / "capture.ndjson"))
+
+    def run(scenario):
+        async def main():
+            async with pet_order_async.create_app().test_app() as app:
+                return await scenario(app.test_client())
+        return asyncio.run(main())
+    return run
+
+
+def test_admin_routes(serve):
+    async def scenario(client):
+        assert (await client.get("/admin/stores")).status_code == 401
+        r = await client.put("/admin/stores/3", json={"url": "http://store3/"}, headers=OWNER)
+        assert (r.status_code, await r.get_json()) == (200, {"store": 3, "url": "http://store3"})
+        assert (await client.put("/admin/stores/4", json={"url": "nope"}, headers=OWNER)).status_code == 400
+        assert (await client.delete("/admin/stores/1", headers=OWNER)).status_code == 204
+        r = await client.get("/admin/stores", headers=OWNER)
+        assert [s["store"] for s in await r.get_json()] == [2, 3]
+        for path in ("/stats/admission", "/stats/inventory", "/stats/read-routing", "/admin/breakers"):
+            assert (await client.get(path, headers=OWNER)).status_code == 200, path
+        assert (await client.get("/inventory")).status_code == 200
+    serve(scenario)
+
+
+def test_batch_purchases_are_compressed_and_captured(serve, monkeypatch, tmp_path):
+    async def fetch_stock(store_id, store_url, pet_type_name):
+        return ("1", [{"name": f"Pet{i}"} for i in range(3)]) if store_id == 2 else None
+    sold = []
+
+    async def delete_from_store(store_id, store_url, type_id, pet_name):
+        sold.append((store_id, pet_name))
+        return True
+    monkeypatch.setattr(pet_order_async, "fetch_stock", fetch_stock)
+    monkeypatch.setattr(pet_order_async, "delete_from_store", delete_from_store)
+
+    async def scenario(client):
+        items = [{"purchaser": f"p{i}", "pet-type": "Poodle"} for i in range(4)] + [{"pet-type": "Poodle"}]
+        r = await client.post("/purchases/batch", json={"purchases": items})
+        statuses = [result["status"] for result in (await r.get_json())["results"]]
+        assert sorted(statuses) == [201, 201, 201, 400, 400]
+
+        r = await client.get("/transactions", headers=dict(OWNER, **{"Accept-Encoding": "gzip"}))
+        assert r.headers["Content-Encoding"] == "gzip"
+        assert len(json.loads(gzip.decompress(await r.get_data()))) == 3
+    serve(scenario)
+    assert sorted(sold) == [(2, "Pet0"), (2, "Pet1"), (2, "Pet2")]
+
+    captured = [json.loads(line) for line in (tmp_path / "capture.ndjson").read_text().splitlines()]
+    assert [(c["route"], c["status"]) for c in captured] == [("/purchases/batch", 200), ("/transactions", 200)]
+    assert captured[1]["headers"] == {"OwnerPC": "<redacted>"}
@@ -0,0 +1,62 @@
+from circuit_breaker import CLOSED, HALF_OPEN, OPEN, BreakerBoard, CircuitBreaker
+
+
+def test_opens_after_consecutive_failures(clock):
+    breaker = CircuitBreaker(failure_threshold=3)
+    breaker.record_failure()
+    breaker.record_failure()
+    breaker.record_success()    # resets the count
+    breaker.record_failure()
+    breaker.record_failure()
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.stats()["state"] == OPEN
+    assert not breaker.allow()
+    assert not breaker.available()
+    assert breaker.stats()["skipped_calls"] == 1
+
+
+def test_half_open_probe_closes_on_success(clock):
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=10, half_open_max=1)
+    breaker.record_failure()
+    clock.now += 10
+    assert breaker.available()
+    assert breaker.allow()          # the probe
+    assert breaker.stats()["state"] == HALF_OPEN
+    assert not breaker.allow()      # only one probe at a time
+    breaker.record_success()
+    assert breaker.stats()["state"] == CLOSED
+    assert breaker.allow()
+
+
+def test_half_open_probe_failure_reopens(clock):
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=10)
+    for _ in range(3):
+        breaker.record_failure()
+    clock.now += 10
+    assert breaker.allow()
+    breaker.record_failure()        # a single failure is enough when half open
+    stats = breaker.stats()
+    assert (stats["state"], stats["times_opened"], stats["probe_in"]) == (OPEN, 2, 10)
+    assert not breaker.allow()
+
+
+def test_cancelled_probe_is_given_back(clock):
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=1)
+    breaker.record_failure()
+    clock.now += 1
+    assert breaker.allow()
+    assert not breaker.allow()
+    breaker.cancel_probe()
+    assert breaker.allow()
+
+
+def test_board_keeps_one_breaker_per_store():
+    board = BreakerBoard(failure_threshold=1)
+    board.get(1).record_failure()
+    assert board.get(1) is board.get(1)
+    assert not board.get(1).available()
+    assert board.get(2).available()
+    board.reset(1)
+    assert board.get(1).available()
+    assert set(board.stats()) == {1, 2}
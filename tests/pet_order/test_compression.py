@@ -0,0 +1,71 @@
+import gzip
+
+import pytest
+from flask import Flask, Response, jsonify
+
+import compression
+from compression import ResponseCompressor
+
+BIG = [{"type": "Poodle", "pets": [f"Pet{i}" for i in range(200)]}]
+
+
+def make_client(**kwargs):
+    app = Flask(__name__)
+
+    @app.route("/big")
+    def big():
+        response = jsonify(BIG)
+        response.add_etag()
+        return response
+
+    @app.route("/small")
+    def small():
+        return jsonify([])
+
+    @app.route("/picture")
+    def picture():
+        return Response(iter([b"\xff\xd8" * 1000]), mimetype="image/jpeg")
+
+    ResponseCompressor(**kwargs).init_app(app)
+    return app.test_client()
+
+
+def jsonify_body(obj):
+    with Flask(__name__).app_context():
+        return jsonify(obj).get_data()
+
+
+def test_gzip_is_negotiated_above_the_threshold():
+    client = make_client(algorithms=["gzip"], min_size=1024, level=9)
+    r = client.get("/big", headers={"Accept-Encoding": "gzip, deflate"})
+    assert r.headers["Content-Encoding"] == "gzip" and "Accept-Encoding" in r.headers["Vary"]
+    assert gzip.decompress(r.data) == jsonify_body(BIG)
+    assert r.headers["ETag"].startswith('W/"')
+
+    assert "Content-Encoding" not in client.get("/small", headers={"Accept-Encoding": "gzip"}).headers
+    assert "Content-Encoding" not in client.get("/big", headers={"Accept-Encoding": "identity"}).headers
+    assert "Content-Encoding" not in client.get("/big").headers
+
+
+def test_streamed_and_disabled_responses_are_left_alone():
+    client = make_client(algorithms=["gzip"], min_size=0)
+    r = client.get("/picture", headers={"Accept-Encoding": "gzip"})
+    assert "Content-Encoding" not in r.headers and "Vary" not in r.headers
+    r = make_client(algorithms=[]).get("/big", headers={"Accept-Encoding": "gzip"})
+    assert "Content-Encoding" not in r.headers
+
+
+def test_unavailable_algorithms_are_not_offered(monkeypatch):
+    monkeypatch.setattr(compression, "brotli", None)
+    monkeypatch.setattr(compression, "zstandard", None)
+    monkeypatch.setenv("COMPRESS_ALGORITHMS", "br, zstd ,gzip")
+    monkeypatch.setenv("COMPRESS_MIN_SIZE", "10")
+    compressor = ResponseCompressor.from_env()
+    assert (compressor.algorithms, compressor.min_size, compressor.level) == (["gzip"], 10, 6)
+
+
+@pytest.mark.skipif(compression.brotli is None, reason="brotli is not installed")
+def test_the_preferred_accepted_encoding_wins():
+    client = make_client(algorithms=["br", "gzip"], min_size=0)
+    assert client.get("/big", headers={"Accept-Encoding": "gzip, br"}).headers["Content-Encoding"] == "br"
+    assert client.get("/big", headers={"Accept-Encoding": "gzip"}).headers["Content-Encoding"] == "gzip"
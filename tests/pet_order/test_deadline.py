@@ -0,0 +1,81 @@
+import threading
+
+import pytest
+
+import deadline
+import pet_order
+from deadline import DEADLINE_HEADER, Deadline, DeadlineExceeded
+
+
+def test_from_header(clock):
+    assert Deadline.from_header("1500").remaining() == 1.5
+    assert Deadline.from_header("-20").remaining() == 0
+    assert Deadline.from_header("soon") is None
+    assert Deadline.from_header(None) is None
+
+
+def test_timeout_is_capped_by_the_budget(clock):
+    request_deadline = Deadline(2)
+    assert request_deadline.timeout(5) == 2
+    assert request_deadline.timeout(1) == 1
+    clock.now += 1.5
+    assert request_deadline.header() == {DEADLINE_HEADER: "500"}
+    clock.now += 0.5
+    with pytest.raises(DeadlineExceeded):
+        request_deadline.timeout(5)
+    with pytest.raises(DeadlineExceeded, match="finding a pet"):
+        request_deadline.check("finding a pet")
+
+
+def test_worker_threads_get_the_callers_deadline(clock):
+    request_deadline = Deadline(3)
+    token = deadline.activate(request_deadline)
+    try:
+        seen = []
+        task = deadline.in_context(lambda: seen.append(deadline.current()))
+        bare = threading.Thread(target=lambda: seen.append(deadline.current()))
+        for thread in (threading.Thread(target=task), bare):
+            thread.start()
+            thread.join()
+    finally:
+        deadline.deactivate(token)
+    assert seen == [request_deadline, None]
+    assert deadline.current() is None
+
+
+class FakeResponse:
+    status_code = 204
+    headers = {}
+
+
+def send(monkeypatch, **kwargs):
+    sent = {}
+    monkeypatch.setattr(pet_order.requests, "request", lambda method, url, **kw: sent.update(kw) or FakeResponse())
+    token = deadline.activate(Deadline(0.5))
+    try:
+        pet_order.store_request(99, "DELETE", "http://store/pet-types/1/pets/rex", **kwargs)
+    finally:
+        deadline.deactivate(token)
+    return sent
+
+
+def test_store_calls_are_clipped_to_the_budget(clock, monkeypatch):
+    sent = send(monkeypatch, timeout=5)
+    assert sent["timeout"] == 0.5
+    assert sent["headers"][DEADLINE_HEADER] == "500"
+
+
+def test_commit_call_keeps_its_full_timeout(clock, monkeypatch):
+    sent = send(monkeypatch, commit=True, timeout=5)
+    assert sent["timeout"] == 5
+    assert sent["headers"][DEADLINE_HEADER] == "5000"
+
+
+def test_commit_call_is_not_started_past_the_deadline(clock, monkeypatch):
+    monkeypatch.setattr(pet_order.requests, "request", lambda *a, **kw: pytest.fail("sent"))
+    token = deadline.activate(Deadline(0))
+    try:
+        with pytest.raises(DeadlineExceeded):
+            pet_order.store_request(99, "DELETE", "http://store/x", commit=True, timeout=5)
+    finally:
+        deadline.deactivate(token)
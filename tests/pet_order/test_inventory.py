@@ -0,0 +1,89 @@
+import pet_order
+from inventory import InventoryView
+from store_registry import StoreRegistry
+
+
+class FakeStores:
+    """ fetch() for the view: each store answers its pet-types, or 304 for a matching ETag. """
+    def __init__(self, stores):
+        self.stores = stores
+        self.versions = dict.fromkeys(stores, 1)
+        self.calls = []
+
+    def __call__(self, store_id, url, etag):
+        self.calls.append((store_id, etag))
+        types = self.stores[store_id]
+        if isinstance(types, Exception):
+            raise types
+        current = f'"{store_id}-{self.versions[store_id]}"'
+        if etag == current:
+            return 304, etag, None
+        return 200, current, types
+
+
+def poodles(*names):
+    return [{"id": 1, "type": "Poodle", "pets": list(names)}]
+
+
+def make_view(stores, **kwargs):
+    registry = StoreRegistry({sid: f"http://store{sid}" for sid in stores})
+    fetch = FakeStores(stores)
+    return InventoryView(registry, fetch, **kwargs), fetch
+
+
+def test_unchanged_stores_answer_304(clock):
+    view, fetch = make_view({1: poodles("Rex"), 2: ConnectionError("down")})
+    view.refresh_all()
+    view.refresh_all()
+    assert fetch.calls[2] == (1, '"1-1"')
+    assert view.lookup(1, "POODLE") == (True, {"type": "Poodle", "id": "1", "pets": ["Rex"]})
+    assert view.lookup(1, "Beagle") == (True, None)
+    assert view.lookup(2, "Poodle") == (False, None)
+    assert view.stats()["not_modified"] == 1 and view.stats()["errors"] == 2
+
+
+def test_stale_or_invalidated_data_is_not_trusted(clock):
+    view, fetch = make_view({1: poodles("Rex", "Max")}, max_staleness=15)
+    view.refresh_all()
+    view.remove_pet(1, "poodle", "Rex")
+    assert view.lookup(1, "Poodle")[1]["pets"] == ["Max"]
+    clock.now += 16
+    assert view.lookup(1, "Poodle") == (False, None)
+    assert view.view("poodle")[0]["stale"]
+
+    view.refresh_all()
+    view.invalidate(1)
+    assert view.lookup(1, "Poodle") == (False, None)
+    # The next poll asks for the full list again
+    view.refresh_all()
+    assert fetch.calls[-1] == (1, None)
+    assert view.lookup(1, "Poodle")[0]
+
+
+def test_removed_stores_are_forgotten(clock):
+    view, _ = make_view({1: poodles("Rex"), 2: poodles("Fido")})
+    view.refresh_all()
+    view.registry.remove(2)
+    view.refresh_all()
+    assert [row["store"] for row in view.view()] == [1]
+
+
+def test_purchases_skip_empty_stores_and_recheck_stale_ones(monkeypatch, clock):
+    view, _ = make_view({1: poodles(), 2: poodles("Rex")})
+    view.refresh_all()
+    monkeypatch.setattr(pet_order, "inventory", view)
+    monkeypatch.setattr(pet_order, "store_registry", view.registry)
+    live = {1: [], 2: []}
+    asked = []
+    monkeypatch.setattr(pet_order, "get_type_id", lambda store_id, store_url, pet_type_name: "1")
+
+    def fetch_pets(store_id, store_url, type_id):
+        asked.append(store_id)
+        return [{"name": name} for name in live[store_id]]
+    monkeypatch.setattr(pet_order, "fetch_pets", fetch_pets)
+
+    # Store 2 was sold out meanwhile, store 1 got a pet: both checked live
+    live[1] = ["Max"]
+    assert pet_order.find_available_pet("Poodle")[:2] == ({"name": "Max"}, 1)
+    assert asked == [2, 2, 1]
+    assert view.lookup(2, "Poodle") == (False, None)
@@ -0,0 +1,72 @@
+import time
+
+import deadline
+from deadline import Deadline
+from pet_order import allocate_pets, run_on_stores
+
+
+def pets(*names):
+    return [{"name": name} for name in names]
+
+
+def buy(pet_type="Poodle", store=None, pet_name=None):
+    item = {"purchaser": "p", "pet-type": pet_type}
+    if store is not None:
+        item["store"] = store
+    if pet_name is not None:
+        item["pet-name"] = pet_name
+    return item
+
+
+def test_every_buyer_gets_a_distinct_pet():
+    stock = {1: (10, pets("A", "B")), 2: (20, pets("C"))}
+    items = list(enumerate([buy() for _ in range(5)]))
+    allocated = allocate_pets(items, stock)
+    assert len(allocated) == 3
+    sold = {(sid, pet["name"]) for sid, _, pet in allocated.values()}
+    assert sold == {(1, "A"), (1, "B"), (2, "C")}
+    assert all(type_id == sid * 10 for sid, type_id, _ in allocated.values())
+
+
+def test_named_pets_are_served_before_anonymous_requests():
+    stock = {1: (10, pets("Rex"))}
+    allocated = allocate_pets([(0, buy()), (1, buy(store=1, pet_name=" rex "))], stock)
+    assert list(allocated) == [1]
+    assert allocated[1][2]["name"] == "Rex"
+
+
+def test_store_requests_are_served_before_any_store_ones():
+    stock = {1: (10, pets("A")), 2: (20, pets())}
+    allocated = allocate_pets([(0, buy()), (1, buy(store=1))], stock)
+    assert list(allocated) == [1]
+
+
+def test_unknown_store_or_pet_gets_nothing():
+    stock = {1: (10, pets("A"))}
+    assert allocate_pets([(0, buy(store=3)), (1, buy(store=1, pet_name="B"))], stock) == {}
+    assert stock[1][1] == pets("A")
+
+
+def test_commit_calls_are_waited_for_past_the_deadline():
+    def slow(value):
+        time.sleep(0.2)
+        return value
+
+    token = deadline.activate(Deadline(0.05))
+    try:
+        assert run_on_stores(slow, [(1,), (2,)]) == [None, None]
+        assert run_on_stores(slow, [(1,), (2,)], commit=True) == [1, 2]
+    finally:
+        deadline.deactivate(token)
+
+
+def test_errors_are_returned_in_place():
+    def fail(value):
+        if value == 2:
+            raise ValueError("boom")
+        return value
+
+    results = run_on_stores(fail, [(1,), (2,)])
+    assert results[0] == 1
+    assert isinstance(results[1], ValueError)
+    assert run_on_stores(fail, []) == []
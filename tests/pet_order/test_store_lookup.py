@@ -0,0 +1,67 @@
+import pytest
+import requests
+
+import pet_order
+from deadline import DeadlineExceeded
+from pet_order import StoreUnavailable, get_type_id
+
+TYPES = [{"id": 1, "type": "Poodle"}, {"id": 2, "type": "Siamese"}]
+
+
+class FakeResponse:
+    def __init__(self, body, status_code=200):
+        self.body = body
+        self.status_code = status_code
+
+    def json(self):
+        return self.body
+
+
+def fake_store(monkeypatch, answer):
+    calls = []
+
+    def store_request(store_id, method, url, params=None, **kwargs):
+        calls.append(params)
+        return answer(params)
+    monkeypatch.setattr(pet_order, "store_request", store_request)
+    return calls
+
+
+def filtered(params):
+    wanted = (params or {}).get("type")
+    return FakeResponse([t for t in TYPES if wanted is None or t["type"] == wanted])
+
+
+def test_asks_for_the_type_only(monkeypatch):
+    calls = fake_store(monkeypatch, filtered)
+    assert get_type_id(1, "http://store", " Poodle ") == "1"
+    assert calls == [{"type": "Poodle"}]
+
+
+def test_falls_back_to_a_case_insensitive_match(monkeypatch):
+    calls = fake_store(monkeypatch, filtered)
+    assert get_type_id(1, "http://store", "siamese") == "2"
+    assert calls == [{"type": "siamese"}, None]
+    assert get_type_id(1, "http://store", "Beagle") is None
+
+
+def test_store_errors_mean_no_type(monkeypatch):
+    fake_store(monkeypatch, lambda params: FakeResponse(None, 500))
+    assert get_type_id(1, "http://store", "Poodle") is None
+
+    def fail(error):
+        def answer(params):
+            raise error
+        return answer
+    fake_store(monkeypatch, fail(requests.ConnectionError("refused")))
+    assert get_type_id(1, "http://store", "Poodle") is None
+    fake_store(monkeypatch, fail(StoreUnavailable("open")))
+    assert get_type_id(1, "http://store", "Poodle") is None
+
+
+def test_running_out_of_time_is_not_swallowed(monkeypatch):
+    def answer(params):
+        raise DeadlineExceeded("late")
+    fake_store(monkeypatch, answer)
+    with pytest.raises(DeadlineExceeded):
+        get_type_id(1, "http://store", "Poodle")
@@ -0,0 +1,86 @@
+import json
+
+import pytest
+
+import pet_order
+from store_registry import DEFAULT_STORES, StoreRegistry, parse_stores
+
+OWNER = {"OwnerPC": pet_order.OWNER_PC}
+
+
+def test_parse_stores():
+    assert parse_stores(" 1=http://a:8000, 3=http://c:8000/ ,") == {1: "http://a:8000", 3: "http://c:8000/"}
+
+
+def test_stores_come_from_the_file_then_the_env_then_compose(monkeypatch, tmp_path):
+    stores_file = tmp_path / "stores.json"
+    stores_file.write_text(json.dumps({"5": "http://e:8000"}))
+    monkeypatch.setenv("STORES", "3=http://c:8000")
+    monkeypatch.setenv("STORES_FILE", str(stores_file))
+    assert StoreRegistry.from_env().snapshot() == {5: "http://e:8000"}
+    monkeypatch.delenv("STORES_FILE")
+    assert StoreRegistry.from_env().snapshot() == {3: "http://c:8000"}
+    monkeypatch.delenv("STORES")
+    assert StoreRegistry.from_env().snapshot() == DEFAULT_STORES
+
+
+def test_bad_stores_are_rejected():
+    registry = StoreRegistry({1: "http://a:8000/"})
+    for store_id, url in ((0, "http://b"), (True, "http://b"), ("2", "http://b"), (2, "b:8000"), (2, None)):
+        with pytest.raises(ValueError):
+            registry.add(store_id, url)
+    assert registry.snapshot() == {1: "http://a:8000"}
+    assert registry.remove(1) and not registry.remove(1)
+    assert 1 not in registry
+
+
+@pytest.fixture
+def registry(monkeypatch):
+    registry = StoreRegistry({1: "http://store1", 2: "http://store2"})
+    monkeypatch.setattr(pet_order, "store_registry", registry)
+    monkeypatch.setattr(pet_order.inventory, "registry", registry)
+    return registry
+
+
+@pytest.fixture
+def order(monkeypatch, registry):
+    """ A test client of pet-order on the in-memory engine, with no inventory polling. """
+    monkeypatch.setattr(pet_order, "STORAGE_ENGINE", "memory")
+    monkeypatch.setattr(pet_order, "transactions", None)
+    monkeypatch.setenv("STORAGE_SNAPSHOT", "")
+    monkeypatch.setattr(pet_order.inventory, "start", lambda: None)
+    return pet_order.create_app().test_client()
+
+
+def test_admin_routes_add_and_remove_stores(order, registry):
+    assert order.get("/admin/stores").status_code == 401
+    r = order.put("/admin/stores/3", json={"url": "http://store3:8000/"}, headers=OWNER)
+    assert (r.status_code, r.get_json()) == (200, {"store": 3, "url": "http://store3:8000"})
+    assert order.put("/admin/stores/4", json={"url": "store4"}, headers=OWNER).status_code == 400
+    assert order.put("/admin/stores/4", data="url", headers=OWNER).status_code == 415
+    assert [s["store"] for s in order.get("/admin/stores", headers=OWNER).get_json()] == [1, 2, 3]
+
+    purchase = {"purchaser": "p", "pet-type": "Poodle", "store": 3}
+    assert pet_order.validate_purchase(purchase) is None
+    assert order.delete("/admin/stores/3", headers=OWNER).status_code == 204
+    assert order.delete("/admin/stores/3", headers=OWNER).status_code == 404
+    assert pet_order.validate_purchase(purchase) == "Malformed data"
+
+
+def test_any_number_of_stores_is_searched(monkeypatch, registry):
+    for store_id in range(3, 9):
+        registry.add(store_id, f"http://store{store_id}")
+    registry.remove(7)
+    asked = []
+
+    def get_type_id(store_id, store_url, pet_type_name):
+        asked.append(store_id)
+        return "1"
+    monkeypatch.setattr(pet_order, "get_type_id", get_type_id)
+    monkeypatch.setattr(pet_order, "fetch_pets", lambda store_id, store_url, type_id: (
+        [{"name": "Rex"}] if store_id == 6 else []))
+
+    pet, store_id, store_url, type_id = pet_order.find_available_pet("Poodle")
+    assert (pet, store_id, store_url) == ({"name": "Rex"}, 6, "http://store6")
+    assert 7 not in asked
+    assert pet_order.find_available_pet("Poodle", store_id=7) == (None, None, None, None)
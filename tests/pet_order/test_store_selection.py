@@ -0,0 +1,88 @@
+import random
+from collections import Counter
+
+import pytest
+
+from store_selection import StoreSelector
+
+
+def first_picks(selector, store_ids, runs=4000, pet_type_name=None):
+    random.seed(7)
+    return Counter(selector.choose(store_ids, pet_type_name) for _ in range(runs))
+
+
+def test_unknown_policy_is_rejected():
+    with pytest.raises(ValueError, match="SELECTION_POLICY"):
+        StoreSelector(policy="fastest")
+
+
+def test_latency_ewma_and_weights():
+    selector = StoreSelector(alpha=0.5)
+    selector.record(1, 0.1, ok=True)
+    selector.record(1, 0.3, ok=True)
+    selector.record(2, 0.4, ok=True)
+    # 1: 0.1 then 0.1 + 0.5 * (0.3 - 0.1) = 0.2, twice as fast as 2
+    assert selector.weights([1, 2]) == pytest.approx({1: 1.0, 2: 0.5})
+    # A store without samples gets the average latency of the others
+    assert selector.weights([1, 2, 3])[3] == pytest.approx(0.2 / 0.3)
+
+
+def test_errors_lower_the_weight():
+    selector = StoreSelector(alpha=0.5)
+    selector.record(1, 0.1, ok=True)
+    selector.record(2, 0.1, ok=False)
+    assert selector.weights([1, 2]) == pytest.approx({1: 1.0, 2: 0.5})
+
+
+def test_p2c_prefers_the_faster_store():
+    selector = StoreSelector(policy="p2c", min_share=0.01)
+    selector.record(1, 0.01, ok=True)
+    selector.record(2, 0.09, ok=True)
+    picks = first_picks(selector, [1, 2])
+    # Two stores: the pair is always (1, 2), store 1 wins with probability 0.9
+    assert picks[1] / 4000 == pytest.approx(0.9, abs=0.03)
+
+
+def test_min_share_keeps_every_store_in_use():
+    selector = StoreSelector(policy="p2c", min_share=0.2)
+    selector.record(1, 0.001, ok=True)
+    selector.record(2, 10.0, ok=True)
+    selector.record(3, 0.001, ok=True)
+    weights = selector.weights([1, 2, 3])
+    assert weights[2] == 0.2
+    picks = first_picks(selector, [1, 2, 3])
+    shares = selector.first_pick_shares(weights)
+    assert sum(shares.values()) == pytest.approx(1.0)
+    assert picks[2] / 4000 == pytest.approx(shares[2], abs=0.03)
+    assert picks[2] > 0
+
+
+def test_weighted_policy_follows_the_weights():
+    selector = StoreSelector(policy="weighted", min_share=0.01)
+    selector.record(1, 0.01, ok=True)
+    selector.record(2, 0.03, ok=True)
+    shares = selector.first_pick_shares(selector.weights([1, 2]))
+    assert shares == pytest.approx({1: 0.75, 2: 0.25})
+    assert first_picks(selector, [1, 2])[1] / 4000 == pytest.approx(0.75, abs=0.03)
+
+
+def test_stock_scales_the_weight_until_it_expires(clock):
+    selector = StoreSelector(stock_ttl=10, stock_target=4, stock_lookup=lambda sid, name: None)
+    selector.observe_stock(1, "Poodle", 1)
+    selector.observe_stock(2, "Poodle", 9)
+    assert selector.weights([1, 2], "poodle") == pytest.approx({1: 0.25, 2: 1.0})
+    # Out of stock is not starved forever
+    selector.observe_stock(1, "Poodle", 0)
+    assert selector.weights([1, 2], "Poodle")[1] == selector.min_share
+    clock.now += 11
+    assert selector.weights([1, 2], "Poodle") == {1: 1.0, 2: 1.0}
+
+
+def test_reset_forgets_a_store():
+    selector = StoreSelector()
+    selector.record(1, 0.01, ok=True)
+    selector.record(2, 1.0, ok=True)
+    selector.reset(2)
+    assert selector.weights([1, 2]) == {1: 1.0, 2: 1.0}
+    assert selector.choose([]) is None
+    assert selector.order([5]) == [5]
@@ -0,0 +1,44 @@
+import json
+
+from flask import Flask
+
+import replay_traffic
+from traffic_capture import REDACTED, TrafficCapture
+
+
+def capture_one(tmp_path, sent_headers, **kwargs):
+    app = Flask(__name__)
+    app.add_url_rule("/transactions", "transactions", lambda: "[]")
+    path = tmp_path / "capture.ndjson"
+    TrafficCapture(str(path), "pet-order", **kwargs).init_app(app)
+    app.test_client().get("/transactions?store=1", headers=sent_headers)
+    return json.loads(path.read_text().splitlines()[-1])
+
+
+def test_owner_pc_is_never_written(tmp_path):
+    record = capture_one(tmp_path, {"OwnerPC": "secret", "X-Deadline-Ms": "900"},
+                         headers=["X-Deadline-Ms", "ownerpc"])
+    assert record["headers"] == {"X-Deadline-Ms": "900", "OwnerPC": REDACTED}
+    assert "secret" not in json.dumps(record)
+    assert (record["route"], record["query"], record["status"]) == ("/transactions", "store=1", 200)
+
+
+def test_requests_without_owner_pc_get_no_placeholder(tmp_path):
+    record = capture_one(tmp_path, {}, headers=["Content-Type"])
+    assert record["headers"] == {}
+
+
+def test_replay_substitutes_the_placeholder(monkeypatch):
+    sent = []
+
+    class Session:
+        def request(self, method, url, headers=None, **kwargs):
+            sent.append(headers)
+            return type("Response", (), {"status_code": 200, "content": b""})()
+    monkeypatch.setattr(replay_traffic.requests, "Session", Session)
+
+    record = {"service": "pet-order", "method": "GET", "path": "/transactions",
+              "headers": {"OwnerPC": REDACTED, "X-Deadline-Ms": "900"}}
+    replay_traffic.Replayer({"pet-order": "http://order"}, secrets={"OwnerPC": "pc"}).send(record)
+    replay_traffic.Replayer({"pet-order": "http://order"}).send(record)
+    assert sent == [{"OwnerPC": "pc", "X-Deadline-Ms": "900"}, {"X-Deadline-Ms": "900"}]
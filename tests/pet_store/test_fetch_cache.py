@@ -0,0 +1,82 @@
+import json
+import os
+
+import pytest
+import requests
+
+import fetch_cache
+from fetch_cache import FetchCache, normalize_url
+
+
+def test_normalize_url_lowercases_scheme_and_host():
+    assert normalize_url("HTTP://Example.COM/Pics/A.jpg") == "http://example.com/Pics/A.jpg"
+
+
+def test_normalize_url_drops_default_port_and_fragment():
+    assert normalize_url("https://example.com:443/a.jpg#top") == "https://example.com/a.jpg"
+    assert normalize_url("http://example.com:8080/a.jpg") == "http://example.com:8080/a.jpg"
+
+
+def test_normalize_url_sorts_the_query():
+    assert normalize_url("http://h/p?b=2&a=1&c=") == normalize_url(" http://h/p?c=&a=1&b=2 ")
+
+
+def test_normalize_url_empty_path():
+    assert normalize_url("http://h") == "http://h/"
+
+
+def test_existing_entries_are_adopted_not_wiped(tmp_path):
+    key = "a" * 64
+    (tmp_path / key).write_bytes(b"12345")
+    (tmp_path / f"{key}.json").write_text(json.dumps({"content_type": "image/png", "etag": '"v1"', "last_modified": None}))
+    (tmp_path / ("b" * 64)).write_bytes(b"no sidecar")
+    (tmp_path / "notes.txt").write_text("not ours")
+    stale = tmp_path / "x.part"
+    stale.write_bytes(b"")
+    os.utime(stale, (0, 0))
+
+    cache = FetchCache(str(tmp_path), max_bytes=100)
+    stats = cache.stats()
+    assert (stats["adopted"], stats["entries"], stats["bytes"]) == (1, 1, 5)
+    assert (tmp_path / "notes.txt").exists()
+    assert (tmp_path / ("b" * 64)).exists()
+    assert not stale.exists()
+
+
+def test_adopted_entries_are_evicted_over_budget(tmp_path):
+    for i, key in enumerate(("c" * 64, "d" * 64)):
+        (tmp_path / key).write_bytes(b"x" * 10)
+        (tmp_path / f"{key}.json").write_text("{}")
+        os.utime(tmp_path / key, (i, i))
+
+    cache = FetchCache(str(tmp_path), max_bytes=15)
+    assert cache.stats()["evictions"] == 1
+    # The oldest one goes first, together with its sidecar
+    assert not (tmp_path / ("c" * 64)).exists()
+    assert not (tmp_path / f"{'c' * 64}.json").exists()
+    assert (tmp_path / ("d" * 64)).exists()
+
+
+class BrokenResponse:
+    """ A 200 whose body is cut off after the first chunk. """
+    status_code = 200
+    headers = {"Content-Type": "image/jpeg"}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def iter_content(self, chunk_size):
+        yield b"x" * 10
+        raise requests.ConnectionError("connection reset")
+
+
+def test_failed_download_leaves_no_part_file(tmp_path, monkeypatch):
+    monkeypatch.setattr(fetch_cache.requests, "get", lambda url, **kwargs: BrokenResponse())
+    cache = FetchCache(str(tmp_path))
+    with pytest.raises(requests.ConnectionError):
+        cache.fetch("http://h/rex.jpg")
+    assert list(tmp_path.iterdir()) == []
+    assert cache.stats()["entries"] == 0
@@ -0,0 +1,45 @@
+import pytest
+from flask import Flask
+
+import json_provider
+from json_provider import FastJSONProvider, SerializedResponseCache
+
+DOCS = [
+    {"type": "Poodle", "id": 1, "pets": ["Rex"], "lifespan": 13.5},
+    {"type": "Chihuahua", "id": 2, "pets": ["Señor Ñu", "小白"], "lifespan": None},
+]
+
+
+def make_app(monkeypatch, provider):
+    monkeypatch.setenv("JSON_PROVIDER", provider)
+    app = Flask(__name__)
+    app.json = FastJSONProvider(app)
+    return app
+
+
+@pytest.mark.skipif(json_provider.orjson is None, reason="orjson is not installed")
+def test_orjson_bodies_match_flask(monkeypatch):
+    fast, stdlib = make_app(monkeypatch, "orjson"), make_app(monkeypatch, "stdlib")
+    assert fast.json.fast and not stdlib.json.fast
+    for obj in (DOCS, DOCS[:1], {"b": 1, "a": "é"}):
+        with fast.app_context():
+            body = fast.json.response(obj).get_data()
+        with stdlib.app_context():
+            assert body == stdlib.json.response(obj).get_data()
+    assert b"\\u00f1" in fast.json.dumps_bytes(DOCS) and fast.json.dumps_bytes(DOCS).isascii()
+    assert fast.json.loads(fast.json.dumps(DOCS)) == DOCS
+
+
+def test_bodies_computed_during_a_write_are_not_cached(clock):
+    cache = SerializedResponseCache(max_entries=2, ttl=30)
+    key = cache.key({"type": "Poodle"})
+    generation = cache.generation
+    cache.invalidate()
+    cache.put(key, b"[]", generation)
+    assert cache.get(key) is None
+
+    cache.put(key, b"[]", cache.generation)
+    assert cache.get(key) == b"[]"
+    clock.now += 31
+    assert cache.get(key) is None
+    assert cache.stats()["hits"] == 1
@@ -0,0 +1,134 @@
+from memory_engine import MemoryPetRepository
+from pet_repository import birth_timestamp
+from snapshot_file import SnapshotFile
+
+TYPES = [
+    {"id": 1, "type": "Poodle", "family": "Canidae", "genus": "Canis", "attributes": ["Loyal", "Smart"], "lifespan": 15},
+    {"id": 2, "type": "Siamese", "family": "Felidae", "genus": "Felis", "attributes": ["Vocal"], "lifespan": 12},
+    {"id": 3, "type": "Wolf", "family": "Canidae", "genus": "Canis", "attributes": ["Loud", "Wild"], "lifespan": 8},
+    {"id": 4, "type": "Tortoise", "family": "Testudinidae", "genus": "Geochelone", "attributes": [], "lifespan": None},
+]
+
+
+def make_repo(snapshot=None):
+    repo = MemoryPetRepository(snapshot)
+    for doc in TYPES:
+        repo.insert_type(doc)
+    return repo
+
+
+def ids(docs):
+    return [doc["id"] for doc in docs]
+
+
+def test_family_in_and_equality():
+    repo = make_repo()
+    assert ids(repo.list_types({"family": "Canidae"})) == [1, 3]
+    assert ids(repo.list_types({"family": {"$in": ["Felidae", "Testudinidae"]}})) == [2, 4]
+    assert ids(repo.list_types({"family": "Canidae", "genus": "Felis"})) == []
+    assert repo.count_types({"genus": "Canis"}) == 2
+
+
+def test_lifespan_ranges_skip_missing_lifespans():
+    repo = make_repo()
+    assert ids(repo.list_types({"lifespan": {"$gte": 12}})) == [1, 2]
+    assert ids(repo.list_types({"lifespan": {"$gt": 8, "$lt": 15}})) == [2]
+    assert ids(repo.list_types({"lifespan": 8})) == [3]
+
+
+def test_attribute_prefix_is_case_insensitive():
+    repo = make_repo()
+    assert ids(repo.list_types({"attributes": {"$regex": "^lo", "$options": "i"}})) == [1, 3]
+    assert ids(repo.list_types({"attributes": {"$regex": "^VOC", "$options": "i"}})) == [2]
+
+
+def test_sort_puts_missing_values_first_and_breaks_ties_by_id():
+    repo = make_repo()
+    assert ids(repo.list_types({}, sort=[("lifespan", 1)])) == [4, 3, 2, 1]
+    assert ids(repo.list_types({}, sort=[("family", -1)])) == [4, 2, 1, 3]
+
+
+def test_type_slot_and_delete():
+    repo = make_repo()
+    assert repo.find_type_slot("Poodle") == (True, 5)
+    assert repo.find_type_slot("Beagle") == (False, 5)
+    assert repo.insert_pet(4, {"name": "Shelly"})
+    assert repo.delete_type_if_empty(4) == "has_pets"
+    assert repo.delete_type_if_empty(2) == "deleted"
+    assert repo.list_types({"family": "Felidae"}) == []
+    assert repo.delete_type_if_empty(2) == "not_found"
+
+
+def test_pet_names_are_case_insensitive():
+    repo = make_repo()
+    assert repo.insert_pet(1, {"name": "Rex", "birthdate": "01-02-2020"})
+    assert not repo.insert_pet(1, {"name": "REX"})
+    assert repo.find_pet(1, "rex") == (True, {"name": "Rex", "birthdate": "01-02-2020", "picture": None})
+    assert repo.find_pet(9, "rex") == (False, None)
+    assert repo.get_type(1)["pets"] == ["Rex"]
+
+
+def test_rename_keeps_indexes_and_pet_list_in_step():
+    repo = make_repo()
+    repo.insert_pet(1, {"name": "Rex"})
+    repo.insert_pet(1, {"name": "Fido"})
+    assert repo.replace_pet(1, "Rex", {"name": "fido"})[0] == "exists"
+    assert repo.replace_pet(1, "rex", {"name": "Max", "birthdate": "05-05-2021"}) == (
+        "replaced", {"name": "Rex", "birthdate": None, "picture": None})
+    assert repo.replace_pet(1, "rex", {"name": "Max"}) == ("not_found", None)
+    assert repo.replace_pet(9, "Max", {"name": "Max"}) == ("not_found", None)
+    assert repo.find_pet(1, "rex") == (True, None)
+    assert repo.find_pet(1, "max")[1]["birthdate"] == "05-05-2021"
+    assert repo.get_type(1)["pets"] == ["Max", "Fido"]
+    assert repo.delete_pet(1, "MAX")["name"] == "Max"
+    assert repo.get_type(1)["pets"] == ["Fido"]
+
+
+def test_change_of_case_renames_in_place():
+    repo = make_repo()
+    repo.insert_pet(1, {"name": "Rex"})
+    repo.insert_pet(1, {"name": "Fido"})
+    assert repo.replace_pet(1, "REX", {"name": "rex", "picture": "1_rex.jpg"})[0] == "replaced"
+    assert [p["name"] for p in repo.list_pets(1)] == ["rex", "Fido"]
+    assert repo.get_type(1)["pets"] == ["rex", "Fido"]
+
+
+def test_writes_to_a_deleted_type_are_not_found():
+    repo = make_repo()
+    repo.insert_pet(2, {"name": "Tom"})
+    repo.delete_pet(2, "Tom")
+    assert repo.delete_type_if_empty(2) == "deleted"
+    assert not repo.insert_pet(2, {"name": "Tom"})
+    assert repo.replace_pet(2, "Tom", {"name": "Max"}) == ("not_found", None)
+    assert repo.delete_pet(2, "Tom") is None
+    assert repo.list_pets(2) is None
+
+
+def test_birthdate_range_keeps_insertion_order():
+    repo = make_repo()
+    for name, birthdate in [("A", "01-01-2021"), ("B", "01-01-2019"), ("C", "NA"), ("D", "01-01-2020")]:
+        repo.insert_pet(1, {"name": name, "birthdate": birthdate})
+    after = birth_timestamp("31-12-2019")
+    before = birth_timestamp("01-01-2021")
+    assert [p["name"] for p in repo.list_pets(1, born_after=after)] == ["A", "D"]
+    assert [p["name"] for p in repo.list_pets(1, born_after=after, born_before=before)] == ["D"]
+    repo.replace_pet(1, "d", {"name": "D", "birthdate": "01-01-2018"})
+    assert [p["name"] for p in repo.list_pets(1, born_before=before)] == ["B", "D"]
+    assert repo.list_pets(9) is None
+
+
+def test_snapshot_round_trip(tmp_path):
+    path = str(tmp_path / "store.json")
+    repo = make_repo(SnapshotFile(path))
+    repo.insert_pet(1, {"name": "Rex", "birthdate": "01-02-2020"})
+    repo.insert_pet(3, {"name": "Luna"})
+    repo.snapshot.save()
+
+    restored = MemoryPetRepository(SnapshotFile(path))
+    assert ids(restored.list_types({})) == [1, 2, 3, 4]
+    # The indexes are rebuilt from the loaded documents
+    assert ids(restored.list_types({"attributes": {"$regex": "^wi", "$options": "i"}})) == [3]
+    assert ids(restored.list_types({"lifespan": {"$lt": 13}})) == [2, 3]
+    assert restored.find_pet(1, "REX")[1]["birthdate"] == "01-02-2020"
+    assert [p["name"] for p in restored.list_pets(1, born_after=birth_timestamp("01-01-2020"))] == ["Rex"]
+    assert restored.get_type(3)["pets"] == ["Luna"]
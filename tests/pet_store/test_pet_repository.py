@@ -0,0 +1,269 @@
+import copy
+
+import pytest
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+from pet_repository import PetRepository
+from pet_type_cache import PetTypeCache
+
+
+def matches(doc, query, collation=None):
+    for field, cond in query.items():
+        value = doc.get(field)
+        if field == "pets":
+            if cond not in (value or []):
+                return False
+        elif collation is not None and isinstance(cond, str):
+            if not isinstance(value, str) or value.casefold() != cond.casefold():
+                return False
+        elif value != cond:
+            return False
+    return True
+
+
+class FakeCollection:
+    """
+    The handful of collection methods PetRepository uses, over a list of
+    documents. `unique` is a case-insensitive unique key, like type_id_name_ci.
+    """
+    def __init__(self, database, name, unique=None):
+        self.database = database
+        self.name = name
+        self.unique = unique
+        self.docs = []
+        self.commands = []
+        self.indexes = {}
+
+    def _find(self, query, collation=None):
+        return next((doc for doc in self.docs if matches(doc, query, collation)), None)
+
+    @staticmethod
+    def _project(doc, projection):
+        if doc is None or projection is None:
+            return copy.deepcopy(doc)
+        return {k: copy.deepcopy(v) for k, v in doc.items() if projection.get(k, 0)}
+
+    def insert_one(self, doc, session=None):
+        self.commands.append("insert")
+        doc.setdefault("_id", object())     # like pymongo, which adds an ObjectId
+        key = tuple(str(doc.get(f)).casefold() for f in self.unique or ())
+        if any(d["_id"] == doc["_id"] for d in self.docs) or (
+                self.unique and any(tuple(str(d.get(f)).casefold() for f in self.unique) == key for d in self.docs)):
+            raise DuplicateKeyError("E11000 duplicate key")
+        self.docs.append(copy.deepcopy(doc))
+
+    def find_one_and_update(self, query, update, projection=None, return_document=ReturnDocument.BEFORE,
+                            collation=None, session=None):
+        self.commands.append("findAndModify")
+        doc = self._find(query, collation)
+        if doc is None:
+            return None
+        before = self._project(doc, projection)
+        doc.update(update["$set"])
+        return before if return_document == ReturnDocument.BEFORE else self._project(doc, projection)
+
+    def find_one_and_delete(self, query, projection=None, collation=None, session=None):
+        self.commands.append("findAndModify")
+        doc = self._find(query, collation)
+        if doc is not None:
+            self.docs.remove(doc)
+        return self._project(doc, projection)
+
+    def update_one(self, query, update, session=None):
+        self.commands.append("update")
+        doc = self._find(query)
+        if doc is None:
+            return type("UpdateResult", (), {"matched_count": 0})()
+        if "$set" in update:
+            (field, value), = update["$set"].items()
+            assert field == "pets.$"
+            doc["pets"][doc["pets"].index(query["pets"])] = value
+        if "$push" in update:
+            (field, value), = update["$push"].items()
+            doc.setdefault(field, []).append(value)
+        if "$addToSet" in update:
+            (field, value), = update["$addToSet"].items()
+            if value not in doc.setdefault(field, []):
+                doc[field].append(value)
+        return type("UpdateResult", (), {"matched_count": 1})()
+
+    def find_one(self, query, projection=None, sort=None):
+        self.commands.append("find")
+        docs = [doc for doc in self.docs if matches(doc, query)]
+        for field, direction in reversed(sort or []):
+            docs.sort(key=lambda d: d.get(field), reverse=direction < 0)
+        return docs[0] if docs else None
+
+    def delete_one(self, query, session=None):
+        self.commands.append("delete")
+        doc = self._find(query)
+        if doc is not None:
+            self.docs.remove(doc)
+
+    def aggregate(self, pipeline, collation=None, session=None):
+        """ Only the {$match id} / $limit / $lookup pipeline of _type_with_pets. """
+        self.commands.append("aggregate")
+        (match, limit, lookup) = pipeline
+        doc = self._find(match["$match"])
+        if doc is None:
+            return iter([])
+        lookup = lookup["$lookup"]
+        pet_match = lookup["pipeline"][0]["$match"] if len(lookup["pipeline"]) > 1 else {}
+        pets = self.database.collections[lookup["from"]].docs
+        doc = dict(doc, pet_docs=[
+            {k: v for k, v in pet.items() if k in ("name", "birthdate", "picture")}
+            for pet in pets if pet["type_id"] == doc["id"] and matches(pet, pet_match, collation)
+        ])
+        return iter([doc])
+
+    def index_information(self):
+        return self.indexes
+
+    def drop_index(self, name):
+        del self.indexes[name]
+
+    def create_index(self, keys, name, unique=False, collation=None):
+        self.indexes[name] = {"key": keys, "unique": unique}
+
+
+class FakeSession:
+    """ with_transaction() keeps the writes only if the callback did not abort. """
+    def __init__(self, database):
+        self.database = database
+        self.transactions = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def with_transaction(self, callback):
+        saved = {name: copy.deepcopy(col.docs) for name, col in self.database.collections.items()}
+        self.aborted = False
+        result = callback(self)
+        if self.aborted:
+            for name, docs in saved.items():
+                self.database.collections[name].docs = docs
+        self.transactions.append("aborted" if self.aborted else "committed")
+        return result
+
+    def abort_transaction(self):
+        self.aborted = True
+
+
+class FakeDatabase:
+    def __init__(self):
+        self.client = self
+        self.sessions = []
+        self.collections = {
+            "pet_types": FakeCollection(self, "pet_types", unique=("id",)),
+            "pets": FakeCollection(self, "pets", unique=("type_id", "name")),
+        }
+
+    def start_session(self):
+        self.sessions.append(FakeSession(self))
+        return self.sessions[-1]
+
+
+@pytest.fixture
+def db():
+    db = FakeDatabase()
+    db.collections["pet_types"].docs.append({"_id": "t1", "id": 1, "type": "Poodle", "pets": ["Rex", "Fido"]})
+    db.collections["pets"].docs.extend([
+        {"_id": "1_Rex", "type_id": 1, "name": "Rex", "birthdate": "NA", "picture": "1_Rex.jpg"},
+        {"_id": "1_Fido", "type_id": 1, "name": "Fido", "birthdate": "NA", "picture": "NA"},
+    ])
+    return db
+
+
+def make_repo(db):
+    pet_types, pets = db.collections["pet_types"], db.collections["pets"]
+    return PetRepository(pet_types, pets, PetTypeCache(pet_types))
+
+
+def pet_names(db):
+    return [(doc["_id"], doc["name"]) for doc in db.collections["pets"].docs]
+
+
+def test_same_name_is_updated_in_place_in_one_command(db):
+    repo = make_repo(db)
+    status, old = repo.replace_pet(1, "Rex", {"name": "Rex", "birthdate": "01-01-2020", "picture": "NA"})
+    assert (status, old["picture"]) == ("replaced", "1_Rex.jpg")
+    assert db.collections["pets"].commands == ["findAndModify"]
+    assert db.sessions == []
+    assert db.collections["pets"].docs[0]["birthdate"] == "01-01-2020"
+
+
+def test_rename_is_one_transaction_and_rebuilds_the_id(db):
+    repo = make_repo(db)
+    status, old = repo.replace_pet(1, "rex", {"name": "Max", "birthdate": "NA", "picture": "NA"})
+    assert (status, old["name"], old["picture"]) == ("replaced", "Rex", "1_Rex.jpg")
+    assert db.sessions[0].transactions == ["committed"]
+    assert pet_names(db) == [("1_Fido", "Fido"), ("1_Max", "Max")]
+    assert db.collections["pet_types"].docs[0]["pets"] == ["Max", "Fido"]
+
+
+def test_change_of_case_gets_a_new_id(db):
+    repo = make_repo(db)
+    assert repo.replace_pet(1, "Rex", {"name": "rex", "birthdate": "NA", "picture": "NA"})[0] == "replaced"
+    assert pet_names(db) == [("1_Fido", "Fido"), ("1_rex", "rex")]
+    assert db.collections["pet_types"].docs[0]["pets"] == ["rex", "Fido"]
+
+
+def test_taken_name_rolls_the_whole_rename_back(db):
+    repo = make_repo(db)
+    before = copy.deepcopy(db.collections["pets"].docs)
+    assert repo.replace_pet(1, "Rex", {"name": "FIDO", "birthdate": "NA", "picture": "NA"})[0] == "exists"
+    assert db.sessions[0].transactions == ["aborted"]
+    assert db.collections["pets"].docs == before
+    assert db.collections["pet_types"].docs[0]["pets"] == ["Rex", "Fido"]
+
+
+def test_missing_pet_is_found_by_the_write(db):
+    repo = make_repo(db)
+    assert repo.replace_pet(1, "Luna", {"name": "Luna", "birthdate": "NA", "picture": "NA"}) == ("not_found", None)
+    assert repo.replace_pet(1, "Luna", {"name": "Max", "birthdate": "NA", "picture": "NA"}) == ("not_found", None)
+    # Same name: the in-place update misses, the rename looks for another case of it
+    assert db.collections["pets"].commands == ["findAndModify"] * 3
+    assert [s.transactions for s in db.sessions] == [["aborted"], ["aborted"]]
+
+
+def test_reads_check_the_type_and_fetch_pets_in_one_command(db):
+    repo = make_repo(db)
+    assert repo.find_pet(1, "REX") == (True, {"name": "Rex", "birthdate": "NA", "picture": "1_Rex.jpg"})
+    assert repo.find_pet(1, "Luna") == (True, None)
+    assert repo.find_pet(2, "Rex") == (False, None)
+    assert [p["name"] for p in repo.list_pets(1)] == ["Rex", "Fido"]
+    assert db.collections["pet_types"].commands == ["aggregate"] * 4
+    # The pet-type came back with the pets, the existence check is a cache hit
+    assert repo.type_exists(1)
+    assert db.collections["pet_types"].commands == ["aggregate"] * 4
+
+
+def test_type_ids_are_unique(db):
+    repo = make_repo(db)
+    assert repo.find_type_slot("Poodle") == (True, None)
+    assert repo.find_type_slot("Beagle") == (False, 2)
+    assert repo.insert_type({"id": 2, "type": "Beagle", "pets": []})
+    # A concurrent request computed the same id for another type
+    assert not repo.insert_type({"id": 2, "type": "Siamese", "pets": []})
+    assert [doc["type"] for doc in db.collections["pet_types"].docs] == ["Poodle", "Beagle"]
+
+
+def test_id_index_is_made_unique(db):
+    pet_types = db.collections["pet_types"]
+    pet_types.indexes["id"] = {"key": [("id", 1)]}
+    make_repo(db).ensure_indexes()
+    assert pet_types.indexes["id"]["unique"]
+    assert not pet_types.indexes["type"]["unique"]
+
+
+def test_pet_of_a_deleted_type_is_not_left_behind(db):
+    repo = make_repo(db)
+    assert repo.insert_pet(1, {"name": "Luna", "birthdate": "NA", "picture": "NA"})
+    assert not repo.insert_pet(1, {"name": "luna", "birthdate": "NA", "picture": "NA"})
+    assert not repo.insert_pet(7, {"name": "Ghost", "birthdate": "NA", "picture": "NA"})
+    assert [doc["name"] for doc in db.collections["pets"].docs] == ["Rex", "Fido", "Luna"]
+    assert db.collections["pet_types"].docs[0]["pets"] == ["Rex", "Fido", "Luna"]
@@ -0,0 +1,111 @@
+from pet_type_cache import PetTypeCache
+
+
+class FakeCollection:
+    """ find_one on {"id": n} over a dict of documents, counting the calls. """
+    def __init__(self, docs):
+        self.docs = {doc["id"]: doc for doc in docs}
+        self.reads = 0
+
+    def find_one(self, query):
+        self.reads += 1
+        return self.docs.get(query["id"])
+
+
+def make_cache(docs, **kwargs):
+    collection = FakeCollection(docs)
+    return PetTypeCache(collection, **kwargs), collection
+
+
+def test_read_through_then_hit():
+    cache, collection = make_cache([{"_id": "a", "id": 1, "type": "Poodle"}])
+    assert cache.get(1)["type"] == "Poodle"
+    assert cache.get(1)["type"] == "Poodle"
+    assert collection.reads == 1
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"]) == (1, 1)
+
+
+def test_missing_type_is_not_cached():
+    cache, collection = make_cache([])
+    assert cache.get(7) is None
+    collection.docs[7] = {"_id": "b", "id": 7}
+    assert cache.get(7) == {"_id": "b", "id": 7}
+    assert collection.reads == 2
+
+
+def test_lru_eviction():
+    docs = [{"_id": str(i), "id": i} for i in range(1, 4)]
+    cache, collection = make_cache(docs, max_entries=2)
+    cache.get(1)
+    cache.get(2)
+    cache.get(1)        # 2 is now the least recently used
+    cache.get(3)
+    assert cache.stats()["evictions"] == 1
+    reads = collection.reads
+    cache.get(1)
+    assert collection.reads == reads
+    cache.get(2)
+    assert collection.reads == reads + 1
+
+
+def test_ttl_expiry(clock):
+    cache, collection = make_cache([{"_id": "a", "id": 1}], ttl=30)
+    cache.get(1)
+    clock.now += 29
+    cache.get(1)
+    assert collection.reads == 1
+    clock.now += 2
+    cache.get(1)
+    assert collection.reads == 2
+    assert cache.stats()["expired"] == 1
+
+
+def test_invalidate_notifies_subscribers():
+    cache, collection = make_cache([{"_id": "a", "id": 1}])
+    calls = []
+    cache.subscribe(lambda: calls.append("changed"))
+    cache.get(1)
+    cache.invalidate(1)
+    assert calls == ["changed"]
+    assert cache.stats()["invalidations"] == 1
+    cache.get(1)
+    assert collection.reads == 2
+
+
+def test_invalidate_by_mongo_id():
+    cache, collection = make_cache([{"_id": "oid-1", "id": 1}, {"_id": "oid-2", "id": 2}])
+    cache.get(1)
+    cache.get(2)
+    cache.invalidate_oid("oid-1")
+    assert cache.stats()["size"] == 1
+    cache.get(2)
+    assert collection.reads == 2
+
+
+def test_clear_drops_everything():
+    cache, _ = make_cache([{"_id": "a", "id": 1}, {"_id": "b", "id": 2}])
+    calls = []
+    cache.subscribe(lambda: calls.append("changed"))
+    cache.get(1)
+    cache.get(2)
+    cache.clear()
+    assert cache.stats()["size"] == 0
+    assert calls == ["changed"]
+
+
+def test_invalidation_during_a_read_is_not_lost():
+    cache, collection = make_cache([{"_id": "a", "id": 1, "type": "Poodle"}])
+    find_one = collection.find_one
+
+    def racing_find_one(query):
+        doc = find_one(query)
+        # Another request renames the type after our read, before our put
+        collection.docs[1] = {"_id": "a", "id": 1, "type": "Beagle"}
+        cache.invalidate_oid("a")
+        return doc
+    collection.find_one = racing_find_one
+    assert cache.get(1)["type"] == "Poodle"
+    collection.find_one = find_one
+    assert cache.stats()["size"] == 0
+    assert cache.get(1)["type"] == "Beagle"
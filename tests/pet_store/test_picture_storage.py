@@ -0,0 +1,171 @@
+import threading
+import time
+
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+from picture_storage import LocalDiskBackend, PictureStore
+
+
+def matches(doc, query):
+    for field, cond in query.items():
+        if isinstance(cond, dict) and "$exists" in cond:
+            if (field in doc) != cond["$exists"]:
+                return False
+        elif isinstance(cond, dict) and "$lte" in cond:
+            if field not in doc or doc[field] > cond["$lte"]:
+                return False
+        elif doc.get(field) != cond:
+            return False
+    return True
+
+
+class FakeCollection:
+    """ Single-document operations over a dict keyed by _id, each one atomic. """
+    def __init__(self):
+        self.docs = {}
+        self.lock = threading.Lock()
+
+    def _find(self, query):
+        return next((doc for doc in self.docs.values() if matches(doc, query)), None)
+
+    @staticmethod
+    def _apply(doc, update):
+        for field, value in update.get("$set", {}).items():
+            doc[field] = value
+        for field in update.get("$unset", {}):
+            doc.pop(field, None)
+        for field, value in update.get("$inc", {}).items():
+            doc[field] = doc.get(field, 0) + value
+
+    def find_one(self, query, projection=None):
+        with self.lock:
+            doc = self._find(query)
+            return dict(doc) if doc else None
+
+    def insert_one(self, doc):
+        with self.lock:
+            if doc["_id"] in self.docs:
+                raise DuplicateKeyError("E11000 duplicate key")
+            self.docs[doc["_id"]] = dict(doc)
+
+    def find_one_and_update(self, query, update, upsert=False, return_document=ReturnDocument.BEFORE):
+        with self.lock:
+            doc = self._find(query)
+            before = dict(doc) if doc else None
+            if doc is None:
+                if not upsert:
+                    return None
+                doc = self.docs[query["_id"]] = {"_id": query["_id"]}
+            self._apply(doc, update)
+            return dict(doc) if return_document == ReturnDocument.AFTER else before
+
+    def update_one(self, query, update):
+        with self.lock:
+            doc = self._find(query)
+            if doc is not None:
+                self._apply(doc, update)
+            return type("UpdateResult", (), {"modified_count": int(doc is not None)})()
+
+    def delete_one(self, query):
+        with self.lock:
+            doc = self._find(query)
+            if doc is not None:
+                del self.docs[doc["_id"]]
+            return type("DeleteResult", (), {"deleted_count": int(doc is not None)})()
+
+    def find_one_and_delete(self, query):
+        with self.lock:
+            doc = self._find(query)
+            if doc is not None:
+                del self.docs[doc["_id"]]
+            return doc
+
+
+def make_store(tmp_path, backend=None, legacy_dir=None):
+    backend = backend or LocalDiskBackend(str(tmp_path / "blobs"))
+    return PictureStore(backend, FakeCollection(), FakeCollection(), legacy_dir=legacy_dir)
+
+
+def commit(store, filename, data):
+    staged = store.stage([data])
+    try:
+        store.commit(filename, staged)
+    finally:
+        staged.close()
+    return staged.digest
+
+
+def read(store, filename):
+    picture = store.open(filename)
+    return b"".join(picture[0]) if picture else None
+
+
+def test_same_bytes_are_stored_once(tmp_path):
+    store = make_store(tmp_path)
+    digest = commit(store, "1_Rex.jpg", b"rex")
+    assert commit(store, "1_Max.jpg", b"rex") == digest
+    assert store.blobs_col.docs[digest]["refs"] == 2
+
+    store.delete("1_Rex.jpg")
+    assert read(store, "1_Max.jpg") == b"rex"
+    store.delete("1_Max.jpg")
+    assert store.blobs_col.docs == {}
+    assert not store.backend.exists(digest)
+    assert read(store, "1_Max.jpg") is None
+
+
+def test_replacing_a_picture_releases_the_old_blob(tmp_path):
+    store = make_store(tmp_path)
+    old = commit(store, "1_Rex.jpg", b"old")
+    new = commit(store, "1_Rex.jpg", b"new")
+    assert read(store, "1_Rex.jpg") == b"new"
+    assert not store.backend.exists(old)
+    assert store.blobs_col.docs == {new: {"_id": new, "refs": 1}}
+    # Committing the same picture again keeps a single reference
+    commit(store, "1_Rex.jpg", b"new")
+    assert store.blobs_col.docs[new]["refs"] == 1
+
+
+class SlowDeleteBackend(LocalDiskBackend):
+    """ A commit of the same bytes starts while the last release is deleting them. """
+    def __init__(self, root):
+        super().__init__(root)
+        self.on_delete = None
+        self.racers = []
+
+    def delete(self, digest):
+        if self.on_delete is not None:
+            racer = threading.Thread(target=self.on_delete)
+            racer.start()
+            self.racers.append(racer)
+            time.sleep(0.2)
+        super().delete(digest)
+
+
+def test_commit_during_the_last_release_keeps_the_bytes(tmp_path):
+    backend = SlowDeleteBackend(str(tmp_path / "blobs"))
+    store = make_store(tmp_path, backend)
+    digest = commit(store, "1_Rex.jpg", b"rex")
+
+    backend.on_delete = lambda: commit(store, "1_Max.jpg", b"rex")
+    store.delete("1_Rex.jpg")
+    backend.racers[0].join()
+    assert store.blobs_col.docs == {digest: {"_id": digest, "refs": 1}}
+    assert read(store, "1_Max.jpg") == b"rex"
+
+
+def test_legacy_pictures_are_adopted_on_first_read(tmp_path):
+    legacy = tmp_path / "pet_images"
+    legacy.mkdir()
+    (legacy / "1_Rex.jpg").write_bytes(b"rex")
+    (legacy / "1_Fido.jpg").write_bytes(b"fido")
+    store = make_store(tmp_path, LocalDiskBackend(str(legacy)), legacy_dir=str(legacy))
+
+    assert read(store, "1_Rex.jpg") == b"rex"
+    assert not (legacy / "1_Rex.jpg").exists()
+    assert store.lookup("1_Rex.jpg")["size"] == 3
+    # Deleting a pet that was never read removes its file too
+    store.delete("1_Fido.jpg")
+    assert not (legacy / "1_Fido.jpg").exists()
+    assert store.lookup("../pet_images/1_Rex.jpg") is None
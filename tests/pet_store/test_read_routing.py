@@ -0,0 +1,99 @@
+import pytest
+from bson import Timestamp
+
+import pet_type_cache
+from pet_type_cache import PetTypeCache
+from read_routing import ReadRouting
+
+
+class FakeSession:
+    def __init__(self, operation_time=None):
+        self.operation_time = operation_time
+        self.cluster_time = {"clusterTime": operation_time} if operation_time else None
+        self.advanced_to = None
+
+    def advance_cluster_time(self, cluster_time):
+        self.cluster_time = cluster_time
+
+    def advance_operation_time(self, operation_time):
+        self.advanced_to = operation_time
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+class FakeClient:
+    """ start_session() hands out the queued sessions in order. """
+    def __init__(self, *sessions):
+        self.sessions = list(sessions)
+
+    def start_session(self, causal_consistency):
+        assert causal_consistency
+        return self.sessions.pop(0)
+
+
+def test_primary_opens_no_session():
+    routing = ReadRouting(FakeClient(), mode="primary")
+    with routing.read_session() as session:
+        assert session is None
+    with pytest.raises(ValueError, match="READ_MAX_STALENESS"):
+        ReadRouting(FakeClient(), mode="secondary", max_staleness=10)
+
+
+def test_reads_wait_for_own_writes_and_observed_changes():
+    write, read1, read2 = FakeSession(Timestamp(100, 1)), FakeSession(), FakeSession()
+    routing = ReadRouting(FakeClient(write, read1, read2), mode="secondaryPreferred")
+    with routing.write_session():
+        pass
+    with routing.read_session() as session:
+        assert session.advanced_to == Timestamp(100, 1)
+
+    # A change made elsewhere, newer than our own write; an older one changes nothing
+    routing.observe(Timestamp(105, 2))
+    routing.observe(Timestamp(90, 1))
+    routing.observe(None)
+    with routing.read_session() as session:
+        assert session.advanced_to == Timestamp(105, 2)
+    stats = routing.stats()
+    assert (stats["causal_writes"], stats["observed_changes"], stats["routed_reads"]) == (1, 2, 2)
+
+
+class FakeStream:
+    def __init__(self, changes):
+        self.changes = changes
+        self.resume_token = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def __iter__(self):
+        return iter(self.changes)
+
+
+class StopWatching(Exception):
+    pass
+
+
+def test_change_time_is_observed_before_subscribers_refill(monkeypatch):
+    events = []
+
+    class Collection:
+        def watch(self, resume_after=None):
+            return FakeStream([
+                {"operationType": "update", "documentKey": {"_id": "a"}, "clusterTime": Timestamp(300, 1)},
+            ])
+
+    def stop(delay):
+        raise StopWatching()
+    monkeypatch.setattr(pet_type_cache.time, "sleep", stop)
+    cache = PetTypeCache(Collection(), observe=lambda t: events.append(("observe", t)))
+    cache.subscribe(lambda: events.append(("invalidated",)))
+    with pytest.raises(StopWatching):
+        cache._watch(retry_delay=0)
+    assert events[:2] == [("observe", Timestamp(300, 1)), ("invalidated",)]
@@ -0,0 +1,126 @@
+import pytest
+
+import pet_InventoryREST
+
+POODLE = {"taxonomy": {"family": "Canidae", "genus": "Canis"}, "characteristics": {"lifespan": "12 - 15 years"}}
+
+
+@pytest.fixture
+def store(monkeypatch, tmp_path):
+    """ A test client of a pet-store on the in-memory engine, with empty storage. """
+    monkeypatch.setattr(pet_InventoryREST, "STORAGE_ENGINE", "memory")
+    monkeypatch.setattr(pet_InventoryREST, "IMAGES_DIR", str(tmp_path / "images"))
+    monkeypatch.setenv("STORAGE_SNAPSHOT", "")
+    monkeypatch.setenv("FETCH_CACHE_DIR", str(tmp_path / "fetch"))
+    monkeypatch.setenv("THUMB_CACHE_DIR", str(tmp_path / "thumbs"))
+    monkeypatch.setenv("TAXONOMY_CATALOG", str(tmp_path / "catalog.ndjson"))
+    for name in ("repo", "_unindexed_repo", "_index_failed_at"):
+        monkeypatch.setattr(pet_InventoryREST, name, None)
+    monkeypatch.setattr(pet_InventoryREST, "resolve_animal", lambda animal_type: POODLE)
+    return pet_InventoryREST.create_app().test_client()
+
+
+def test_pet_type_id_taken_meanwhile_is_retried(store, monkeypatch):
+    store.post("/pet-types", json={"type": "Poodle"})
+    find_type_slot = pet_InventoryREST.repo.find_type_slot
+    stale = []
+
+    def racing_find_type_slot(type_name):
+        # The first answer is already stale: a concurrent POST takes the id
+        exists, next_id = find_type_slot(type_name)
+        if not stale:
+            stale.append(next_id)
+            pet_InventoryREST.repo.insert_type({"id": next_id, "type": "Wolf", "pets": []})
+        return exists, next_id
+    monkeypatch.setattr(pet_InventoryREST.repo, "find_type_slot", racing_find_type_slot)
+
+    r = store.post("/pet-types", json={"type": "Beagle"})
+    assert (r.status_code, r.get_json()["id"]) == (201, 3)
+    types = store.get("/pet-types").get_json()
+    assert [(t["id"], t["type"]) for t in types] == [(1, "Poodle"), (2, "Wolf"), (3, "Beagle")]
+
+
+def test_kill_and_counters_do_not_need_the_storage(store, monkeypatch):
+    def unavailable():
+        raise pet_InventoryREST.StorageNotReady("Mongo is down")
+    monkeypatch.setattr(pet_InventoryREST, "init_storage", unavailable)
+    monkeypatch.setattr(pet_InventoryREST, "fetch_cache", None)
+    killed = []
+    monkeypatch.setattr(pet_InventoryREST.os, "_exit", killed.append)
+
+    assert store.get("/pet-types").status_code == 503
+    for path in ("/stats/round-trips", "/stats/fetch-cache", "/stats/read-routing", "/healthz"):
+        assert store.get(path).status_code == 200, path
+    store.get("/kill")
+    assert killed == [1]
+
+
+def test_pet_dates_are_validated_before_the_query(store, monkeypatch):
+    store.post("/pet-types", json={"type": "Poodle"})
+    store.post("/pet-types/1/pets", json={"name": "Rex", "birthdate": "01-02-2020"})
+    queries = []
+    list_pets = pet_InventoryREST.repo.list_pets
+    monkeypatch.setattr(pet_InventoryREST.repo, "list_pets", lambda *args, **kwargs: queries.append(args) or list_pets(*args, **kwargs))
+
+    assert store.get("/pet-types/9/pets?birthdateGT=2020-01-01").status_code == 400
+    assert store.get("/pet-types/1/pets?birthdateLT=yesterday").status_code == 400
+    assert queries == []
+    r = store.get("/pet-types/1/pets?birthdateGT=01-01-2020")
+    assert [p["name"] for p in r.get_json()] == ["Rex"]
+    assert store.get("/pet-types/9/pets").status_code == 404
+
+
+def test_compressed_pet_types_still_answer_304(store):
+    store.post("/pet-types", json={"type": "Poodle"})
+    for i in range(100):
+        store.post("/pet-types/1/pets", json={"name": f"Pet number {i}"})
+    r = store.get("/pet-types", headers={"Accept-Encoding": "gzip"})
+    assert (r.status_code, r.headers["Content-Encoding"]) == (200, "gzip")
+    etag = r.headers["ETag"]
+    assert etag.startswith('W/"')
+
+    r = store.get("/pet-types", headers={"Accept-Encoding": "gzip", "If-None-Match": etag})
+    assert (r.status_code, r.data) == (304, b"")
+    store.post("/pet-types/1/pets", json={"name": "Rex"})
+    assert store.get("/pet-types", headers={"If-None-Match": etag}).status_code == 200
+
+
+ANIMALS = {
+    "Poodle": ("Canidae", "Canis", "12 - 15 years"),
+    "Beagle": ("Canidae", "Canis", "10 years"),
+    "Siamese": ("Felidae", "Felis", "15 years"),
+    "Lion": ("Felidae", "Panthera", "8 - 10 years"),
+    "Parrot": ("Psittacidae", "Ara", "50 years"),
+}
+
+
+def test_pet_type_queries_are_pushed_down(store, monkeypatch):
+    monkeypatch.setattr(pet_InventoryREST, "resolve_animal", lambda animal_type: {
+        "taxonomy": dict(zip(("family", "genus"), ANIMALS[animal_type][:2])),
+        "characteristics": {"lifespan": ANIMALS[animal_type][2]},
+    })
+    for name in ANIMALS:
+        store.post("/pet-types", json={"type": name})
+    queries = []
+    list_types = pet_InventoryREST.repo.list_types
+    monkeypatch.setattr(pet_InventoryREST.repo, "list_types",
+                        lambda query, sort=None: queries.append((query, sort)) or list_types(query, sort))
+
+    def types(query):
+        return [t["type"] for t in store.get(f"/pet-types?{query}").get_json()]
+    assert types("family=canidae,felidae&lifespanGT=9&sort=lifespan&order=desc") == ["Siamese", "Poodle", "Beagle"]
+    assert queries[-1] == (
+        {"family": {"$in": ["Canidae", "Felidae"]}, "lifespan": {"$gt": 9}}, [("lifespan", -1)])
+    assert types("genus=Canis&genus=Ara&lifespanLT=50&sort=type") == ["Beagle", "Poodle"]
+    assert types("lifespan=15") == ["Siamese"]
+    assert store.get("/pet-types?family=Felidae&count=true").get_json() == {"count": 2}
+    assert len(queries) == 3
+
+    assert store.get("/pet-types?lifespanGT=ten").status_code == 400
+    assert store.get("/pet-types?sort=pets").status_code == 400
+    assert store.get("/pet-types?sort=id&order=up").status_code == 400
+    # Repeated reads come from the serialized cache until a write
+    assert types("lifespan=15") == ["Siamese"]
+    assert len(queries) == 3
+    store.delete("/pet-types/3")
+    assert types("lifespan=15") == []
@@ -0,0 +1,97 @@
+import io
+
+import pytest
+from bson import ObjectId
+
+from picture_storage import LocalDiskBackend
+from snapshot import export_store, restore_store
+
+
+class FakeCollection:
+    def __init__(self, name):
+        self.name = name
+        self.docs = []
+        self.inserts = []
+        self.indexes = {}
+
+    def find(self, query=None, projection=None, batch_size=None):
+        for doc in self.docs:
+            yield {k: v for k, v in doc.items() if projection is None or k in projection}
+
+    def insert_many(self, docs, ordered=True):
+        self.inserts.append(len(docs))
+        self.docs.extend(docs)
+
+    def estimated_document_count(self):
+        return len(self.docs)
+
+    def index_information(self):
+        return self.indexes
+
+    def create_index(self, keys, name, unique=False, collation=None):
+        self.indexes[name] = {"key": keys, "unique": unique}
+
+
+class FakeDatabase(dict):
+    def __missing__(self, name):
+        self[name] = FakeCollection(name)
+        return self[name]
+
+    def drop_collection(self, name):
+        self.pop(name, None)
+
+
+class Pictures:
+    """ The only part of a PictureStore the snapshot uses. """
+    def __init__(self, root):
+        self.backend = LocalDiskBackend(root)
+
+
+DIGEST = "ab" + "0" * 62
+
+
+@pytest.fixture
+def db():
+    db = FakeDatabase()
+    db["pet_types_store1"].docs.append({"_id": ObjectId(), "id": 1, "type": "Poodle", "pets": ["Rex", "Max", "Fido"]})
+    db["pets_store1"].docs.extend(
+        {"_id": f"1_{name}", "type_id": 1, "name": name, "picture": "NA"} for name in ("Rex", "Max", "Fido"))
+    db["pets_store1"].docs[0]["picture"] = "1_Rex.jpg"
+    db["pictures_store1"].docs.append({"_id": "1_Rex.jpg", "digest": DIGEST, "size": 3})
+    db["picture_blobs_store1"].docs.append({"_id": DIGEST, "refs": 1})
+    return db
+
+
+def test_export_restores_documents_blobs_and_indexes(db, tmp_path):
+    source, target = Pictures(str(tmp_path / "store1")), Pictures(str(tmp_path / "store2"))
+    source.backend.put(DIGEST, io.BytesIO(b"rex"))
+    archive = str(tmp_path / "store1.tar.gz")
+    export_store(db, 1, archive, source)
+
+    restore_store(db, 2, archive, target, chunk_size=2)
+    for kind in ("pet_types", "pets", "pictures", "picture_blobs"):
+        assert db[f"{kind}_store2"].docs == db[f"{kind}_store1"].docs
+    assert isinstance(db["pet_types_store2"].docs[0]["_id"], ObjectId)
+    assert db["pets_store2"].inserts == [2, 1]
+    assert b"".join(target.backend.open(DIGEST)) == b"rex"
+    assert db["pet_types_store2"].indexes["id"]["unique"]
+    assert "type_id_name_ci" in db["pets_store2"].indexes
+
+
+def test_restore_keeps_existing_data_unless_dropped(db, tmp_path):
+    pictures = Pictures(str(tmp_path / "store1"))
+    pictures.backend.put(DIGEST, io.BytesIO(b"rex"))
+    archive = str(tmp_path / "store1.tar.gz")
+    export_store(db, 1, archive, pictures)
+
+    stale = "cd" + "0" * 62
+    pictures.backend.put(stale, io.BytesIO(b"old"))
+    (tmp_path / "store1" / "1_Legacy.jpg").write_bytes(b"legacy")
+    db["pets_store1"].docs.append({"_id": "1_Ghost", "type_id": 1, "name": "Ghost"})
+    with pytest.raises(SystemExit):
+        restore_store(db, 1, archive, pictures)
+
+    restore_store(db, 1, archive, pictures, drop=True)
+    assert [doc["name"] for doc in db["pets_store1"].docs] == ["Rex", "Max", "Fido"]
+    assert pictures.backend.exists(DIGEST) and not pictures.backend.exists(stale)
+    assert (tmp_path / "store1" / "1_Legacy.jpg").exists()
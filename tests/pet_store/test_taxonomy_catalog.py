@@ -0,0 +1,74 @@
+import json
+
+import requests
+
+import pet_InventoryREST
+import taxonomy_catalog
+from taxonomy_catalog import TaxonomyCatalog, read_snapshot, write_snapshot
+
+
+def animal(name, family="Canidae"):
+    return {"name": name, "taxonomy": {"family": family, "genus": "Canis"}}
+
+
+def test_lookup_ignores_case_and_whitespace():
+    catalog = TaxonomyCatalog([animal("Golden Retriever"), animal("golden  retriever", "Felidae")])
+    assert len(catalog) == 1
+    assert catalog.lookup("  GOLDEN retriever ")["taxonomy"]["family"] == "Canidae"
+    assert catalog.lookup("Golden Retrievr") is None
+
+
+def test_fuzzy_fallback_is_opt_in():
+    catalog = TaxonomyCatalog([animal("Golden Retriever"), animal("Poodle")], fuzzy_cutoff=0.8)
+    assert catalog.lookup("Golden Retrievr")["name"] == "Golden Retriever"
+    assert catalog.lookup("Golden Retrievr", fuzzy=False) is None
+    assert catalog.lookup("Siamese") is None
+
+
+def test_snapshots_round_trip_as_ndjson_or_json(tmp_path):
+    path = str(tmp_path / "catalog.ndjson")
+    write_snapshot(path, [animal("Poodle"), animal("Chihuahua")])
+    assert [r["name"] for r in read_snapshot(path)] == ["Chihuahua", "Poodle"]
+    array = tmp_path / "catalog.json"
+    array.write_text(json.dumps([animal("Poodle")]))
+    assert TaxonomyCatalog.load(str(array)).lookup("poodle") == animal("Poodle")
+
+
+def test_cli_build_merges_fresh_records_first(monkeypatch, tmp_path):
+    path = str(tmp_path / "catalog.ndjson")
+    write_snapshot(path, [animal("Poodle", "Old"), animal("Beagle")])
+    fetched = []
+
+    def fetch_animals(name, api_key, timeout=10):
+        fetched.append(name)
+        return [animal(name)]
+    monkeypatch.setattr(taxonomy_catalog, "fetch_animals", fetch_animals)
+    monkeypatch.delenv("NINJA_API_KEY", raising=False)
+    assert taxonomy_catalog.main(["build", "Poodle", "--out", path]) == 1
+
+    monkeypatch.setenv("NINJA_API_KEY", "key")
+    assert taxonomy_catalog.main(["build", "Poodle", "--out", path, "--merge"]) == 0
+    records = {r["name"]: r["taxonomy"]["family"] for r in read_snapshot(path)}
+    assert records == {"Beagle": "Canidae", "Poodle": "Canidae"}
+    assert taxonomy_catalog.main(["refresh", "--out", path]) == 0
+    assert fetched == ["Poodle", "Beagle", "Poodle"]
+
+
+def test_api_is_only_called_for_unknown_names(monkeypatch):
+    catalog = TaxonomyCatalog([animal("Poodle")], fuzzy_cutoff=0.8)
+    monkeypatch.setattr(pet_InventoryREST, "taxonomy_catalog", catalog)
+    calls = []
+
+    def get_pet_info(animal_type):
+        calls.append(animal_type)
+        if animal_type == "Poodles":
+            raise requests.exceptions.ConnectionError("offline")
+        return [animal("Siamese Cat", "Felidae"), animal("Siamese", "Felidae")]
+    monkeypatch.setattr(pet_InventoryREST, "get_petInfo", get_pet_info)
+
+    assert pet_InventoryREST.resolve_animal("POODLE")["name"] == "Poodle"
+    assert pet_InventoryREST.resolve_animal("siamese")["name"] == "Siamese"
+    # The partial matches were kept, and the API is down: the catalog answers
+    assert pet_InventoryREST.resolve_animal("Siamese Cat")["name"] == "Siamese Cat"
+    assert pet_InventoryREST.resolve_animal("Poodles")["name"] == "Poodle"
+    assert calls == ["siamese", "Poodles"]
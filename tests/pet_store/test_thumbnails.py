@@ -0,0 +1,73 @@
+import io
+
+import pytest
+from PIL import Image
+
+from thumbnails import MAX_DIMENSION, NAMED_SIZES, ThumbnailCache, parse_box
+
+
+def test_parse_box_named_sizes():
+    assert parse_box(size="thumb") == NAMED_SIZES["thumb"]
+    with pytest.raises(ValueError, match="Unknown size"):
+        parse_box(size="huge")
+    with pytest.raises(ValueError, match="either size or w / h"):
+        parse_box(size="thumb", w="10")
+
+
+def test_parse_box_dimensions():
+    assert parse_box() is None
+    assert parse_box(w="200", h="100") == (200, 100)
+    # A missing side does not constrain the variant
+    assert parse_box(w="200") == (200, MAX_DIMENSION)
+    assert parse_box(h="50") == (MAX_DIMENSION, 50)
+    for bad in ("0", "-5", "1.5", "abc", str(MAX_DIMENSION + 1)):
+        with pytest.raises(ValueError):
+            parse_box(w=bad)
+
+
+def picture(width=400, height=200):
+    out = io.BytesIO()
+    Image.new("RGB", (width, height), "red").save(out, format="JPEG")
+    return out.getvalue()
+
+
+def test_variant_fits_the_box_and_is_reused(tmp_path):
+    cache = ThumbnailCache(str(tmp_path))
+    sources = []
+
+    def source():
+        sources.append(1)
+        return iter([picture()])
+    chunks, content_type, size = cache.get("rex.jpg", "d1", (100, 100), source)
+    data = b"".join(chunks)
+    assert (content_type, size) == ("image/jpeg", len(data))
+    assert Image.open(io.BytesIO(data)).size == (100, 50)
+    cache.get("rex.jpg", "d1", (100, 100), source)
+    assert len(sources) == 1
+    assert cache.stats()["hits"] == 1
+
+
+def test_existing_variants_are_adopted_not_wiped(tmp_path):
+    ThumbnailCache(str(tmp_path)).get("rex.jpg", "d1", (100, 100), lambda: iter([picture()]))
+    (tmp_path / "notes.txt").write_text("not ours")
+
+    cache = ThumbnailCache(str(tmp_path))
+    assert cache.stats()["adopted"] == 1
+    assert (tmp_path / "notes.txt").exists()
+    chunks, content_type, _ = cache.get("rex.jpg", "d1", (100, 100), lambda: pytest.fail("regenerated"))
+    assert content_type == "image/jpeg"
+    assert Image.open(io.BytesIO(b"".join(chunks))).size == (100, 50)
+
+    cache.invalidate("rex.jpg")
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["notes.txt"]
+
+
+def test_variant_removed_by_another_process_is_generated_again(tmp_path):
+    cache = ThumbnailCache(str(tmp_path))
+    cache.get("rex.jpg", "d1", (100, 100), lambda: iter([picture()]))
+    # Another worker adopts the variant and drops it
+    ThumbnailCache(str(tmp_path)).invalidate("rex.jpg")
+    assert list(tmp_path.iterdir()) == []
+    chunks, _, _ = cache.get("rex.jpg", "d1", (100, 100), lambda: iter([picture()]))
+    assert b"".join(chunks)
+    assert cache.stats()["generated"] == 2
@@ -0,0 +1,24 @@
+#!/bin/bash
+# Wait until every service answers 200 on /readyz, then report how long it took
+# and each service's own start-to-ready time.
+# Usage: ./wait_for_ready.sh [timeout seconds] [ports...]
+
+TIMEOUT=${1:-60}
+shift
+PORTS=${@:-5001 5002 5003}
+
+start=$(date +%s)
+for port in $PORTS; do
+    until curl -sf "http://localhost:$port/readyz" > /dev/null; do
+        if [ $(( $(date +%s) - start )) -ge "$TIMEOUT" ]; then
+            echo "Service on port $port not ready after ${TIMEOUT}s"
+            exit 1
+        fi
+        sleep 1
+    done
+done
+echo "Services ready after $(( $(date +%s) - start ))s"
+
+for port in $PORTS; do
+    echo "port $port: $(curl -s "http://localhost:$port/readyz")"
+done